@@ -0,0 +1,74 @@
+"""
+Measures the cost of a single save of the worked time history at different history sizes.
+
+Run with the package installed (e.g. `pip install -e .`):
+
+    python benchmarks/bench_persistence.py [number of records ...]
+"""
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from wage_labor_record.journal import WorkedTimeJournal, new_id
+from wage_labor_record.persistence import atomic_write
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+APPENDS = 1000
+
+
+def make_records(n: int) -> list:
+    return [
+        dict(
+            id=new_id(),
+            start_time=f"2023-{i % 12 + 1:02}-{i % 28 + 1:02}T09:{i % 60:02}:00.123456+01",
+            end_time=f"2023-{i % 12 + 1:02}-{i % 28 + 1:02}T11:{i % 60:02}:00.654321+01",
+            task=f"Task {i % 200}",
+            client=f"Client {i % 20}",
+        )
+        for i in range(n)
+    ]
+
+
+def timed(f, repetitions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        f()
+    return (time.perf_counter() - start) / repetitions
+
+
+def bench(n: int, directory: Path):
+    records = make_records(n)
+    repetitions = 3 if n < 1_000_000 else 1
+    path = directory / f"worked_times_{n}.json"
+
+    def plain_rewrite():
+        with open(path, "w") as f:
+            json.dump(records, f, indent=2)
+
+    results = dict()
+    results["plain rewrite"] = timed(plain_rewrite, repetitions)
+    results["atomic snapshot"] = timed(lambda: atomic_write(path, json.dumps(records, indent=2), backups=3), repetitions)
+
+    journal = WorkedTimeJournal(path, compaction_threshold=APPENDS + 1)
+    results["journal append (batched fsync)"] = timed(lambda: journal.update(records[n // 2]), APPENDS)
+    journal.close()
+
+    journal = WorkedTimeJournal(path, compaction_threshold=APPENDS + 1, fsync_interval=0)
+    results["journal append (fsync each)"] = timed(lambda: journal.update(records[n // 2]), APPENDS)
+    journal.close()
+
+    for name, seconds in results.items():
+        print(f"{n:>10,} records  {name:<32} {seconds * 1000:10.3f} ms/save")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            bench(n, Path(directory))
+
+
+if __name__ == "__main__":
+    main()
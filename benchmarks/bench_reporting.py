@@ -0,0 +1,55 @@
+"""
+Measures the group-by reports over the worked time history with and without NumPy at different history sizes.
+
+Run with the package installed (e.g. `pip install -e .[reports]`):
+
+    python benchmarks/bench_reporting.py [number of records ...]
+"""
+import random
+import sys
+import time
+
+from wage_labor_record.reporting import ReportColumns, duration_percentiles, grouped_sums, has_numpy
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+REPORTS = (("client", "month"), ("task", "week"), ("weekday", "hour"))
+
+
+def make_records(n: int) -> list:
+    rng = random.Random(0)
+    records = []
+    start_time = 1_600_000_000_000_000
+    for i in range(n):
+        start_time += rng.randint(0, 8 * 3600) * 1_000_000
+        duration = rng.randint(60, 4 * 3600) * 1_000_000
+        records.append(WorkedTimeRecord(f"Task {i % 200}", f"Client {i % 20}", start_time, start_time + duration))
+    return records
+
+
+def timed(f) -> float:
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+def bench(n: int):
+    columns = ReportColumns.from_records(make_records(n))
+    backends = (False, True) if has_numpy() else (False,)
+    for keys in REPORTS:
+        for use_numpy in backends:
+            seconds = timed(lambda: grouped_sums(columns, keys, use_numpy=use_numpy))
+            print(f"{n:>10,} records  {' x '.join(keys):<16} {'numpy' if use_numpy else 'python':<7} {seconds * 1000:10.3f} ms")
+    for use_numpy in backends:
+        seconds = timed(lambda: duration_percentiles(columns, (50, 90, 99), use_numpy=use_numpy))
+        print(f"{n:>10,} records  {'percentiles':<16} {'numpy' if use_numpy else 'python':<7} {seconds * 1000:10.3f} ms")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for n in sizes:
+        bench(n)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import logging
+from typing import Optional
 
 import gi
 
-from wage_labor_record.worked_time_store import WorkedTime
+from wage_labor_record.activity_recorder import ActivityRecorder, subtract_periods
+from wage_labor_record.worked_time_store import WorkedTime, datetime_from_unix_usec, unix_usec
 
 gi.require_version("Gtk", "3.0")
 gi.require_version('XApp', '1.0')
@@ -32,27 +34,51 @@ class AbortTrackingAction(Gio.SimpleAction):
 
 
 class StopTrackingAction(Gio.SimpleAction):
+    """
+    Stops tracking and emits the tracked time as worked time.
+
+    If an activity recorder is given, the idle periods the user chose to discard are cut out of the tracked time,
+    which may then be emitted as several worked times. Idle time the user did not decide about is kept.
+    """
     worked_time = GObject.Signal("worked-time", arg_types=[GObject.TYPE_PYOBJECT])
 
-    def __init__(self, tracking_state: TrackingState):
+    def __init__(
+            self,
+            tracking_state: TrackingState,
+            activity_recorder: Optional[ActivityRecorder] = None):
         super().__init__(name="stop_tracking", parameter_type=None, state=None)
         self._tracking_state = tracking_state
+        self._activity_recorder = activity_recorder
         self.connect("activate", self._stop_tracking)
         tracking_state.connect("notify", self._update_enabled_state)
         self._update_enabled_state()
 
     def _stop_tracking(self, *_args):
+        self.stop()
+
+    def stop(self, end_time: Optional[GLib.DateTime] = None):
+        """Stops tracking as if it had been stopped at `end_time` (default: now)."""
         assert self.get_enabled()
         assert self._tracking_state.start_time is not None
         assert self._tracking_state.task != ""
         assert self._tracking_state.client != ""
 
-        self.emit("worked-time", WorkedTime(
-            self._tracking_state.task,
-            self._tracking_state.client,
-            self._tracking_state.start_time,
-            GLib.DateTime.new_now_local(),
-        ))
+        start = unix_usec(self._tracking_state.start_time)
+        end = unix_usec(end_time if end_time is not None else GLib.DateTime.new_now_local())
+        segments = [(start, end)]
+        if self._activity_recorder is not None:
+            idle_periods = self._activity_recorder.idle_periods(start, end, discarded_only=True)
+            segments = subtract_periods(start, end, idle_periods)
+            if idle_periods:
+                logging.info(f"Cut {len(idle_periods)} discarded idle periods out of the tracked time")
+
+        for segment_start, segment_end in segments:
+            self.emit("worked-time", WorkedTime(
+                self._tracking_state.task,
+                self._tracking_state.client,
+                datetime_from_unix_usec(segment_start),
+                datetime_from_unix_usec(segment_end),
+            ))
 
         self._tracking_state.start_time = None
 
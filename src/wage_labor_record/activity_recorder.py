@@ -0,0 +1,114 @@
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+# Samples whose idle periods start within this many microseconds of each other belong to the same idle period
+_SAME_PERIOD_TOLERANCE = 1_000_000
+
+
+class ActivityRecorder:
+    """
+    Remembers idle time samples in a fixed-size ring buffer, so idle periods the user chose to discard
+    can be cut out of worked times later.
+
+    A sample (timestamp, idle time) means the user was idle from `timestamp - idle time` until `timestamp`.
+    Consecutive samples of the same idle period are collapsed into the latest one,
+    so the buffer holds roughly one entry per idle period no matter how often the idle time is polled.
+    When the buffer is full the oldest samples are overwritten.
+    All times are microseconds (since the epoch for timestamps).
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self._timestamps = array("q", bytes(8 * capacity))
+        self._idle_times = array("q", bytes(8 * capacity))
+        self._discarded = array("b", bytes(capacity))
+        self._capacity = capacity
+        self._size = 0
+        self._next = 0  # where the next sample goes
+
+    def __len__(self):
+        return self._size
+
+    def record(self, timestamp: int, idle_time: int):
+        if self._size > 0:
+            last = (self._next - 1) % self._capacity
+            last_idle_start = self._timestamps[last] - self._idle_times[last]
+            if idle_time >= self._idle_times[last] and abs(timestamp - idle_time - last_idle_start) <= _SAME_PERIOD_TOLERANCE:
+                self._timestamps[last] = timestamp
+                self._idle_times[last] = idle_time
+                return
+
+        self._timestamps[self._next] = timestamp
+        self._idle_times[self._next] = idle_time
+        self._discarded[self._next] = False
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def discard(self, idle_since: int):
+        """Marks the idle period the user was in at `idle_since` as discarded, so it is cut out of the tracked time."""
+        for i in range(1, self._size + 1):
+            position = (self._next - i) % self._capacity
+            if self._timestamps[position] < idle_since:
+                break
+            if self._timestamps[position] - self._idle_times[position] <= idle_since + _SAME_PERIOD_TOLERANCE:
+                self._discarded[position] = True
+
+    def samples(self) -> Iterator[Tuple[int, int]]:
+        """The (timestamp, idle time) samples from oldest to newest."""
+        first = (self._next - self._size) % self._capacity
+        for i in range(self._size):
+            position = (first + i) % self._capacity
+            yield self._timestamps[position], self._idle_times[position]
+
+    def idle_periods(
+            self,
+            start_time: Optional[int] = None,
+            end_time: Optional[int] = None,
+            min_duration: int = 0,
+            discarded_only: bool = False) -> List[Tuple[int, int]]:
+        """
+        The recorded idle periods of at least `min_duration`, clipped to [start_time, end_time].
+
+        :param discarded_only: Only the idle periods the user chose to discard.
+
+        :return: Sorted, non-overlapping (start, end) pairs.
+        """
+        periods = []
+        first = (self._next - self._size) % self._capacity
+        for i in range(self._size):
+            position = (first + i) % self._capacity
+            timestamp, idle_time = self._timestamps[position], self._idle_times[position]
+            if idle_time < min_duration or (discarded_only and not self._discarded[position]):
+                continue
+            period_start = timestamp - idle_time if start_time is None else max(timestamp - idle_time, start_time)
+            period_end = timestamp if end_time is None else min(timestamp, end_time)
+            if period_start < period_end:
+                periods.append((period_start, period_end))
+
+        periods.sort()
+        merged: List[Tuple[int, int]] = []
+        for period_start, period_end in periods:
+            if merged and period_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], period_end))
+            else:
+                merged.append((period_start, period_end))
+        return merged
+
+
+def subtract_periods(start_time: int, end_time: int, periods: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Cuts the sorted, non-overlapping `periods` out of [start_time, end_time].
+
+    :return: The remaining (start, end) pairs.
+    """
+    remaining = []
+    if start_time >= end_time:
+        return remaining
+    for period_start, period_end in periods:
+        if period_start > start_time:
+            remaining.append((start_time, min(period_start, end_time)))
+        start_time = max(start_time, period_end)
+        if start_time >= end_time:
+            return remaining
+    if start_time < end_time:
+        remaining.append((start_time, end_time))
+    return remaining
@@ -0,0 +1,188 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from wage_labor_record.rollups import RollupChange
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+from wage_labor_record.worked_time_store import WorkedTimeStore, WorkedTimeSubset, unix_usec
+
+from gi.repository import GLib, GObject
+
+
+class WorkedTimeTotals(GObject.Object):
+    """
+    Running totals of the worked time in a subset, overall, per task and per client.
+
+    The totals are integer microseconds. They are computed once when the subset is set and from then on
+    updated from the subset's record-added, record-removed and record-changed signals in constant time per change.
+    Listeners are told which task's and client's total changed, and get reset when everything was recomputed.
+
+    Alternatively the totals can follow the worked time in a period between two local midnights.
+    They are then summed up once from the daily rollups of the store, and updated from the changes the store reports
+    with rollups-changed, also in constant time per changed worked time. Like in the rollups, worked times crossing
+    the bounds of the period only count with the part within the period.
+    """
+    task_changed = GObject.Signal("task-changed", arg_types=(str,))
+    client_changed = GObject.Signal("client-changed", arg_types=(str,))
+    total_changed = GObject.Signal("total-changed")
+    reset = GObject.Signal("reset")
+
+    def __init__(self):
+        GObject.Object.__init__(self)
+        self._subset: Optional[WorkedTimeSubset] = None
+        self._store: Optional[WorkedTimeStore] = None
+        self._period: Optional[Tuple[Optional[GLib.DateTime], Optional[GLib.DateTime], Optional[Set[str]], Optional[Set[str]]]] = None
+        # The bounds of the period in microseconds since the epoch
+        self._period_start: Optional[int] = None
+        self._period_end: Optional[int] = None
+        self._handler_ids: List[int] = []
+        # What each record was counted as: task, client, duration
+        self._contributions: Dict[WorkedTimeRecord, Tuple[str, str, int]] = dict()
+        # Totals by task and client, in the order the tasks and clients first appeared
+        self.by_task: Dict[str, int] = dict()
+        self.by_client: Dict[str, int] = dict()
+        self._task_counts: Dict[str, int] = dict()
+        self._client_counts: Dict[str, int] = dict()
+        self.total = 0
+
+    def set_subset(self, subset: Optional[WorkedTimeSubset]):
+        """Follows the worked times in `subset`."""
+        self._disconnect()
+        self._subset = subset
+        if subset is not None:
+            self._handler_ids = [
+                subset.connect("record-added", lambda _subset, record: self._on_record_added(record)),
+                subset.connect("record-removed", lambda _subset, record: self._on_record_removed(record)),
+                subset.connect("record-changed", lambda _subset, record: self._on_record_changed(record)),
+                subset.connect("reset", lambda _subset: self._recompute()),
+            ]
+        self._recompute()
+
+    def set_period(
+            self,
+            store: WorkedTimeStore,
+            start_time: Optional[GLib.DateTime] = None,
+            end_time: Optional[GLib.DateTime] = None,
+            tasks: Optional[Set[str]] = None,
+            clients: Optional[Set[str]] = None):
+        """Follows the worked time between two local midnights (see `WorkedTimeStore.period_totals`)."""
+        self._disconnect()
+        self._store = store
+        self._period = (start_time, end_time, tasks, clients)
+        self._period_start = None if start_time is None else unix_usec(start_time)
+        self._period_end = None if end_time is None else unix_usec(end_time)
+        self._handler_ids = [store.connect("rollups-changed", lambda _store, changes: self._on_rollups_changed(changes))]
+        self._recompute()
+
+    def dispose(self):
+        """Stops following the subset or period."""
+        self._disconnect()
+
+    def _disconnect(self):
+        source = self._subset if self._subset is not None else self._store
+        for handler_id in self._handler_ids:
+            source.disconnect(handler_id)
+        self._handler_ids = []
+        self._subset = None
+        self._store = None
+        self._period = None
+
+    def _recompute(self):
+        self._contributions.clear()
+        self.by_task.clear()
+        self.by_client.clear()
+        self._task_counts.clear()
+        self._client_counts.clear()
+        self.total = 0
+        if self._subset is not None:
+            for record in self._subset.records():
+                self._add(record)
+        elif self._store is not None:
+            totals = self._store.period_totals(*self._period)
+            self.total = totals.total
+            self.by_task.update(totals.by_task)
+            self.by_client.update(totals.by_client)
+        self.emit("reset")
+
+    def _add(self, record: WorkedTimeRecord):
+        task, client, duration = contribution = (record.task, record.client, record.end_time - record.start_time)
+        self._contributions[record] = contribution
+        self.by_task[task] = self.by_task.get(task, 0) + duration
+        self._task_counts[task] = self._task_counts.get(task, 0) + 1
+        self.by_client[client] = self.by_client.get(client, 0) + duration
+        self._client_counts[client] = self._client_counts.get(client, 0) + 1
+        self.total += duration
+
+    def _remove(self, record: WorkedTimeRecord) -> Tuple[str, str, int]:
+        task, client, duration = contribution = self._contributions.pop(record)
+        _subtract(self.by_task, self._task_counts, task, duration)
+        _subtract(self.by_client, self._client_counts, client, duration)
+        self.total -= duration
+        return contribution
+
+    def _on_record_added(self, record: WorkedTimeRecord):
+        self._add(record)
+        self._emit_changed(record.task, record.client)
+
+    def _on_record_removed(self, record: WorkedTimeRecord):
+        task, client, _ = self._remove(record)
+        self._emit_changed(task, client)
+
+    def _on_record_changed(self, record: WorkedTimeRecord):
+        if self._contributions[record] == (record.task, record.client, record.end_time - record.start_time):
+            return  # e.g. the worked time was moved without changing its duration
+        old_task, old_client, _ = self._remove(record)
+        self._add(record)
+        self._emit_changed(old_task, old_client)
+        if record.task != old_task:
+            self.emit("task-changed", record.task)
+        if record.client != old_client:
+            self.emit("client-changed", record.client)
+
+    def _on_rollups_changed(self, changes: List[RollupChange]):
+        _, _, tasks, clients = self._period
+        changed_tasks: Dict[str, None] = dict()
+        changed_clients: Dict[str, None] = dict()
+        for task, client, start_time, end_time, sign in changes:
+            if (tasks is not None and task not in tasks) or (clients is not None and client not in clients):
+                continue
+            # The bounds are local midnights, so clipping at them is what the daily rollups do
+            if self._period_start is not None:
+                start_time = max(start_time, self._period_start)
+            if self._period_end is not None:
+                end_time = min(end_time, self._period_end)
+            if end_time <= start_time:
+                continue
+            duration = sign * (end_time - start_time)
+            _add_to_period(self.by_task, task, duration)
+            _add_to_period(self.by_client, client, duration)
+            self.total += duration
+            changed_tasks[task] = None
+            changed_clients[client] = None
+        for task in changed_tasks:
+            self.emit("task-changed", task)
+        for client in changed_clients:
+            self.emit("client-changed", client)
+        if changed_tasks:
+            self.emit("total-changed")
+
+    def _emit_changed(self, task: str, client: str):
+        self.emit("task-changed", task)
+        self.emit("client-changed", client)
+        self.emit("total-changed")
+
+
+def _subtract(totals: Dict[str, int], counts: Dict[str, int], name: str, duration: int):
+    counts[name] -= 1
+    if counts[name] == 0:
+        del counts[name]
+        del totals[name]
+    else:
+        totals[name] -= duration
+
+
+def _add_to_period(totals: Dict[str, int], name: str, duration: int):
+    # Like the daily rollups, period totals leave out names without any worked time
+    total = totals.get(name, 0) + duration
+    if total != 0:
+        totals[name] = total
+    else:
+        totals.pop(name, None)
@@ -0,0 +1,216 @@
+"""
+The `wlr` command. Without a subcommand it starts the app, otherwise it runs the subcommand without loading GTK.
+
+    wlr --storage sqlite
+
+    wlr report --from 2024-03-01 --to 2024-03-31 --client ACME --by task --format csv
+    wlr export --from 2024-01-01 --client ACME --round 15 --group month --format csv --output acme.csv
+    wlr invoice --all-clients --month 2024-03 --format html --output-dir invoices
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+from wage_labor_record.export import (
+    PERIODS, ROUNDING_MODES, csv_lines, format_duration, group, jsonl_lines, round_durations, select, timeclock_lines,
+    write_lines)
+from wage_labor_record.invoice import FORMATS as INVOICE_FORMATS
+from wage_labor_record.invoice import invoice_filename, month_period, partition_by_client, render_invoices
+from wage_labor_record.reporting import ROLLUP_GROUP_KEYS, GROUP_KEYS, grouped_sums, grouped_sums_from_rollups
+from wage_labor_record.rollups import local_midnight
+from wage_labor_record.worked_time_history import (
+    STORAGE_BACKENDS, default_history_path, read_history_columns, read_history_records, read_history_rollups)
+
+COMMANDS = ("report", "export", "invoice")
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        # The remaining arguments are for GTK
+        app_parser = argparse.ArgumentParser(prog="wlr", add_help=False)
+        app_parser.add_argument("--storage", choices=STORAGE_BACKENDS,
+                                help="Store the worked times as JSON files or in an SQLite database, "
+                                     "migrating them if needed (default: as they are stored).")
+        app_args, gtk_argv = app_parser.parse_known_args(argv)
+        # Only the app needs GTK
+        from wage_labor_record.wlr_app import main as app_main
+        app_main(storage=app_args.storage, argv=[sys.argv[0], *gtk_argv])
+        return
+
+    parser = argparse.ArgumentParser(prog="wlr")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Print the worked time, optionally grouped, as CSV or JSON.")
+    _add_selection_arguments(report_parser)
+    report_parser.add_argument("--by", dest="keys", action="append", default=[], choices=GROUP_KEYS,
+                               help="Group by this key (weekday 0 is Monday). Can be given multiple times.")
+    report_parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    report_parser.set_defaults(run=report)
+
+    export_parser = subparsers.add_parser("export", help="Export worked times or their totals for invoices and timesheets.")
+    _add_selection_arguments(export_parser)
+    export_parser.add_argument("--round", dest="round_minutes", type=_positive_int, metavar="MINUTES",
+                               help="Round the duration of each worked time to a multiple of this many minutes.")
+    export_parser.add_argument("--rounding", choices=ROUNDING_MODES, default="up")
+    export_parser.add_argument("--group", choices=(*PERIODS, "total"),
+                               help="Export the totals per period (or overall) instead of the worked times.")
+    export_parser.add_argument("--by", dest="keys", action="append", choices=("client", "task"),
+                               help="Group the totals by client and/or task (default: both).")
+    export_parser.add_argument("--format", choices=("csv", "timeclock", "jsonl"), default="csv")
+    export_parser.add_argument("--output", metavar="PATH", help="The file to write to (default: standard output).")
+    export_parser.set_defaults(run=export)
+
+    invoice_parser = subparsers.add_parser("invoice", help="Write one itemized invoice per client for a month.")
+    clients_group = invoice_parser.add_mutually_exclusive_group(required=True)
+    clients_group.add_argument("--all-clients", action="store_true", help="Write an invoice for every client.")
+    clients_group.add_argument("--client", dest="clients", action="append", metavar="CLIENT",
+                               help="Write an invoice for this client. Can be given multiple times.")
+    invoice_parser.add_argument("--month", type=_month, default=date.today(), metavar="YYYY-MM",
+                                help="The month to invoice (default: the current month).")
+    invoice_parser.add_argument("--round", dest="round_minutes", type=_positive_int, metavar="MINUTES",
+                                help="Round the duration of each worked time to a multiple of this many minutes.")
+    invoice_parser.add_argument("--rounding", choices=ROUNDING_MODES, default="up")
+    invoice_parser.add_argument("--format", choices=INVOICE_FORMATS, default="text")
+    invoice_parser.add_argument("--output-dir", default=".", metavar="DIR",
+                                help="The directory to write the invoices to (default: the current directory).")
+    invoice_parser.add_argument("--workers", type=_positive_int, metavar="N",
+                                help="The number of processes rendering invoices (default: one per CPU).")
+    invoice_parser.add_argument("--history", default=default_history_path(), metavar="PATH",
+                                help="The worked times file (default: %(default)s).")
+    invoice_parser.set_defaults(run=invoice)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+def _month(text: str) -> date:
+    return date.fromisoformat(f"{text}-01")
+
+
+def _positive_int(text: str) -> int:
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a whole number: {text!r}")
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number, not {value}")
+    return value
+
+
+def _add_selection_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--from", dest="first_day", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="The first day to include.")
+    parser.add_argument("--to", dest="last_day", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="The last day to include.")
+    parser.add_argument("--task", dest="tasks", action="append", metavar="TASK",
+                        help="Only include this task. Can be given multiple times.")
+    parser.add_argument("--client", dest="clients", action="append", metavar="CLIENT",
+                        help="Only include this client. Can be given multiple times.")
+    parser.add_argument("--history", default=default_history_path(), metavar="PATH",
+                        help="The worked times file (default: %(default)s).")
+
+
+def report(args: argparse.Namespace):
+    start_day = None if args.first_day is None else args.first_day.toordinal()
+    end_day = None if args.last_day is None else args.last_day.toordinal() + 1
+    tasks = None if args.tasks is None else set(args.tasks)
+    clients = None if args.clients is None else set(args.clients)
+
+    # The daily rollups answer everything but hours, unless they are not cached
+    rollup_buckets = None
+    if all(key in ROLLUP_GROUP_KEYS for key in args.keys):
+        rollup_buckets = read_history_rollups(args.history, start_day, end_day)
+    if rollup_buckets is not None:
+        sums = grouped_sums_from_rollups(rollup_buckets, args.keys, start_day, end_day, tasks, clients)
+    else:
+        start_time = None if start_day is None else local_midnight(start_day)
+        end_time = None if end_day is None else local_midnight(end_day)
+        sums = grouped_sums(
+            read_history_columns(args.history, start_time, None if end_time is None else end_time - 1),
+            args.keys,
+            start_time=start_time,
+            end_time=end_time,
+            tasks=tasks,
+            clients=clients)
+    if not args.keys:
+        sums = {(): sums.get((), 0)}
+
+    rows = [_report_row(args.keys, key_values, duration) for key_values, duration in sums.items()]
+    if args.format == "json":
+        json.dump(rows, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=[*args.keys, "hours", "duration"], lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _report_row(keys: List[str], key_values: tuple, duration: int) -> Dict[str, object]:
+    row: Dict[str, object] = dict()
+    for key, value in zip(keys, key_values):
+        if key == "month":
+            row[key] = value.strftime("%Y-%m")
+        elif isinstance(value, date):
+            row[key] = value.isoformat()
+        else:
+            row[key] = value
+    row["hours"] = round(duration / 3_600_000_000, 2)
+    row["duration"] = format_duration(duration)
+    return row
+
+
+def export(args: argparse.Namespace):
+    if args.format == "timeclock" and args.group is not None:
+        sys.exit("wlr export: totals can't be exported in the timeclock format")
+    # Worked times starting on the selected days, like in the history window
+    start_time = None if args.first_day is None else local_midnight(args.first_day.toordinal())
+    end_time = None if args.last_day is None else local_midnight(args.last_day.toordinal() + 1) - 1
+    rows = select(
+        read_history_records(args.history, start_time, end_time),
+        start_time=start_time,
+        end_time=end_time,
+        tasks=None if args.tasks is None else set(args.tasks),
+        clients=None if args.clients is None else set(args.clients))
+    if args.round_minutes is not None:
+        rows = round_durations(rows, args.round_minutes * 60_000_000, args.rounding)
+    if args.group is not None:
+        rows = group(rows, None if args.group == "total" else args.group, args.keys or ("client", "task"))
+    formatter = dict(csv=csv_lines, timeclock=timeclock_lines, jsonl=jsonl_lines)[args.format]
+
+    if args.output is None:
+        write_lines(formatter(rows), sys.stdout)
+    else:
+        with open(args.output, "w", newline="") as f:
+            write_lines(formatter(rows), f)
+
+
+def invoice(args: argparse.Namespace):
+    first_day, next_month = month_period(args.month)
+    period = first_day.strftime("%Y-%m")
+    start_time = local_midnight(first_day.toordinal())
+    end_time = local_midnight(next_month.toordinal()) - 1
+    records = select(
+        read_history_records(args.history, start_time, end_time),
+        start_time=start_time,
+        end_time=end_time,
+        clients=None if args.all_clients else set(args.clients))
+    if args.round_minutes is not None:
+        records = round_durations(records, args.round_minutes * 60_000_000, args.rounding)
+
+    invoices = render_invoices(partition_by_client(records), period, args.format, args.workers)
+    os.makedirs(args.output_dir, exist_ok=True)
+    filenames: Set[str] = set()
+    for client, text in invoices.items():
+        filename = invoice_filename(client, period, args.format, filenames)
+        filenames.add(filename)
+        with open(os.path.join(args.output_dir, filename), "w") as f:
+            f.write(text)
+        print(os.path.join(args.output_dir, filename))
+
+
+if __name__ == "__main__":
+    main()
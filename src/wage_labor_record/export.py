@@ -0,0 +1,211 @@
+"""
+Exports of worked times for invoices and timesheets.
+
+An export is a pipeline of generator stages, each consuming the output of the previous one:
+
+    lines = csv_lines(group(round_durations(select(store.records(), clients={"ACME"}), 15 * 60_000_000), "month"))
+    write_lines(lines, f)
+
+Every stage handles one worked time (or one group) at a time, so exports of many years take constant memory.
+Grouping by period relies on the worked times being sorted by start time, as the store keeps them.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import IO, Iterable, Iterator, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from wage_labor_record.rollups import local_day
+from wage_labor_record.worked_time_record import WorkedTimeRecord, format_iso8601
+
+PERIODS = ("day", "week", "month")
+ROUNDING_MODES = ("up", "nearest", "down")
+
+
+class GroupTotal(NamedTuple):
+    """The worked time of one group in microseconds. Keys the entries were not grouped by are None."""
+    period: Optional[date]  # The first day of the period
+    client: Optional[str]
+    task: Optional[str]
+    duration: int
+
+
+Row = Union[WorkedTimeRecord, GroupTotal]
+
+
+def select(
+        records: Iterable[WorkedTimeRecord],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None) -> Iterator[WorkedTimeRecord]:
+    """
+    The worked times starting within [start_time, end_time] with one of the given tasks and clients,
+    like `WorkedTimeStore.get_subset`.
+
+    :param records: Worked times sorted by start time, e.g. `WorkedTimeStore.records()`.
+    """
+    for record in records:
+        if end_time is not None and record.start_time > end_time:
+            break
+        if start_time is not None and record.start_time < start_time:
+            continue
+        if (tasks is None or record.task in tasks) and (clients is None or record.client in clients):
+            yield record
+
+
+def round_durations(
+        records: Iterable[WorkedTimeRecord],
+        granularity: int,
+        mode: str = "up") -> Iterator[WorkedTimeRecord]:
+    """
+    Rounds the duration of each worked time to a multiple of `granularity` by moving its end time.
+
+    The worked times in the store are not changed, the rounded ones are copies.
+
+    :param granularity: In microseconds, e.g. 15 * 60_000_000 to bill quarter hours.
+    :param mode: One of ROUNDING_MODES.
+    """
+    if granularity <= 0:
+        raise ValueError("The rounding granularity must be positive")
+    if mode not in ROUNDING_MODES:
+        raise ValueError(f"Unknown rounding mode: {mode}")
+    for record in records:
+        duration = record.end_time - record.start_time
+        if mode == "up":
+            rounded = -(-duration // granularity) * granularity
+        elif mode == "down":
+            rounded = duration // granularity * granularity
+        else:
+            rounded = (duration + granularity // 2) // granularity * granularity
+        if rounded == duration:
+            yield record
+        else:
+            yield WorkedTimeRecord(record.task, record.client, record.start_time, record.start_time + rounded, id=record.id)
+
+
+def group(
+        records: Iterable[WorkedTimeRecord],
+        period: Optional[str] = None,
+        keys: Sequence[str] = ("client", "task")) -> Iterator[GroupTotal]:
+    """
+    Sums up the worked times by period and by client and/or task.
+
+    A worked time counts towards the period of the local day it started on.
+    Only the totals of the current period are held, so the worked times must be sorted by start time.
+
+    :param period: One of PERIODS, or None to sum up all worked times together.
+    :param keys: "client" and/or "task".
+    :return: The totals, sorted by period, client and task.
+    """
+    if period is not None and period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+    if any(key not in ("client", "task") for key in keys):
+        raise ValueError(f"Can only group by client and task, not {', '.join(keys)}")
+    by_client, by_task = "client" in keys, "task" in keys
+
+    current_period: Optional[date] = None
+    totals: dict = dict()
+    for record in records:
+        record_period = None if period is None else _period_start(local_day(record.start_time), period)
+        if record_period != current_period:
+            if current_period is not None and record_period < current_period:
+                raise ValueError("The worked times must be sorted by start time to group them by period")
+            yield from _group_totals(current_period, totals)
+            current_period = record_period
+            totals.clear()
+        key = (record.client if by_client else None, record.task if by_task else None)
+        totals[key] = totals.get(key, 0) + record.end_time - record.start_time
+    yield from _group_totals(current_period, totals)
+
+
+def _period_start(day: int, period: str) -> date:
+    d = date.fromordinal(day)
+    if period == "week":
+        return date.fromordinal(day - d.weekday())
+    if period == "month":
+        return d.replace(day=1)
+    return d
+
+
+def _group_totals(period: Optional[date], totals: dict) -> Iterator[GroupTotal]:
+    for (client, task), duration in sorted(totals.items(), key=lambda item: (item[0][0] or "", item[0][1] or "")):
+        yield GroupTotal(period, client, task, duration)
+
+
+def csv_lines(rows: Iterable[Row]) -> Iterator[str]:
+    """Formats worked times or group totals as CSV, starting with a header line."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    header_written = False
+    for row in rows:
+        if not header_written:
+            writer.writerow(_csv_header(row))
+            header_written = True
+        writer.writerow(_csv_fields(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _csv_header(row: Row) -> Tuple[str, ...]:
+    if isinstance(row, GroupTotal):
+        return ("period", "client", "task", "hours", "duration")
+    return ("client", "task", "start_time", "end_time", "hours", "duration")
+
+
+def _csv_fields(row: Row) -> tuple:
+    duration = row.duration if isinstance(row, GroupTotal) else row.end_time - row.start_time
+    if isinstance(row, GroupTotal):
+        fields = (None if row.period is None else row.period.isoformat(), row.client, row.task)
+    else:
+        fields = (row.client, row.task, format_iso8601(row.start_time), format_iso8601(row.end_time))
+    return (*fields, f"{duration / 3_600_000_000:.2f}", format_duration(duration))
+
+
+def jsonl_lines(rows: Iterable[Row]) -> Iterator[str]:
+    """Formats worked times or group totals as JSON Lines, one object per line."""
+    for row in rows:
+        if isinstance(row, GroupTotal):
+            d = dict(
+                period=None if row.period is None else row.period.isoformat(),
+                client=row.client,
+                task=row.task,
+                seconds=row.duration / 1_000_000,
+            )
+        else:
+            d = row.asdict()
+        yield json.dumps(d) + "\n"
+
+
+def timeclock_lines(records: Iterable[WorkedTimeRecord]) -> Iterator[str]:
+    """
+    Formats worked times in the timeclock format of hledger, with the client as account and the task as description:
+
+        i 2024-03-01 09:00:00 ACME  Write the report
+        o 2024-03-01 10:30:00
+    """
+    for record in records:
+        if isinstance(record, GroupTotal):
+            raise ValueError("Group totals can't be exported as timeclock entries")
+        # Two spaces separate the account from the description
+        account = " ".join((record.client or "unknown").split())
+        yield f"i {_timeclock_time(record.start_time)} {account}  {record.task}\n"
+        yield f"o {_timeclock_time(record.end_time)}\n"
+
+
+def _timeclock_time(usec: int) -> str:
+    # The local time, without fractions of a second or UTC offset
+    return format_iso8601(usec - usec % 1_000_000)[:19].replace("T", " ")
+
+
+def format_duration(usec: int) -> str:
+    """Formats a duration in microseconds as HH:MM:SS."""
+    hours, remainder = divmod(usec // 1_000_000, 60 * 60)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def write_lines(lines: Iterable[str], f: IO[str]):
+    for line in lines:
+        f.write(line)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import gi
 
 from wage_labor_record.history_view.summary_view import SummaryView
@@ -6,7 +8,7 @@ from wage_labor_record.tracking_state import TrackingState
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 
-from wage_labor_record.worked_time_store import WorkedTimeStore
+from wage_labor_record.worked_time_store import WorkedTimeStore, WorkedTimeSubset, is_local_midnight
 from wage_labor_record.history_view.selector_widget import SelectorWidget
 from wage_labor_record.history_view.worked_times_list_view import WorkedTimesListView
 
@@ -33,18 +35,46 @@ class HistoryBrowserWindow(Gtk.Window):
         self.worked_time_widget.show()
         scrolled_window.add(self.worked_time_widget)
 
+        # Only the first page of worked times is shown until scrolled to the bottom
+        def on_edge_reached(_window, position: Gtk.PositionType):
+            if position == Gtk.PositionType.BOTTOM:
+                self.worked_time_widget.load_more()
+        scrolled_window.connect("edge-reached", on_edge_reached)
+
         self.summary_view = SummaryView(tracking_state)
         box.add(self.summary_view)
 
+        self._subset: Optional[WorkedTimeSubset] = None
+
         def on_selection_changed(selector: SelectorWidget):
+            # The list shows the worked times starting within [start, end). The summary counts the worked time within
+            # the period, so a worked time crossing midnight counts on both days, like in `wlr report`.
+            end_time = selector.selected_end_time
             subset = work_time_store.get_subset(
                 tasks=selector.selected_tasks,
                 clients=selector.selected_clients,
                 start_time=selector.selected_start_time,
-                end_time=selector.selected_end_time
+                end_time=None if end_time is None else end_time.add(-1)
             )
             self.worked_time_widget.set_worked_times_list(subset)
-            self.summary_view.set_worked_times_list(
-                subset,
-                include_tracking_state=selector.selected_end_time is None)
+            include_tracking_state = selector.selected_end_time is None
+            if all(t is None or is_local_midnight(t) for t in (selector.selected_start_time, selector.selected_end_time)):
+                # Whole days, which the daily rollups answer without going through the worked times
+                self.summary_view.set_period(
+                    work_time_store,
+                    start_time=selector.selected_start_time,
+                    end_time=selector.selected_end_time,
+                    tasks=selector.selected_tasks,
+                    clients=selector.selected_clients,
+                    include_tracking_state=include_tracking_state)
+            else:
+                self.summary_view.set_worked_times_list(subset, include_tracking_state=include_tracking_state)
+            self._dispose_subset()
+            self._subset = subset
         selector_box.connect("selection-changed", on_selection_changed)
+        self.connect("destroy", lambda *_args: self._dispose_subset())
+
+    def _dispose_subset(self):
+        if self._subset is not None:
+            self._subset.dispose()
+            self._subset = None
@@ -1,8 +1,12 @@
 import datetime
+from typing import Dict, Optional, Set
 
 import gi
 
+from wage_labor_record.aggregation import WorkedTimeTotals
+from wage_labor_record.ticker import TickSubscription, set_markup_if_changed
 from wage_labor_record.tracking_state import TrackingState
+from wage_labor_record.worked_time_store import WorkedTimeStore, WorkedTimeSubset
 
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GLib
@@ -17,74 +21,107 @@ class SummaryView(Gtk.Box):
             border_width=20,
         )
         self._tracking_state = tracking_state
+        self._include_tracking_state = False
+
+        # The totals follow the shown worked times, and the view follows the totals
+        self._totals = WorkedTimeTotals()
+        self._totals.connect("reset", lambda _totals: self._on_totals_reset())
+        self._totals.connect("task-changed", lambda _totals, task: self._on_task_total_changed(task))
+        self._totals.connect("total-changed", lambda _totals: self._update_total_duration_view())
+        self.connect("destroy", lambda *_args: self._totals.dispose())
 
         self.total_time_label = Gtk.Label()
         self.total_time_label.set_markup(f"<span font='monospace bold 24'>00:00</span>")
         self.total_time_label.show()
         self.add(self.total_time_label)
 
+        # While tracking, the total including the tracked time is updated every second
+        self._total_time_ticks = TickSubscription(self.total_time_label, self._update_total_duration_view)
+        handler_id = tracking_state.connect("notify", lambda *_args: self._on_tracking_state_changed())
+        self.connect("destroy", lambda *_args: tracking_state.disconnect(handler_id))
+
         self.durations_by_task = Gtk.TreeView()
 
         self.durations_by_task.set_size_request(-1, 3 * 24)  # Ensure that the list is at least 3 lines tall
         self.durations_by_task.get_selection().set_mode(Gtk.SelectionMode.NONE)  # Disable selection
         self.durations_by_task.append_column(Gtk.TreeViewColumn("Task", Gtk.CellRendererText(), text=0))
         self.durations_by_task.append_column(Gtk.TreeViewColumn("Total Duration", Gtk.CellRendererText(), text=1))
+        self._durations_by_task_list = Gtk.ListStore(str, str)
+        self._task_iters: Dict[str, Gtk.TreeIter] = dict()
+        self.durations_by_task.set_model(self._durations_by_task_list)
 
         self.durations_by_task.show()
         self.add(self.durations_by_task)
 
-        self._durations_by_task_string = ""
         self.copy_to_clipboard_button = Gtk.Button(label="Copy to Clipboard")
         def copy_to_clipboard(*args):
+            # The durations by task as a string for copying to the clipboard
+            durations_by_task_string = "\n".join(
+                f'{task}, {_duration_to_str(_usec_to_timedelta(duration))}'
+                for task, duration in self._totals.by_task.items()
+            )
             clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD)
-            clipboard.set_text(self._durations_by_task_string, -1)
+            clipboard.set_text(durations_by_task_string, -1)
         self.copy_to_clipboard_button.connect("clicked", copy_to_clipboard)
         self.copy_to_clipboard_button.show()
         self.add(self.copy_to_clipboard_button)
         self.show()
 
-    def set_worked_times_list(self, worked_times_list, include_tracking_state: bool = False):
-        # Compute the durations aggregated by task
-        durations_by_task = dict()
-        for worked_time in worked_times_list:
-            durations_by_task.setdefault(worked_time.task, datetime.timedelta())
-            durations_by_task[worked_time.task] += worked_time.duration
-
-        # Save the durations by task as a string for copying to the clipboard
-        self._durations_by_task_string = "\n".join([f'{task}, {_duration_to_str(duration)}' for task, duration in durations_by_task.items()])
-
-        # Put the aggregated durations into a Gtk.ListStore and display it in the list view
-        durations_by_task_list = Gtk.ListStore(str, str)
-        for task, duration in durations_by_task.items():
-            durations_by_task_list.append([task, _duration_to_str(duration)])
-        self.durations_by_task.set_model(durations_by_task_list)
-
-        # Compute the total duration
-        total_duration = sum(durations_by_task.values(), start=datetime.timedelta())
-
-        def update_total_duration_view():
-            if include_tracking_state and self._tracking_state.is_tracking():
-                total_duration_with_tracking_state = total_duration + self._tracking_state.elapsed_time()
-                self.total_time_label.set_markup(
-                    f"<span font='monospace bold 24'>{_duration_to_str(total_duration, include_seconds=False)}</span>\n"
-                    f"<span font='monospace bold 16' color='grey'>({_duration_to_str(total_duration_with_tracking_state)})</span>"
-                )
-            else:
-                self.total_time_label.set_markup(f"<span font='monospace bold 24'>{_duration_to_str(total_duration, include_seconds=False)}</span>")
-
-        update_total_duration_view()
-        if include_tracking_state:
-            self._tracking_state.connect("notify", lambda *args: update_total_duration_view())
-
-            # regularly update the total time label
-            # When the tracking is active, repeatedly update the elapsed time label
-            # when tracking stopped, stop the regular updates as well
-            def _update_view():
-                update_total_duration_view()
-                return self._tracking_state.is_tracking()
-
-            GLib.timeout_add(1000, _update_view)
-            self._tracking_state.connect("notify::start-time", lambda *args: GLib.timeout_add(1000, _update_view))
+    def set_worked_times_list(self, worked_times_list: WorkedTimeSubset, include_tracking_state: bool = False):
+        self._include_tracking_state = include_tracking_state
+        self._totals.set_subset(worked_times_list)
+        self._on_tracking_state_changed()
+
+    def set_period(
+            self,
+            worked_time_store: WorkedTimeStore,
+            start_time: Optional[GLib.DateTime] = None,
+            end_time: Optional[GLib.DateTime] = None,
+            tasks: Optional[Set[str]] = None,
+            clients: Optional[Set[str]] = None,
+            include_tracking_state: bool = False):
+        """Summarizes the worked time between two local midnights from the daily rollups of the store."""
+        self._include_tracking_state = include_tracking_state
+        self._totals.set_period(worked_time_store, start_time, end_time, tasks, clients)
+        self._on_tracking_state_changed()
+
+    def _on_totals_reset(self):
+        self._durations_by_task_list.clear()
+        self._task_iters.clear()
+        for task in self._totals.by_task:
+            self._on_task_total_changed(task)
+        self._update_total_duration_view()
+
+    def _on_task_total_changed(self, task: str):
+        duration = self._totals.by_task.get(task)
+        tree_iter = self._task_iters.get(task)
+        if duration is None:
+            if tree_iter is not None:
+                self._durations_by_task_list.remove(self._task_iters.pop(task))
+        elif tree_iter is None:
+            self._task_iters[task] = self._durations_by_task_list.append([task, _duration_to_str(_usec_to_timedelta(duration))])
+        else:
+            self._durations_by_task_list.set_value(tree_iter, 1, _duration_to_str(_usec_to_timedelta(duration)))
+
+    def _on_tracking_state_changed(self):
+        self._update_total_duration_view()
+        self._total_time_ticks.set_active(self._include_tracking_state and self._tracking_state.is_tracking())
+
+    def _update_total_duration_view(self, now: Optional[GLib.DateTime] = None):
+        total_duration = _usec_to_timedelta(self._totals.total)
+        if self._include_tracking_state and self._tracking_state.is_tracking():
+            total_duration_with_tracking_state = total_duration + self._tracking_state.elapsed_time(now)
+            markup = (
+                f"<span font='monospace bold 24'>{_duration_to_str(total_duration, include_seconds=False)}</span>\n"
+                f"<span font='monospace bold 16' color='grey'>({_duration_to_str(total_duration_with_tracking_state)})</span>"
+            )
+        else:
+            markup = f"<span font='monospace bold 24'>{_duration_to_str(total_duration, include_seconds=False)}</span>"
+        set_markup_if_changed(self.total_time_label, markup)
+
+
+def _usec_to_timedelta(usec: int) -> datetime.timedelta:
+    return datetime.timedelta(microseconds=usec)
 
 
 def _duration_to_str(d: datetime.timedelta, include_seconds: bool = True) -> str:
@@ -1,21 +1,36 @@
+from typing import List, Optional
+
 import gi
 
 from wage_labor_record.history_view.datetime_picker import DatetimePicker
 from wage_labor_record.utils import make_completer
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import GObject, Gio, Gtk
+from gi.repository import GObject, Gtk
+
+from wage_labor_record.worked_time_store import WorkedTime, WorkedTimeStore, WorkedTimeSubset, datetime_from_unix_usec
 
-from wage_labor_record.worked_time_store import WorkedTime, WorkedTimeStore
+# How many rows are shown at first, and how many more are loaded when scrolling to the bottom
+PAGE_SIZE = 100
 
 
 class WorkedTimesListView(Gtk.ListBox):
-    """A view to show and edit a set of worked times."""
+    """
+    A view to show and edit a set of worked times.
+
+    Only the first page of worked times gets rows. More pages are loaded by `load_more`, e.g. when scrolled to the bottom.
+    Rows are not destroyed when their worked time goes away but kept for the next worked time to show.
+    """
 
     def __init__(self, worked_time_store: WorkedTimeStore):
         super().__init__()
         self.show()
-        self._worked_times: Gio.ListStore = None
+        self._worked_times: Optional[WorkedTimeSubset] = None
+        self._items_changed_handler_id: Optional[int] = None
+        self._rows: List[_WorkedTimeRow] = []
+        self._unused_rows: List[_WorkedTimeRow] = []
+        # How many worked times should have rows
+        self._limit = PAGE_SIZE
         self._all_items_in_same_year = False
         self._all_items_in_same_month = False
         self._all_items_in_same_day = False
@@ -24,112 +39,75 @@ class WorkedTimesListView(Gtk.ListBox):
         self._max_client_chars = 0
 
         self._worked_time_store = worked_time_store
-
-    def set_worked_times_list(self, model: Gio.ListStore):
-        self._all_items_in_same_year = len({item.start_time.get_year() for item in model}) == 1
-        self._all_items_in_same_month = self._all_items_in_same_year and len({item.start_time.get_month() for item in model}) == 1
-        self._all_items_in_same_day = self._all_items_in_same_month and len({item.start_time.get_day_of_month() for item in model}) == 1
-
-        self._max_task_chars = max(len(item.task) for item in model) if len(model) > 0 else 0
-        self._max_client_chars = max(len(item.client) for item in model) if len(model) > 0 else 0
-
-        self.bind_model(model, self._create_row)
-
-    def _create_row(self, item: WorkedTime):
-        row = Gtk.ListBoxRow()
-
-        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
-        box.homogenous = False
-        box.show()
-        row.add(box)
-
-        box.pack_start(self._create_task_entry(item), True, True, 0)
-        box.pack_start(self._create_client_entry(item), True, True, 0)
-        box.pack_start(self._create_start_time_button(item), False, False, 0)
-        to_label = Gtk.Label("to", xalign=0)
-        to_label.show()
-        box.pack_start(to_label, False, False, 0)
-        box.pack_start(self._create_end_time_button(item), False, False, 0)
-        box.pack_start(self._create_delete_button(item), False, False, 0)  # don't expand the delete button
-        box.show()
-        row.show()
+        self.connect("destroy", lambda *_args: self._disconnect_worked_times())
+
+    def set_worked_times_list(self, model: WorkedTimeSubset):
+        self._disconnect_worked_times()
+        for row in self._rows:
+            self._release_row(row)
+        self._rows = []
+        del self._unused_rows[PAGE_SIZE:]
+
+        # The records are sorted by start time, so the first and the last one tell whether all are in the same year etc.
+        records = model.records()
+        if len(records) > 0:
+            first, last = datetime_from_unix_usec(records[0].start_time), datetime_from_unix_usec(records[-1].start_time)
+            self._all_items_in_same_year = first.get_year() == last.get_year()
+            self._all_items_in_same_month = self._all_items_in_same_year and first.get_month() == last.get_month()
+            self._all_items_in_same_day = self._all_items_in_same_month and first.get_day_of_month() == last.get_day_of_month()
+        else:
+            self._all_items_in_same_year = self._all_items_in_same_month = self._all_items_in_same_day = False
+
+        self._max_task_chars = max((len(record.task) for record in records), default=0)
+        self._max_client_chars = max((len(record.client) for record in records), default=0)
+
+        self._worked_times = model
+        self._items_changed_handler_id = model.connect("items-changed", self._on_items_changed)
+        self._limit = PAGE_SIZE
+        self._fill()
+
+    def load_more(self, *_args):
+        """Shows the next page of worked times."""
+        if self._worked_times is not None and self._limit < self._worked_times.get_n_items():
+            self._limit += PAGE_SIZE
+            self._fill()
+
+    def _on_items_changed(self, model: WorkedTimeSubset, position: int, removed: int, added: int):
+        if position >= len(self._rows) and len(self._rows) >= self._limit:
+            return  # Only items without rows changed
+        for row in self._rows[position:position + removed]:
+            self._release_row(row)
+        del self._rows[position:position + removed]
+        for i in range(position, min(position + added, self._limit)):
+            row = self._acquire_row(model.get_item(i))
+            self.insert(row, i)
+            self._rows.insert(i, row)
+        self._fill()
+
+    def _fill(self):
+        """Adds or removes rows at the end, so exactly the worked times up to the limit have rows."""
+        n_rows = min(self._limit, self._worked_times.get_n_items())
+        while len(self._rows) > n_rows:
+            self._release_row(self._rows.pop())
+        while len(self._rows) < n_rows:
+            row = self._acquire_row(self._worked_times.get_item(len(self._rows)))
+            self.add(row)
+            self._rows.append(row)
+
+    def _acquire_row(self, item: WorkedTime) -> "_WorkedTimeRow":
+        row = self._unused_rows.pop() if self._unused_rows else _WorkedTimeRow(self)
+        row.bind(item)
         return row
 
-    def _create_start_time_button(self, item):
-        start_time_button = Gtk.Button()
-        start_time_button.set_relief(Gtk.ReliefStyle.NONE)
-
-        def on_start_time_clicked(*args):
-            picker = DatetimePicker(item.start_time)
-
-            picker.connect("datetime-changed", lambda picker, time: item.set_property("start-time", time))
-            picker.set_relative_to(start_time_button)
-            picker.show_all()
-            picker.popup()
-
-        def on_start_time_changed(*args):
-            start_time_button.set_label(self._get_start_time_string(item))
-
-        on_start_time_changed()
-        item.connect("notify::start-time", on_start_time_changed)
-        start_time_button.connect("clicked", on_start_time_clicked)
-        start_time_button.show()
-        return start_time_button
-
-    def _create_end_time_button(self, item):
-        end_time_label = Gtk.Button()
-        end_time_label.set_relief(Gtk.ReliefStyle.NONE)
-
-        def on_end_time_clicked(*args):
-            picker = DatetimePicker(item.end_time)
-
-            picker.connect("datetime-changed", lambda picker, time: item.set_property("end-time", time))
-            picker.set_relative_to(end_time_label)
-            picker.show_all()
-            picker.popup()
-
-        def on_end_time_changed(*args):
-            end_time_label.set_label(self._get_end_time_string(item))
-
-        on_end_time_changed()
-        item.connect("notify::end-time", on_end_time_changed)
-        end_time_label.connect("clicked", on_end_time_clicked)
-        end_time_label.show()
-        return end_time_label
-
-    def _create_client_entry(self, item: WorkedTime):
-        client_entry = Gtk.Entry(
-            text=item.client,
-            placeholder_text="Client",
-            completion=make_completer(self._worked_time_store.clients),
-        )
-        client_entry.set_width_chars(self._max_client_chars)
-        client_entry.set_has_frame(False)
-
-        item.bind_property("client", client_entry, "text", GObject.BindingFlags.BIDIRECTIONAL | GObject.BindingFlags.SYNC_CREATE)
-        client_entry.show()
-        return client_entry
-
-    def _create_task_entry(self, item: WorkedTime):
-        task_entry = Gtk.Entry(
-            text=item.task,
-            placeholder_text="Task",
-            completion=make_completer(self._worked_time_store.tasks),
-        )
-        task_entry.set_width_chars(self._max_task_chars)
-        task_entry.set_has_frame(False)
-
-        item.bind_property("task", task_entry, "text", GObject.BindingFlags.BIDIRECTIONAL | GObject.BindingFlags.SYNC_CREATE)
-        task_entry.show()
-        return task_entry
-
-    def _create_delete_button(self, item: WorkedTime):
-        delete_button = Gtk.Button()
-        delete_button.set_relief(Gtk.ReliefStyle.NONE)
-        delete_button.set_image(Gtk.Image.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON))
-        delete_button.connect("clicked", lambda *args: self._worked_time_store.remove_item(item))
-        delete_button.show()
-        return delete_button
+    def _release_row(self, row: "_WorkedTimeRow"):
+        row.unbind()
+        self.remove(row)
+        self._unused_rows.append(row)
+
+    def _disconnect_worked_times(self):
+        if self._items_changed_handler_id is not None:
+            self._worked_times.disconnect(self._items_changed_handler_id)
+            self._items_changed_handler_id = None
 
     def _get_start_time_string(self, item: WorkedTime) -> str:
         if self._all_items_in_same_day:
@@ -154,3 +132,85 @@ class WorkedTimesListView(Gtk.ListBox):
             return item.end_time.format("%b %d %H:%M")
         else:
             return item.end_time.format("%Y-%m-%d %H:%M")
+
+
+class _WorkedTimeRow(Gtk.ListBoxRow):
+    """A row of the WorkedTimesListView. Its widgets are created once and then bound to one worked time after another."""
+
+    def __init__(self, list_view: WorkedTimesListView):
+        super().__init__()
+        self._list_view = list_view
+        self._item: Optional[WorkedTime] = None
+        self._bindings: List[GObject.Binding] = []
+        self._handler_ids: List[int] = []
+
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
+        box.homogenous = False
+        self.add(box)
+
+        worked_time_store = list_view._worked_time_store
+        self.task_entry = Gtk.Entry(placeholder_text="Task", completion=make_completer(worked_time_store.tasks))
+        self.task_entry.set_has_frame(False)
+        box.pack_start(self.task_entry, True, True, 0)
+
+        self.client_entry = Gtk.Entry(placeholder_text="Client", completion=make_completer(worked_time_store.clients))
+        self.client_entry.set_has_frame(False)
+        box.pack_start(self.client_entry, True, True, 0)
+
+        self.start_time_button = Gtk.Button()
+        self.start_time_button.set_relief(Gtk.ReliefStyle.NONE)
+        self.start_time_button.connect("clicked", lambda *_args: self._pick_time("start-time", self.start_time_button))
+        box.pack_start(self.start_time_button, False, False, 0)
+
+        to_label = Gtk.Label("to", xalign=0)
+        box.pack_start(to_label, False, False, 0)
+
+        self.end_time_button = Gtk.Button()
+        self.end_time_button.set_relief(Gtk.ReliefStyle.NONE)
+        self.end_time_button.connect("clicked", lambda *_args: self._pick_time("end-time", self.end_time_button))
+        box.pack_start(self.end_time_button, False, False, 0)
+
+        delete_button = Gtk.Button()
+        delete_button.set_relief(Gtk.ReliefStyle.NONE)
+        delete_button.set_image(Gtk.Image.new_from_icon_name("edit-delete-symbolic", Gtk.IconSize.BUTTON))
+        delete_button.connect("clicked", lambda *_args: worked_time_store.remove_item(self._item))
+        box.pack_start(delete_button, False, False, 0)  # don't expand the delete button
+
+        self.show_all()
+
+    def bind(self, item: WorkedTime):
+        self._item = item
+        self.task_entry.set_width_chars(self._list_view._max_task_chars)
+        self.client_entry.set_width_chars(self._list_view._max_client_chars)
+        flags = GObject.BindingFlags.BIDIRECTIONAL | GObject.BindingFlags.SYNC_CREATE
+        self._bindings = [
+            item.bind_property("task", self.task_entry, "text", flags),
+            item.bind_property("client", self.client_entry, "text", flags),
+        ]
+        self._handler_ids = [
+            item.connect("notify::start-time", self._on_times_changed),
+            item.connect("notify::end-time", self._on_times_changed),
+        ]
+        self._on_times_changed()
+
+    def unbind(self):
+        for binding in self._bindings:
+            binding.unbind()
+        for handler_id in self._handler_ids:
+            self._item.disconnect(handler_id)
+        self._bindings = []
+        self._handler_ids = []
+        self._item = None
+
+    def _on_times_changed(self, *_args):
+        self.start_time_button.set_label(self._list_view._get_start_time_string(self._item))
+        self.end_time_button.set_label(self._list_view._get_end_time_string(self._item))
+
+    def _pick_time(self, property_name: str, button: Gtk.Button):
+        item = self._item
+        picker = DatetimePicker(item.get_property(property_name))
+
+        picker.connect("datetime-changed", lambda picker, time: item.set_property(property_name, time))
+        picker.set_relative_to(button)
+        picker.show_all()
+        picker.popup()
@@ -0,0 +1,167 @@
+import logging
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from wage_labor_record.activity_recorder import ActivityRecorder
+from wage_labor_record.idle_sources import IdleSource
+
+WatchCallback = Callable[[int], None]
+
+# How often to look for user activity while somebody waits for it. Idle sources can't tell when it happens.
+ACTIVE_POLL_INTERVAL = 1.0  # seconds
+# How often to look for user activity to re-arm idle watches that fired
+REARM_POLL_INTERVAL = 60.0  # seconds
+# Idle times may lag the wall clock by this much before counting as user activity
+_ACTIVITY_TOLERANCE = 1.0  # seconds
+
+
+class _IdleWatch:
+    __slots__ = ("threshold", "callback", "fired")
+
+    def __init__(self, threshold: float, callback: WatchCallback):
+        self.threshold = threshold
+        self.callback = callback
+        self.fired = False
+
+
+class GLibTimer:
+    """Calls back once after a delay from the GLib main loop."""
+
+    def add(self, delay: float, callback: Callable[[], None]) -> int:
+        """Calls `callback` after `delay` seconds and returns an id for `remove`."""
+        from gi.repository import GLib
+
+        def on_timeout():
+            callback()
+            return False
+        return GLib.timeout_add(math.ceil(delay * 1000), on_timeout)
+
+    def remove(self, timeout_id: int):
+        from gi.repository import GLib
+
+        GLib.source_remove(timeout_id)
+
+
+class IdleMonitor:
+    """
+    Notifies when the user has been idle for a while and when they become active again.
+
+    Idle sources can only be polled, so the monitor computes when the next watch can fire at the earliest
+    (the threshold minus the current idle time) and sleeps until then instead of polling at a fixed rate.
+    Nothing is polled while there are no watches.
+
+    :param recorder: If given, every polled idle time is recorded in it.
+    :param clock: Seconds on a monotonic clock, and `timer` schedules the next poll. Both can be replaced,
+        e.g. to test the monitor without a main loop.
+    """
+
+    def __init__(
+            self,
+            idle_source: IdleSource,
+            recorder: Optional[ActivityRecorder] = None,
+            clock: Callable[[], float] = time.monotonic,
+            timer: Optional[GLibTimer] = None):
+        self.idle_source = idle_source
+        self.recorder = recorder
+        self._clock = clock
+        self._timer = GLibTimer() if timer is None else timer
+        self._idle_watches: Dict[int, _IdleWatch] = dict()
+        self._active_watches: Dict[int, WatchCallback] = dict()
+        self._next_watch_id = 1
+        self._timeout_id: Optional[int] = None
+        self._last_idle_time: Optional[float] = None
+        self._last_poll = 0.0
+
+    def add_idle_watch(self, threshold: float, callback: WatchCallback) -> int:
+        """
+        Calls `callback` with the watch id whenever the user has been idle for `threshold` seconds.
+
+        The watch fires once per idle period and is re-armed when the user becomes active again.
+        """
+        watch_id = self._new_watch_id()
+        self._idle_watches[watch_id] = _IdleWatch(threshold, callback)
+        self.poll()
+        return watch_id
+
+    def add_active_watch(self, callback: WatchCallback) -> int:
+        """Calls `callback` with the watch id once, the next time the user becomes active."""
+        watch_id = self._new_watch_id()
+        self._active_watches[watch_id] = callback
+        self._last_idle_time = None  # only activity from now on counts
+        self.poll()
+        return watch_id
+
+    def remove_watch(self, watch_id: int):
+        self._idle_watches.pop(watch_id, None)
+        self._active_watches.pop(watch_id, None)
+        self._schedule()
+
+    def get_idle_time(self) -> float:
+        return self.idle_source.get_idle_time()
+
+    def poll(self):
+        """Checks the idle time now and fires the watches that are due."""
+        if not self._idle_watches and not self._active_watches:
+            self._schedule()
+            return
+
+        idle_time = self.idle_source.get_idle_time()
+        now = self._clock()
+        logging.debug(f"Idle time: {idle_time}")
+        if self.recorder is not None:
+            self.recorder.record(int(time.time() * 1_000_000), int(idle_time * 1_000_000))
+        became_active = (
+            self._last_idle_time is not None
+            and idle_time + _ACTIVITY_TOLERANCE < self._last_idle_time + (now - self._last_poll)
+        )
+        self._last_idle_time = idle_time
+        self._last_poll = now
+
+        if became_active:
+            for watch in self._idle_watches.values():
+                watch.fired = False
+            active_watches, self._active_watches = self._active_watches, dict()
+            for watch_id, callback in active_watches.items():
+                callback(watch_id)
+
+        for watch_id, watch in list(self._idle_watches.items()):
+            # Callbacks may remove watches, e.g. by running a dialog
+            if self._idle_watches.get(watch_id) is watch and not watch.fired and idle_time >= watch.threshold:
+                watch.fired = True
+                watch.callback(watch_id)
+
+        self._schedule()
+
+    def _schedule(self):
+        if self._timeout_id is not None:
+            self._timer.remove(self._timeout_id)
+            self._timeout_id = None
+        delay = self._next_wake()
+        if delay is not None:
+            self._timeout_id = self._timer.add(delay, self._on_timeout)
+
+    def _next_wake(self) -> Optional[float]:
+        """Seconds until the next watch might fire, or None to sleep until a watch is added."""
+        if self._last_idle_time is None:
+            return 0 if self._idle_watches or self._active_watches else None
+        idle_time = self._last_idle_time + (self._clock() - self._last_poll)
+        delays = [
+            watch.threshold - idle_time
+            for watch in self._idle_watches.values()
+            if not watch.fired
+        ]
+        if any(watch.fired for watch in self._idle_watches.values()):
+            delays.append(REARM_POLL_INTERVAL)
+        if self._active_watches:
+            delays.append(ACTIVE_POLL_INTERVAL)
+        return max(min(delays), 0) if delays else None
+
+    def _on_timeout(self):
+        self._timeout_id = None
+        self.poll()
+
+    def _new_watch_id(self) -> int:
+        watch_id = self._next_watch_id
+        self._next_watch_id += 1
+        return watch_id
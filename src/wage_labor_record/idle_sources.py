@@ -0,0 +1,183 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from typing import List, Optional, Type
+
+
+class IdleSource:
+    """Reports for how long the user has not touched keyboard or mouse."""
+    name = "none"
+
+    @classmethod
+    def create(cls) -> Optional["IdleSource"]:
+        """Returns an instance of the source, or None if it is not available on this system."""
+        return cls()
+
+    def get_idle_time(self) -> float:
+        """The idle time in seconds."""
+        return 0.0
+
+
+class FakeIdleSource(IdleSource):
+    """An idle source whose idle time is set by hand, e.g. to test idle handling headlessly."""
+    name = "fake"
+
+    def __init__(self, idle_time: float = 0.0):
+        self.idle_time = idle_time
+
+    def get_idle_time(self) -> float:
+        return self.idle_time
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),
+        ("event_mask", ctypes.c_ulong),
+    ]
+
+
+class XScreenSaverIdleSource(IdleSource):
+    """Queries the X server's screen saver extension in-process, which is what `xprintidle` does."""
+    name = "xscreensaver"
+
+    def __init__(self, xlib: ctypes.CDLL, xss: ctypes.CDLL, display: int):
+        self._xss = xss
+        self._display = display
+        self._root_window = xlib.XDefaultRootWindow(display)
+        self._info = xss.XScreenSaverAllocInfo()
+
+    @classmethod
+    def create(cls) -> Optional["XScreenSaverIdleSource"]:
+        if not os.environ.get("DISPLAY"):
+            return None
+        xlib_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if xlib_path is None or xss_path is None:
+            return None
+        try:
+            xlib = ctypes.CDLL(xlib_path)
+            xss = ctypes.CDLL(xss_path)
+        except OSError:
+            return None
+
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xss.XScreenSaverQueryExtension.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+        xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(_XScreenSaverInfo)
+        xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XScreenSaverInfo)]
+
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return None
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if not xss.XScreenSaverQueryExtension(display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            return None
+        return cls(xlib, xss, display)
+
+    def get_idle_time(self) -> float:
+        self._xss.XScreenSaverQueryInfo(self._display, self._root_window, self._info)
+        return self._info.contents.idle / 1000
+
+
+class MutterIdleMonitorSource(IdleSource):
+    """Asks the GNOME Shell idle monitor over D-Bus, which also works on Wayland."""
+    name = "mutter"
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+
+    @classmethod
+    def create(cls) -> Optional["MutterIdleMonitorSource"]:
+        from gi.repository import Gio, GLib
+
+        try:
+            proxy = Gio.DBusProxy.new_for_bus_sync(
+                Gio.BusType.SESSION,
+                Gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES | Gio.DBusProxyFlags.DO_NOT_CONNECT_SIGNALS,
+                None,
+                "org.gnome.Mutter.IdleMonitor",
+                "/org/gnome/Mutter/IdleMonitor/Core",
+                "org.gnome.Mutter.IdleMonitor",
+                None,
+            )
+            source = cls(proxy)
+            source.get_idle_time()  # fails if nobody owns the name
+            return source
+        except GLib.Error:
+            return None
+
+    def get_idle_time(self) -> float:
+        from gi.repository import Gio
+
+        (idle_ms,) = self._proxy.call_sync("GetIdletime", None, Gio.DBusCallFlags.NONE, 1000, None).unpack()
+        return idle_ms / 1000
+
+
+class XprintidleIdleSource(IdleSource):
+    """Spawns `xprintidle` for every query. Only used when nothing better is available."""
+    name = "xprintidle"
+
+    @classmethod
+    def create(cls) -> Optional["XprintidleIdleSource"]:
+        return cls() if shutil.which("xprintidle") else None
+
+    def get_idle_time(self) -> float:
+        return int(subprocess.check_output(["xprintidle"])) / 1000
+
+
+class _LastInputInfo(ctypes.Structure):
+    _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+
+class Win32IdleSource(IdleSource):
+    name = "win32"
+
+    @classmethod
+    def create(cls) -> Optional["Win32IdleSource"]:
+        return cls() if sys.platform == "win32" else None
+
+    def get_idle_time(self) -> float:
+        info = _LastInputInfo(cbSize=ctypes.sizeof(_LastInputInfo))
+        ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info))
+        return (ctypes.windll.kernel32.GetTickCount() - info.dwTime) / 1000
+
+
+IDLE_SOURCES: List[Type[IdleSource]] = [
+    Win32IdleSource,
+    XScreenSaverIdleSource,
+    MutterIdleMonitorSource,
+    XprintidleIdleSource,
+]
+
+
+def create_idle_source(name: Optional[str] = None) -> IdleSource:
+    """
+    Creates the best idle source available on this system.
+
+    :param name: The name of a specific source to use, e.g. "fake" for testing.
+        Defaults to the environment variable WLR_IDLE_SOURCE if it is set.
+    """
+    name = name or os.environ.get("WLR_IDLE_SOURCE")
+    if name == FakeIdleSource.name:
+        return FakeIdleSource()
+    for source_type in IDLE_SOURCES:
+        if name is not None and source_type.name != name:
+            continue
+        source = source_type.create()
+        if source is not None:
+            logging.info(f"Detecting idle time with {source.name}")
+            return source
+    logging.warning(f"No idle time detection for platform {sys.platform}")
+    return IdleSource()
+
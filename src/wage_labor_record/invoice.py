@@ -0,0 +1,164 @@
+"""
+Itemized invoices, one per client, rendered in parallel.
+
+The worked times are partitioned by client in a single pass into compact (task, start time, end time) tuples,
+which are cheap to send to worker processes. Each invoice is rendered from nothing but its work item,
+so the invoices are the same no matter how many workers render them.
+"""
+import html
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from wage_labor_record.export import format_duration
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+FORMATS = ("text", "html")
+
+InvoiceItem = Tuple[str, int, int]  # task, start time, end time in microseconds since the epoch
+# client, title of the period, items sorted by start time, format
+InvoiceWork = Tuple[str, str, Tuple[InvoiceItem, ...], str]
+
+
+def partition_by_client(records: Iterable[WorkedTimeRecord]) -> Dict[str, List[InvoiceItem]]:
+    """The worked times as invoice items by client, sorted by client. The items keep the order of `records`."""
+    partitions: Dict[str, List[InvoiceItem]] = dict()
+    for record in records:
+        items = partitions.get(record.client)
+        if items is None:
+            items = partitions[record.client] = []
+        items.append((record.task, record.start_time, record.end_time))
+    return dict(sorted(partitions.items()))
+
+
+def render_invoices(
+        partitions: Dict[str, List[InvoiceItem]],
+        period: str,
+        fmt: str = "text",
+        workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Renders one invoice per client.
+
+    :param partitions: Invoice items by client, e.g. from `partition_by_client`.
+    :param period: The title of the invoiced period, e.g. "2024-03".
+    :param fmt: One of FORMATS.
+    :param workers: The number of worker processes, by default one per CPU. With 1, the invoices are rendered
+        in this process.
+    :return: The invoices by client, in the order of `partitions`.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown invoice format: {fmt}")
+    work: List[InvoiceWork] = [(client, period, tuple(items), fmt) for client, items in partitions.items()]
+    workers = min(workers or os.cpu_count() or 1, len(work))
+    if workers <= 1:
+        invoices = map(render_invoice, work)
+        return dict(zip(partitions, invoices))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map keeps the order of the work items, whichever worker finishes first
+        invoices = executor.map(render_invoice, work, chunksize=max(1, len(work) // (4 * workers)))
+        return dict(zip(partitions, invoices))
+
+
+def render_invoice(work: InvoiceWork) -> str:
+    """Renders the itemized invoice of one client, with the subtotal per task and the total."""
+    client, period, items, fmt = work
+    subtotals: Dict[str, int] = dict()
+    for task, start_time, end_time in items:
+        subtotals[task] = subtotals.get(task, 0) + end_time - start_time
+    total = sum(subtotals.values())
+    if fmt == "html":
+        return _render_html(client, period, items, sorted(subtotals.items()), total)
+    return _render_text(client, period, items, sorted(subtotals.items()), total)
+
+
+def _render_text(
+        client: str,
+        period: str,
+        items: Tuple[InvoiceItem, ...],
+        subtotals: List[Tuple[str, int]],
+        total: int) -> str:
+    rows = [
+        (*_format_item_time(start_time, end_time), task, _hours(end_time - start_time))
+        for task, start_time, end_time in items
+    ]
+    sums = [(task, _hours(duration), format_duration(duration)) for task, duration in subtotals]
+    sums.append(("Total", _hours(total), format_duration(total)))
+    # Every column is as wide as its header or its widest value, whichever is wider
+    header = ("Date", "Time", "Task", "Hours")
+    widths = [max([len(name), *(len(row[column]) for row in rows)]) for column, name in enumerate(header)]
+    widths[3] = max([widths[3], *(len(hours) for _, hours, _ in sums)])
+    date_width, time_width, task_width, hours_width = widths
+    label_width = max([date_width + time_width + task_width + 4, *(len(label) for label, _, _ in sums)])
+
+    lines = [f"Invoice for {client or '(no client)'}", f"Period: {period}", ""]
+    for day, times, task, hours in [header, *rows]:
+        lines.append(f"{day:<{date_width}}  {times:<{time_width}}  {task:<{task_width}}  {hours:>{hours_width}}")
+    lines.append("")
+    for label, hours, duration in sums:
+        lines.append(f"{label:<{label_width}}  {hours:>{hours_width}}  ({duration})")
+    return "\n".join(lines) + "\n"
+
+
+def _render_html(
+        client: str,
+        period: str,
+        items: Tuple[InvoiceItem, ...],
+        subtotals: List[Tuple[str, int]],
+        total: int) -> str:
+    e = html.escape
+    title = f"Invoice for {e(client or '(no client)')}, {e(period)}"
+    rows = []
+    for task, start_time, end_time in items:
+        day, times = _format_item_time(start_time, end_time)
+        rows.append(f"<tr><td>{day}</td><td>{times}</td><td>{e(task)}</td><td class='hours'>{_hours(end_time - start_time)}</td></tr>")
+    subtotal_rows = [
+        f"<tr><td colspan='3'>{e(task)}</td><td class='hours'>{_hours(duration)}</td></tr>"
+        for task, duration in subtotals
+    ]
+    return "\n".join([
+        "<!DOCTYPE html>",
+        "<html>",
+        f"<head><meta charset='utf-8'><title>{title}</title>"
+        "<style>td.hours { text-align: right; } tfoot { font-weight: bold; }</style></head>",
+        "<body>",
+        f"<h1>{title}</h1>",
+        "<table>",
+        "<thead><tr><th>Date</th><th>Time</th><th>Task</th><th>Hours</th></tr></thead>",
+        "<tbody>", *rows, "</tbody>",
+        "<tbody>", *subtotal_rows, "</tbody>",
+        f"<tfoot><tr><td colspan='3'>Total</td><td class='hours'>{_hours(total)}</td></tr></tfoot>",
+        "</table>",
+        "</body>",
+        "</html>",
+    ]) + "\n"
+
+
+def _format_item_time(start_time: int, end_time: int) -> Tuple[str, str]:
+    start = datetime.fromtimestamp(start_time // 1_000_000)
+    end = datetime.fromtimestamp(end_time // 1_000_000)
+    return start.strftime("%Y-%m-%d"), f"{start:%H:%M}-{end:%H:%M}"
+
+
+def _hours(usec: int) -> str:
+    return f"{usec / 3_600_000_000:.2f}"
+
+
+def month_period(month: date) -> Tuple[date, date]:
+    """The first day of the month of `month` and the first day of the next month."""
+    first = month.replace(day=1)
+    return first, (first.replace(year=first.year + 1, month=1) if first.month == 12 else first.replace(month=first.month + 1))
+
+
+def invoice_filename(client: str, period: str, fmt: str, taken: Iterable[str] = ()) -> str:
+    """A file name for the invoice of `client` that is safe on all platforms and not in `taken`."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", client).strip("._") or "no_client"
+    extension = "html" if fmt == "html" else "txt"
+    filename = f"{period}-{slug}.{extension}"
+    number = 2
+    taken = set(taken)
+    while filename in taken:
+        filename = f"{period}-{slug}-{number}.{extension}"
+        number += 1
+    return filename
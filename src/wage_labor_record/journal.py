@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from wage_labor_record.persistence import FsyncBatcher, atomic_write
+
+
+class WorkedTimeJournal:
+    """
+    Persists worked times as a snapshot file plus an append-only journal.
+
+    The snapshot is the human-readable list of all worked times, keyed by a stable id.
+    Every edit is appended to the journal as a single line (add, update or remove),
+    so saving an edit does not depend on the size of the history.
+    Once the journal grows too long it is folded back into the snapshot (compaction).
+    The snapshot is replaced atomically, keeping `backups` previous versions,
+    and syncing the journal to disk is batched by an `FsyncBatcher`.
+    """
+
+    def __init__(
+            self,
+            snapshot_path: os.PathLike,
+            compaction_threshold: int = 1000,
+            backups: int = 3,
+            fsync_interval: float = 2.0):
+        self._snapshot_path = Path(snapshot_path)
+        self._journal_path = self._snapshot_path.with_suffix(".journal")
+        self._compaction_threshold = compaction_threshold
+        self._backups = backups
+        self._journal_length = 0
+        self._snapshot_outdated = False
+        self._journal_file = None
+        self._fsync_batcher = FsyncBatcher(fsync_interval)
+
+    @property
+    def compaction_threshold(self) -> int:
+        return self._compaction_threshold
+
+    @property
+    def length(self) -> int:
+        """The number of entries in the journal."""
+        return self._journal_length
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._snapshot_outdated or self._journal_length >= self._compaction_threshold
+
+    def load(self, snapshot: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """
+        Loads the snapshot and replays the journal on top of it.
+
+        Records from a snapshot that was written before ids were introduced are given a fresh id.
+        The snapshot then needs to be compacted before anything is appended to the journal,
+        so the ids are stable from now on.
+        The same holds when the journal contains a malformed line, so no later append is glued to it.
+
+        :param snapshot: The snapshot records by id, if they were already loaded from a faster source than the
+            snapshot file, such as the snapshot cache. Journal entries replayed on top of it are dicts.
+        :return: The worked time records, in the order they were first added.
+        """
+        records: Dict[str, Any] = dict()
+        needs_rewrite = False
+        if snapshot is not None:
+            records.update(snapshot)
+        elif self._snapshot_path.exists():
+            with open(self._snapshot_path, "r") as f:
+                for d in json.load(f):
+                    if "id" not in d:
+                        d["id"] = new_id()
+                        needs_rewrite = True
+                    records[d["id"]] = d
+
+        self._journal_length = 0
+        if self._journal_path.exists():
+            with open(self._journal_path, "r") as f:
+                for line_number, line in enumerate(f, start=1):
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash in the middle of an append leaves a truncated last line
+                        logging.warning(f"Skipping malformed line {line_number} in {self._journal_path}")
+                        needs_rewrite = True
+                        continue
+                    self._replay(records, entry)
+                    self._journal_length += 1
+
+        self._snapshot_outdated = needs_rewrite
+        return list(records.values())
+
+    @staticmethod
+    def _replay(records: Dict[str, Any], entry: dict):
+        op = entry.pop("op")
+        if op in ("add", "update"):
+            records[entry["id"]] = entry
+        elif op == "remove":
+            records.pop(entry["id"], None)
+        else:
+            logging.warning(f"Unknown journal operation: {op}")
+
+    def add(self, record: dict):
+        self._append(dict(op="add", **record))
+
+    def update(self, record: dict):
+        self._append(dict(op="update", **record))
+
+    def remove(self, record_id: str):
+        self._append(dict(op="remove", id=record_id))
+
+    def _append(self, entry: dict):
+        if self._journal_file is None:
+            self._journal_file = open(self._journal_path, "a")
+        self._journal_file.write(json.dumps(entry) + "\n")
+        self._journal_file.flush()
+        self._fsync_batcher.written(self._journal_file)
+        self._journal_length += 1
+
+    def compact(self, records: Iterable[dict]):
+        """Writes all records to the snapshot and truncates the journal."""
+        logging.info(f"Compacting worked times journal into {self._snapshot_path}")
+        atomic_write(self._snapshot_path, json.dumps(list(records), indent=2), backups=self._backups)
+        self.close()
+        # Replaying the journal on top of the new snapshot is idempotent, so a crash before this point is harmless
+        open(self._journal_path, "w").close()
+        self._journal_length = 0
+        self._snapshot_outdated = False
+
+    def sync(self):
+        """Syncs journal entries that the batched fsync has not covered yet."""
+        if self._journal_file is not None:
+            self._fsync_batcher.sync(self._journal_file)
+
+    def close(self):
+        if self._journal_file is not None:
+            self.sync()
+            self._journal_file.close()
+            self._journal_file = None
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
@@ -0,0 +1,59 @@
+from typing import Dict, Iterable, Iterator
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk
+
+
+class NameCatalog:
+    """
+    The distinct names (e.g. tasks or clients) used in the history, as a Gtk.ListStore for completions and selectors.
+
+    Every name is reference counted, so adding or removing one use of a name costs O(1)
+    instead of rescanning the history, and a name is dropped from the model once it is no longer used.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.model = Gtk.ListStore(str)
+        self._counts: Dict[str, int] = dict()
+        self._iters: Dict[str, Gtk.TreeIter] = dict()
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._counts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def count(self, name: str) -> int:
+        return self._counts.get(name, 0)
+
+    def add(self, name: str, uses: int = 1) -> bool:
+        """Adds one (or `uses`) use of `name` and returns whether it is a new name."""
+        count = self._counts.get(name, 0)
+        self._counts[name] = count + uses
+        if count == 0:
+            self._iters[name] = self.model.append([name])
+            return True
+        return False
+
+    def remove(self, name: str, uses: int = 1) -> bool:
+        """Removes one (or `uses`) use of `name` and returns whether it was the last one."""
+        count = self._counts[name]
+        if count <= uses:
+            del self._counts[name]
+            self.model.remove(self._iters.pop(name))
+            return True
+        self._counts[name] = count - uses
+        return False
+
+    def replace(self, old_name: str, new_name: str) -> bool:
+        """Moves one use from `old_name` to `new_name` and returns whether the set of names changed."""
+        added = self.add(new_name)
+        removed = self.remove(old_name)
+        return added or removed
@@ -0,0 +1,168 @@
+"""
+The layout of the worked time history split into one partition per month.
+
+Next to the legacy snapshot `worked_times.json`, the directory `worked_times/` holds for every month in which
+worked times start a snapshot (`2026-10.json`) with its journal and cache, just like the legacy single file had.
+The manifest (`manifest.json`) lists the partitions with their totals and the tasks and clients used in them,
+so the app knows the whole history without loading old partitions.
+"""
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from wage_labor_record.persistence import atomic_write
+from wage_labor_record.rollups import local_day, local_midnight
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+MANIFEST_VERSION = 1
+
+
+def partition_directory(history_path: os.PathLike) -> Path:
+    return Path(history_path).with_suffix("")
+
+
+def partition_path(directory: Path, key: str) -> Path:
+    return directory / f"{key}.json"
+
+
+def manifest_path(directory: Path) -> Path:
+    return directory / "manifest.json"
+
+
+def partition_key(usec: int) -> str:
+    """The partition of a worked time starting at `usec` microseconds since the epoch: its local month as YYYY-MM."""
+    d = date.fromordinal(local_day(usec))
+    return f"{d.year:04}-{d.month:02}"
+
+
+def _month(key: str) -> date:
+    return date(int(key[:4]), int(key[5:7]), 1)
+
+
+def _key(month: date) -> str:
+    return f"{month.year:04}-{month.month:02}"
+
+
+def previous_key(key: str) -> str:
+    month = _month(key)
+    return _key(month.replace(year=month.year - 1, month=12) if month.month == 1 else month.replace(month=month.month - 1))
+
+
+def partition_bounds(key: str) -> Tuple[int, int]:
+    """The start of the month of partition `key` and the start of the next month in microseconds since the epoch."""
+    month = _month(key)
+    next_month = month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+    return local_midnight(month.toordinal()), local_midnight(next_month.toordinal())
+
+
+def keys_overlapping(keys: Iterable[str], start_time: Optional[int] = None, end_time: Optional[int] = None) -> List[str]:
+    """
+    The partitions among `keys` that may hold worked time between `start_time` and `end_time`, sorted.
+
+    Worked times can run into the next month, so the month before `start_time` is included as well.
+    Worked times filed under another time zone can start up to a day outside of their month,
+    so `end_time` gets a day of margin.
+    """
+    low = None if start_time is None else previous_key(partition_key(start_time))
+    high = None if end_time is None else partition_key(end_time + 24 * 60 * 60 * 1_000_000)
+    return sorted(key for key in keys if (low is None or key >= low) and (high is None or key <= high))
+
+
+class PartitionSummary:
+    """The number and total duration of the worked times in a partition, overall and by task and client."""
+    __slots__ = ("count", "total", "tasks", "clients")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        # name -> [number of worked times, total duration in microseconds]
+        self.tasks: Dict[str, List[int]] = dict()
+        self.clients: Dict[str, List[int]] = dict()
+
+    @classmethod
+    def of_records(cls, records: Iterable[WorkedTimeRecord]) -> "PartitionSummary":
+        summary = cls()
+        for record in records:
+            summary.add(record.task, record.client, record.end_time - record.start_time)
+        return summary
+
+    def add(self, task: str, client: str, duration: int, sign: int = 1):
+        """Adds (or with sign=-1 removes) one worked time."""
+        self.count += sign
+        self.total += sign * duration
+        for names, name in ((self.tasks, task), (self.clients, client)):
+            usage = names.setdefault(name, [0, 0])
+            usage[0] += sign
+            usage[1] += sign * duration
+            if usage[0] == 0:
+                del names[name]
+
+    def __eq__(self, other):
+        return isinstance(other, PartitionSummary) and self.asdict() == other.asdict()
+
+    def asdict(self) -> dict:
+        return dict(count=self.count, total=self.total, tasks=self.tasks, clients=self.clients)
+
+    @classmethod
+    def fromdict(cls, d: dict) -> "PartitionSummary":
+        summary = cls()
+        summary.count = d["count"]
+        summary.total = d["total"]
+        summary.tasks = {name: list(usage) for name, usage in d["tasks"].items()}
+        summary.clients = {name: list(usage) for name, usage in d["clients"].items()}
+        return summary
+
+
+class Manifest:
+    """The partitions of the history with their summaries."""
+
+    def __init__(self, directory: Path, partitions: Optional[Dict[str, PartitionSummary]] = None):
+        self.directory = directory
+        self.partitions: Dict[str, PartitionSummary] = partitions if partitions is not None else dict()
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["Manifest"]:
+        """Loads the manifest, or returns None if the history is not partitioned (yet)."""
+        try:
+            with open(manifest_path(directory), "r") as f:
+                d = json.load(f)
+        except FileNotFoundError:
+            return None
+        if d.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {d.get('version')} in {directory}")
+        return cls(directory, {key: PartitionSummary.fromdict(s) for key, s in d["partitions"].items()})
+
+    def summary(self, key: str) -> PartitionSummary:
+        """The summary of partition `key`, which is added if it does not exist yet."""
+        summary = self.partitions.get(key)
+        if summary is None:
+            summary = self.partitions[key] = PartitionSummary()
+        return summary
+
+    def serialize(self) -> str:
+        return json.dumps(dict(
+            version=MANIFEST_VERSION,
+            partitions={key: self.partitions[key].asdict() for key in sorted(self.partitions)},
+        ), indent=2)
+
+    def store(self, data: Optional[str] = None):
+        """Writes the manifest, or the given result of `serialize`, e.g. captured before handing it to another thread."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write(manifest_path(self.directory), self.serialize() if data is None else data)
+
+
+def snapshot_paths(
+        history_path: os.PathLike,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None) -> List[Path]:
+    """
+    The snapshot files to read for the worked time between `start_time` and `end_time`:
+    the overlapping partitions, or the legacy single file if the history is not partitioned.
+    """
+    directory = partition_directory(history_path)
+    manifest = Manifest.load(directory)
+    if manifest is None:
+        return [Path(history_path)]
+    return [partition_path(directory, key) for key in keys_overlapping(manifest.partitions, start_time, end_time)]
@@ -0,0 +1,121 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import IO, Optional, Union
+
+
+def atomic_write(path: os.PathLike, data: Union[str, bytes], backups: int = 0):
+    """
+    Replaces the file at `path` with `data` such that a crash or a full disk never leaves a truncated file behind.
+
+    The data is written to a temporary file next to the target, synced, and then renamed over the target.
+    Optionally the previous versions of the file are kept as `<name>.1` (newest) to `<name>.<backups>` (oldest).
+
+    :param path: The file to replace.
+    :param data: The new content of the file.
+    :param backups: How many previous versions of the file to keep.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if backups > 0 and path.exists():
+        _rotate_backups(path, backups)
+
+    os.replace(tmp_path, path)
+    _fsync_directory(path.parent)
+
+
+def _backup_path(path: Path, number: int) -> Path:
+    return path.with_name(f"{path.name}.{number}")
+
+
+def _rotate_backups(path: Path, backups: int):
+    for number in range(backups - 1, 0, -1):
+        if _backup_path(path, number).exists():
+            os.replace(_backup_path(path, number), _backup_path(path, number + 1))
+    newest_backup = _backup_path(path, 1)
+    # The target is replaced by a rename, so a hard link keeps the old content without copying it
+    try:
+        if newest_backup.exists():
+            os.remove(newest_backup)
+        os.link(path, newest_backup)
+    except OSError:
+        shutil.copy2(path, newest_backup)
+
+
+def _fsync_directory(directory: Path):
+    # Makes the rename itself durable. Not supported on all platforms.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FsyncBatcher:
+    """
+    Limits how often a file that is appended to frequently is synced to disk.
+
+    Instead of syncing after every write, a file is synced at most once per `interval` seconds.
+    Writes in between are only in the OS cache: a power loss may drop them, but it never damages what was synced before.
+    They are synced once the interval is over, by a timer thread if nothing else is written by then,
+    so a crash loses at most the writes of the last `interval` seconds.
+    Call `sync` before closing the file to make sure nothing stays unsynced.
+    """
+
+    def __init__(self, interval: float = 2.0):
+        self._interval = interval
+        self._last_sync = float("-inf")
+        self._pending = False
+        self._timer: Optional[threading.Timer] = None
+        # The timer syncs from its own thread
+        self._lock = threading.Lock()
+
+    def written(self, f: IO):
+        """Notifies the batcher that `f` was written to (and flushed)."""
+        with self._lock:
+            delay = self._last_sync + self._interval - time.monotonic()
+            if delay <= 0:
+                self._fsync(f)
+            else:
+                self._pending = True
+                if self._timer is None:
+                    self._timer = threading.Timer(delay, self._on_deadline, args=(f,))
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def sync(self, f: IO):
+        with self._lock:
+            if self._pending:
+                self._fsync(f)
+
+    def _on_deadline(self, f: IO):
+        with self._lock:
+            self._timer = None
+            if not self._pending or f.closed:
+                return
+            try:
+                self._fsync(f)
+            except OSError:
+                # Still pending, so the next write or sync tries again
+                logging.exception("Syncing batched writes failed")
+
+    def _fsync(self, f: IO):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        os.fsync(f.fileno())
+        self._last_sync = time.monotonic()
+        self._pending = False
@@ -0,0 +1,120 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+WorkItem = Tuple[str, str]  # task, client
+
+
+class RecentWorkItems:
+    """
+    The task-client pairs that were worked on, ordered by when they were last worked on.
+
+    The pairs are kept in an ordered dict from least to most recently worked on.
+    Adding a worked time that is the newest one, which is by far the most common change, moves its pair to the end.
+    Changes that move a pair somewhere into the middle mark the order as outdated,
+    and it is restored on the next query by sorting the (few) distinct pairs.
+    """
+
+    def __init__(self, records: Iterable[WorkedTimeRecord] = ()):
+        # Start times of the worked times of each pair, sorted
+        self._start_times: Dict[WorkItem, List[int]] = dict()
+        for record in records:
+            self._start_times.setdefault((record.task, record.client), []).append(record.start_time)
+        for start_times in self._start_times.values():
+            start_times.sort()
+        # None while the order is outdated
+        self._order: "Optional[OrderedDict[WorkItem, None]]" = None
+        self._sort()
+
+    def __len__(self):
+        return len(self._start_times)
+
+    def most_recent(self, n: int) -> List[WorkItem]:
+        """The n most recently worked on task-client pairs, most recent first."""
+        if self._order is None:
+            self._sort()
+        return list(islice(reversed(self._order), n))
+
+    def add(self, work_item: WorkItem, start_time: int) -> bool:
+        """
+        Registers a worked time on `work_item` starting at `start_time`.
+
+        :return: Whether the order of the pairs changed.
+        """
+        start_times = self._start_times.get(work_item)
+        if start_times is None:
+            start_times = self._start_times[work_item] = []
+        elif start_time < start_times[-1]:
+            insort(start_times, start_time)
+            return False
+        start_times.append(start_time)
+
+        if self._order is None:
+            return True
+        if len(start_times) > 1 and next(reversed(self._order)) == work_item:
+            return False
+        if not self._order or start_time >= self._start_times[next(reversed(self._order))][-1]:
+            self._order[work_item] = None
+            self._order.move_to_end(work_item)
+        else:
+            self._order = None
+        return True
+
+    def remove(self, work_item: WorkItem, start_time: int) -> bool:
+        """
+        Unregisters a worked time on `work_item` starting at `start_time`.
+
+        :return: Whether the order of the pairs changed.
+        """
+        start_times = self._start_times[work_item]
+        is_latest = start_time == start_times[-1]
+        del start_times[bisect_left(start_times, start_time)]
+        if not start_times:
+            del self._start_times[work_item]
+            if self._order is not None:
+                del self._order[work_item]
+            return True
+        if is_latest and start_times[-1] != start_time:
+            self._order = None
+            return True
+        return False
+
+    def update(self, record: WorkedTimeRecord, field: str, old_value) -> bool:
+        """
+        Re-registers `record` after its `field` was changed from `old_value`.
+
+        :return: Whether the order of the pairs changed.
+        """
+        if field == "start_time":
+            old_work_item, old_start_time = (record.task, record.client), old_value
+        elif field == "task":
+            old_work_item, old_start_time = (old_value, record.client), record.start_time
+        elif field == "client":
+            old_work_item, old_start_time = (record.task, old_value), record.start_time
+        else:
+            return False
+        removed = self.remove(old_work_item, old_start_time)
+        added = self.add((record.task, record.client), record.start_time)
+        return removed or added
+
+    def _sort(self):
+        self._order = OrderedDict(
+            (work_item, None)
+            for work_item in sorted(self._start_times, key=lambda work_item: self._start_times[work_item][-1])
+        )
+
+
+def top_work_items_by_time(records: Iterable[WorkedTimeRecord], n: int) -> List[Tuple[WorkItem, int]]:
+    """
+    The n task-client pairs with the most total time in `records`.
+
+    :return: (pair, total duration in microseconds) tuples, the most worked on pair first.
+    """
+    totals: Dict[WorkItem, int] = dict()
+    for record in records:
+        work_item = (record.task, record.client)
+        totals[work_item] = totals.get(work_item, 0) + record.end_time - record.start_time
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:n]
@@ -0,0 +1,433 @@
+"""
+Group-by reports over the whole worked time history, e.g. the worked time by client and month,
+by task and week or a weekday × hour heatmap.
+
+The worked times are exported into columns (int64 start and end times, int32 task and client codes).
+If NumPy is installed, the reports are computed vectorized on those columns.
+Otherwise, the same algorithms run in plain Python and give identical results, just slower.
+"""
+from array import array
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from wage_labor_record.rollups import RollupKey, local_day, local_midnight
+from wage_labor_record.snapshot_cache import SnapshotColumns
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+# Imported on first use, since importing NumPy takes longer than a report over the rollups
+numpy = None
+_numpy_imported = False
+
+# The keys to group by: the task, the client, the local day, the Monday of the week, the first of the month,
+# the day of the week (0 is Monday) and the hour since local midnight
+GROUP_KEYS = ("task", "client", "day", "week", "month", "weekday", "hour")
+ROLLUP_GROUP_KEYS = GROUP_KEYS[:-1]
+
+_HOUR = 3600 * 1_000_000
+
+
+class ReportColumns(NamedTuple):
+    """The worked times in columnar form, with task and client names stored once."""
+    start_times: array  # int64 microseconds since the epoch
+    end_times: array  # int64 microseconds since the epoch
+    task_codes: array  # int32 indices into tasks
+    client_codes: array  # int32 indices into clients
+    tasks: List[str]
+    clients: List[str]
+
+    @classmethod
+    def from_records(cls, records: Iterable[WorkedTimeRecord]) -> "ReportColumns":
+        return cls.from_snapshot_columns(SnapshotColumns.from_rows(record.asrow() for record in records))
+
+    @classmethod
+    def from_snapshot_columns(cls, columns: SnapshotColumns) -> "ReportColumns":
+        return cls(
+            columns.start_times, columns.end_times, columns.task_codes, columns.client_codes,
+            columns.tasks, columns.clients)
+
+
+def has_numpy() -> bool:
+    _import_numpy()
+    return numpy is not None
+
+
+def grouped_sums(
+        columns: ReportColumns,
+        keys: Sequence[str],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None,
+        use_numpy: Optional[bool] = None) -> Dict[tuple, int]:
+    """
+    Sums up the worked time grouped by `keys`.
+
+    Worked times are split at local midnight, so each day, week and month gets exactly its share.
+    When grouping by hour, they are also split at every full hour since local midnight, so each hour gets its share
+    as well. On the days daylight saving time starts or ends, the day has 23 or 25 such hours.
+
+    :param keys: Names from GROUP_KEYS. Days, weeks and months are given as `datetime.date`.
+    :param start_time: Only count the worked time after this time in microseconds since the epoch.
+    :param end_time: Only count the worked time before this time in microseconds since the epoch.
+    :param tasks: Only count the worked time on these tasks, or on all tasks if None.
+    :param clients: Only count the worked time for these clients, or for all clients if None.
+    :param use_numpy: Whether to use NumPy. By default, NumPy is used if it is installed.
+    :return: The worked time in microseconds by tuples of key values, sorted by those tuples.
+    """
+    _check_keys(keys, GROUP_KEYS)
+    if _use_numpy(use_numpy):
+        codes, durations, days = _numpy_grouped_sums(columns, keys, _Filter(start_time, end_time, tasks, clients))
+    else:
+        codes, durations, days = _python_grouped_sums(columns, keys, _Filter(start_time, end_time, tasks, clients))
+    return _decode_sums(codes, durations, [_decoder(key, columns.tasks, columns.clients, days.start) for key in keys])
+
+
+def grouped_sums_from_rollups(
+        buckets: Iterable[Tuple[RollupKey, int]],
+        keys: Sequence[str],
+        start_day: Optional[int] = None,
+        end_day: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None) -> Dict[tuple, int]:
+    """
+    Like `grouped_sums`, but sums up daily rollup buckets, which is much faster than going through the worked times.
+
+    Buckets may repeat a key and be negative, e.g. to apply changes on top of cached rollups.
+    Grouping by hour is not possible, since the rollups only know days.
+
+    :param start_day: The first day as proleptic Gregorian ordinal, or None for no bound.
+    :param end_day: The day after the last day, or None for no bound.
+    """
+    _check_keys(keys, ROLLUP_GROUP_KEYS)
+    sums: Dict[tuple, int] = dict()
+    for (day, task, client), duration in buckets:
+        if (start_day is not None and day < start_day) or (end_day is not None and day >= end_day):
+            continue
+        if (tasks is not None and task not in tasks) or (clients is not None and client not in clients):
+            continue
+        key_codes = []
+        for key in keys:
+            if key == "task":
+                key_codes.append(task)
+            elif key == "client":
+                key_codes.append(client)
+            elif key == "day":
+                key_codes.append(day)
+            elif key == "week":
+                key_codes.append(day - (day - 1) % 7)
+            elif key == "month":
+                d = date.fromordinal(day)
+                key_codes.append(d.year * 12 + d.month - 1)
+            else:
+                key_codes.append((day - 1) % 7)
+        key_codes = tuple(key_codes)
+        sums[key_codes] = sums.get(key_codes, 0) + duration
+    # Changes applied on top of cached rollups can cancel out
+    codes = [key_codes for key_codes, duration in sums.items() if duration != 0]
+    return _decode_sums(codes, [sums[key_codes] for key_codes in codes], [_decoder(key, None, None, 0) for key in keys])
+
+
+def duration_histogram(
+        columns: ReportColumns,
+        bin_edges: Sequence[int],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None,
+        use_numpy: Optional[bool] = None) -> List[int]:
+    """
+    Counts the worked times by duration.
+
+    Like `numpy.histogram`, the bins are half-open [edge, next edge) except for the last one, which includes its
+    right edge. Durations outside of the bins are not counted.
+
+    :param bin_edges: Increasing durations in microseconds.
+    :return: The number of worked times in each bin.
+    """
+    durations = _clipped_durations(columns, _Filter(start_time, end_time, tasks, clients), use_numpy)
+    n_bins = len(bin_edges) - 1
+    if n_bins < 1:
+        raise ValueError("At least two bin edges are needed")
+    if _use_numpy(use_numpy):
+        edges = numpy.asarray(bin_edges, dtype=numpy.int64)
+        bins = numpy.searchsorted(edges, durations, side="right") - 1
+        bins[durations == edges[-1]] = n_bins - 1
+        bins = bins[(bins >= 0) & (bins < n_bins)]
+        return numpy.bincount(bins, minlength=n_bins).tolist()
+
+    counts = [0] * n_bins
+    last_edge = bin_edges[-1]
+    for duration in durations:
+        i = n_bins - 1 if duration == last_edge else bisect_right(bin_edges, duration) - 1
+        if 0 <= i < n_bins:
+            counts[i] += 1
+    return counts
+
+
+def duration_percentiles(
+        columns: ReportColumns,
+        percentiles: Sequence[float],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None,
+        use_numpy: Optional[bool] = None) -> List[float]:
+    """
+    The percentiles of the durations of the worked times in microseconds.
+
+    Like the default of `numpy.percentile`, percentiles between two durations are interpolated linearly.
+    """
+    if any(not 0 <= q <= 100 for q in percentiles):
+        raise ValueError("Percentiles must be between 0 and 100")
+    durations = _clipped_durations(columns, _Filter(start_time, end_time, tasks, clients), use_numpy)
+    if len(durations) == 0:
+        raise ValueError("There are no worked times to compute percentiles of")
+    if _use_numpy(use_numpy):
+        durations = numpy.sort(durations)
+        positions = numpy.asarray(percentiles, dtype=numpy.float64) / 100 * (len(durations) - 1)
+        low = numpy.floor(positions).astype(numpy.int64)
+        high = numpy.ceil(positions).astype(numpy.int64)
+        differences = (durations[high] - durations[low]).astype(numpy.float64)
+        return (durations[low].astype(numpy.float64) + differences * (positions - low)).tolist()
+
+    durations = sorted(durations)
+    result = []
+    for q in percentiles:
+        position = q / 100 * (len(durations) - 1)
+        low, high = int(position // 1), -int(-position // 1)
+        result.append(float(durations[low]) + float(durations[high] - durations[low]) * (position - low))
+    return result
+
+
+def _import_numpy():
+    global numpy, _numpy_imported
+    if not _numpy_imported:
+        _numpy_imported = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+
+def _use_numpy(use_numpy: Optional[bool]) -> bool:
+    _import_numpy()
+    if use_numpy and numpy is None:
+        raise RuntimeError("NumPy is not installed")
+    return numpy is not None if use_numpy is None else use_numpy
+
+
+class _Filter(NamedTuple):
+    start_time: Optional[int]
+    end_time: Optional[int]
+    tasks: Optional[Set[str]]
+    clients: Optional[Set[str]]
+
+    def codes(self, columns: ReportColumns) -> Tuple[Optional[Set[int]], Optional[Set[int]]]:
+        """The codes of the tasks and clients to include, or None to include all."""
+        task_codes = None if self.tasks is None else {code for code, task in enumerate(columns.tasks) if task in self.tasks}
+        client_codes = None if self.clients is None else {
+            code for code, client in enumerate(columns.clients) if client in self.clients}
+        return task_codes, client_codes
+
+
+def _check_keys(keys: Sequence[str], valid_keys: Sequence[str]):
+    unknown_keys = set(keys) - set(valid_keys)
+    if unknown_keys:
+        raise ValueError(f"Unknown keys to group by: {', '.join(sorted(unknown_keys))}")
+
+
+def _decode_sums(codes: Iterable[tuple], durations: Iterable[int], decoders: list) -> Dict[tuple, int]:
+    sums = {
+        tuple(decode(code) for decode, code in zip(decoders, key_codes)): duration
+        for key_codes, duration in zip(codes, durations)
+    }
+    return dict(sorted(sums.items()))
+
+
+def _decoder(key: str, tasks: Optional[List[str]], clients: Optional[List[str]], first_day: int):
+    """Turns the codes of `key` into values. Without tables of tasks and clients, they are their own codes."""
+    if key == "task":
+        return tasks.__getitem__ if tasks is not None else str
+    if key == "client":
+        return clients.__getitem__ if clients is not None else str
+    if key in ("day", "week"):
+        return lambda code: date.fromordinal(first_day + code)
+    if key == "month":
+        return lambda code: date(code // 12, code % 12 + 1, 1)
+    return int
+
+
+def _day_range(start_time: int, end_time: int) -> Tuple[range, List[int]]:
+    """The local days from `start_time` to `end_time` and their midnights, including the one after the last day."""
+    days = range(local_day(start_time), local_day(end_time - 1) + 1)
+    return days, [local_midnight(day) for day in range(days.start, days.stop + 1)]
+
+
+def _month_codes(days: range) -> List[int]:
+    months = []
+    for day in days:
+        d = date.fromordinal(day)
+        months.append(d.year * 12 + d.month - 1)
+    return months
+
+
+# Pure Python
+
+def _python_clip(columns: ReportColumns, selection: _Filter) -> Iterable[Tuple[int, int, int]]:
+    """(index, start time, end time) of the selected worked times, clipped to their period, without empty ones."""
+    start_time, end_time = selection.start_time, selection.end_time
+    task_codes, client_codes = selection.codes(columns)
+    for i, (start, end) in enumerate(zip(columns.start_times, columns.end_times)):
+        if task_codes is not None and columns.task_codes[i] not in task_codes:
+            continue
+        if client_codes is not None and columns.client_codes[i] not in client_codes:
+            continue
+        if start_time is not None and start < start_time:
+            start = start_time
+        if end_time is not None and end > end_time:
+            end = end_time
+        if start < end:
+            yield i, start, end
+
+
+def _clipped_durations(columns: ReportColumns, selection: _Filter, use_numpy: Optional[bool]):
+    if _use_numpy(use_numpy):
+        _, starts, ends = _numpy_clip(columns, selection)
+        return ends - starts
+    return [end - start for _, start, end in _python_clip(columns, selection)]
+
+
+def _python_grouped_sums(
+        columns: ReportColumns,
+        keys: Sequence[str],
+        selection: _Filter) -> Tuple[Iterable[tuple], Iterable[int], range]:
+    clipped = list(_python_clip(columns, selection))
+    if not clipped:
+        return [], [], range(0)
+    days, midnights = _day_range(min(start for _, start, _ in clipped), max(end for _, _, end in clipped))
+    months = _month_codes(days) if "month" in keys else []
+
+    by_hour = "hour" in keys
+    sums: Dict[tuple, int] = dict()
+    for i, start, end in clipped:
+        day = bisect_right(midnights, start) - 1
+        while start < end:
+            piece_end = min(end, midnights[day + 1])
+            if by_hour:
+                hour = (start - midnights[day]) // _HOUR
+                piece_end = min(piece_end, midnights[day] + (hour + 1) * _HOUR)
+            key_codes = []
+            for key in keys:
+                if key == "task":
+                    key_codes.append(columns.task_codes[i])
+                elif key == "client":
+                    key_codes.append(columns.client_codes[i])
+                elif key == "day":
+                    key_codes.append(day)
+                elif key == "week":
+                    key_codes.append(day - (days.start + day - 1) % 7)
+                elif key == "month":
+                    key_codes.append(months[day])
+                elif key == "weekday":
+                    key_codes.append((days.start + day - 1) % 7)
+                else:
+                    key_codes.append(hour)
+            key_codes = tuple(key_codes)
+            sums[key_codes] = sums.get(key_codes, 0) + piece_end - start
+            start = piece_end
+            if start == midnights[day + 1]:
+                day += 1
+    return sums.keys(), sums.values(), days
+
+
+# NumPy
+
+def _numpy_clip(columns: ReportColumns, selection: _Filter):
+    """Like `_python_clip`, but as arrays of indices, start times and end times."""
+    starts = _numpy_column(columns.start_times, numpy.int64)
+    ends = _numpy_column(columns.end_times, numpy.int64)
+    if selection.start_time is not None:
+        starts = numpy.maximum(starts, selection.start_time)
+    if selection.end_time is not None:
+        ends = numpy.minimum(ends, selection.end_time)
+    selected = starts < ends
+    task_codes, client_codes = selection.codes(columns)
+    if task_codes is not None:
+        selected &= numpy.isin(_numpy_column(columns.task_codes, numpy.int32), list(task_codes))
+    if client_codes is not None:
+        selected &= numpy.isin(_numpy_column(columns.client_codes, numpy.int32), list(client_codes))
+    indices = numpy.flatnonzero(selected)
+    return indices, starts[indices], ends[indices]
+
+
+def _numpy_split(first, last):
+    """
+    Splits each element into the pieces first[i], ..., last[i].
+
+    :return: The element of each piece and the value of each piece, with the pieces of an element in a row.
+    """
+    n_pieces = last - first + 1
+    element_of_piece = numpy.repeat(numpy.arange(len(first)), n_pieces)
+    piece_in_element = numpy.arange(len(element_of_piece)) - numpy.repeat(numpy.cumsum(n_pieces) - n_pieces, n_pieces)
+    return element_of_piece, first[element_of_piece] + piece_in_element
+
+
+def _numpy_column(column: array, dtype):
+    return numpy.frombuffer(column, dtype=dtype) if len(column) else numpy.zeros(0, dtype)
+
+
+def _numpy_grouped_sums(
+        columns: ReportColumns,
+        keys: Sequence[str],
+        selection: _Filter) -> Tuple[Iterable[tuple], Iterable[int], range]:
+    indices, starts, ends = _numpy_clip(columns, selection)
+    if len(indices) == 0:
+        return [], [], range(0)
+    days, midnights = _day_range(int(starts.min()), int(ends.max()))
+    midnights = numpy.asarray(midnights, dtype=numpy.int64)
+
+    # Split the worked times into one piece per day they touch
+    first_days = numpy.searchsorted(midnights, starts, side="right") - 1
+    last_days = numpy.searchsorted(midnights, ends - 1, side="right") - 1
+    record_of_piece, piece_days = _numpy_split(first_days, last_days)
+    piece_starts = numpy.maximum(starts[record_of_piece], midnights[piece_days])
+    piece_ends = numpy.minimum(ends[record_of_piece], midnights[piece_days + 1])
+    if "hour" in keys:
+        # And the pieces into one piece per hour since midnight they touch
+        piece_midnights = midnights[piece_days]
+        day_piece, piece_hours = _numpy_split(
+            (piece_starts - piece_midnights) // _HOUR, (piece_ends - 1 - piece_midnights) // _HOUR)
+        record_of_piece, piece_days = record_of_piece[day_piece], piece_days[day_piece]
+        piece_midnights = piece_midnights[day_piece]
+        piece_starts = numpy.maximum(piece_starts[day_piece], piece_midnights + piece_hours * _HOUR)
+        piece_ends = numpy.minimum(piece_ends[day_piece], piece_midnights + (piece_hours + 1) * _HOUR)
+    durations = piece_ends - piece_starts
+
+    weekdays = (days.start + piece_days - 1) % 7
+    key_columns = []
+    for key in keys:
+        if key == "task":
+            key_columns.append(_numpy_column(columns.task_codes, numpy.int32)[indices][record_of_piece])
+        elif key == "client":
+            key_columns.append(_numpy_column(columns.client_codes, numpy.int32)[indices][record_of_piece])
+        elif key == "day":
+            key_columns.append(piece_days)
+        elif key == "week":
+            key_columns.append(piece_days - weekdays)
+        elif key == "month":
+            key_columns.append(numpy.asarray(_month_codes(days), dtype=numpy.int64)[piece_days])
+        elif key == "weekday":
+            key_columns.append(weekdays)
+        else:
+            key_columns.append(piece_hours)
+
+    if not key_columns:
+        return [()], [int(durations.sum())], days
+    # Sort the pieces by their keys and sum up the durations of each run of equal keys
+    keys_array = numpy.stack([column.astype(numpy.int64) for column in key_columns])
+    order = numpy.lexsort(keys_array[::-1])
+    keys_array = keys_array[:, order]
+    run_starts = numpy.flatnonzero(numpy.concatenate(([True], (keys_array[:, 1:] != keys_array[:, :-1]).any(axis=0))))
+    sums = numpy.add.reduceat(durations[order], run_starts)
+    return map(tuple, keys_array[:, run_starts].T.tolist()), sums.tolist(), days
@@ -0,0 +1,148 @@
+import os
+import time
+from bisect import bisect_left, insort
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+RollupKey = Tuple[int, str, str]  # local day (proleptic Gregorian ordinal), task, client
+# A worked time added to (sign 1) or removed from (sign -1) the rollups: task, client, start time, end time, sign
+RollupChange = Tuple[str, str, int, int, int]
+
+
+class PeriodTotals(NamedTuple):
+    """Worked time in a period in microseconds, overall and by task and client."""
+    total: int
+    by_task: Dict[str, int]
+    by_client: Dict[str, int]
+
+
+class DailyRollups:
+    """
+    Worked time per local day, task and client, in microseconds.
+
+    Worked times that cross midnight are split at local midnight, so each day gets exactly its share,
+    also on the days daylight saving time starts or ends.
+    Totals for a week, a month or any other range of days are sums over the buckets of those days
+    instead of a scan over the worked times.
+    """
+
+    def __init__(self, records: Iterable[WorkedTimeRecord] = ()):
+        self._days: Dict[int, Dict[Tuple[str, str], int]] = dict()
+        self._sorted_days: List[int] = []
+        for record in records:
+            self.add_record(record)
+
+    @classmethod
+    def from_buckets(cls, buckets: Iterable[Tuple[RollupKey, int]]) -> "DailyRollups":
+        rollups = cls()
+        for (day, task, client), duration in buckets:
+            rollups._days.setdefault(day, dict())[(task, client)] = duration
+        rollups._sorted_days = sorted(rollups._days)
+        return rollups
+
+    def buckets(self) -> Iterator[Tuple[RollupKey, int]]:
+        for day in self._sorted_days:
+            for (task, client), duration in self._days[day].items():
+                yield (day, task, client), duration
+
+    def __len__(self):
+        return sum(len(work_items) for work_items in self._days.values())
+
+    def add_record(self, record: WorkedTimeRecord):
+        self.add(record.task, record.client, record.start_time, record.end_time)
+
+    def remove_record(self, record: WorkedTimeRecord):
+        self.add(record.task, record.client, record.start_time, record.end_time, sign=-1)
+
+    def merge(self, other: "DailyRollups"):
+        """Adds the buckets of `other`, e.g. those of another part of the history."""
+        for (day, task, client), duration in other.buckets():
+            work_items = self._days.get(day)
+            if work_items is None:
+                work_items = self._days[day] = dict()
+                insort(self._sorted_days, day)
+            total = work_items.get((task, client), 0) + duration
+            if total != 0:
+                work_items[(task, client)] = total
+            else:
+                work_items.pop((task, client), None)
+                if not work_items:
+                    del self._days[day]
+                    del self._sorted_days[bisect_left(self._sorted_days, day)]
+
+    def add(self, task: str, client: str, start_time: int, end_time: int, sign: int = 1):
+        """Adds (or with sign=-1 subtracts) a worked time given in microseconds since the epoch."""
+        for day, duration in split_by_local_day(start_time, end_time):
+            work_items = self._days.get(day)
+            if work_items is None:
+                work_items = self._days[day] = dict()
+                insort(self._sorted_days, day)
+            work_item = (task, client)
+            total = work_items.get(work_item, 0) + sign * duration
+            if total != 0:
+                work_items[work_item] = total
+            else:
+                work_items.pop(work_item, None)
+                if not work_items:
+                    del self._days[day]
+                    del self._sorted_days[bisect_left(self._sorted_days, day)]
+
+    def totals(
+            self,
+            start_day: Optional[int] = None,
+            end_day: Optional[int] = None,
+            tasks: Optional[Set[str]] = None,
+            clients: Optional[Set[str]] = None) -> PeriodTotals:
+        """
+        Sums up the worked time on the days [start_day, end_day) with one of the given tasks and clients.
+
+        :param start_day: The first day as proleptic Gregorian ordinal, or None for no bound.
+        :param end_day: The day after the last day, or None for no bound.
+        :param tasks: The tasks to include, or None for all tasks.
+        :param clients: The clients to include, or None for all clients.
+        """
+        low = 0 if start_day is None else bisect_left(self._sorted_days, start_day)
+        high = len(self._sorted_days) if end_day is None else bisect_left(self._sorted_days, end_day)
+        total = 0
+        by_task: Dict[str, int] = dict()
+        by_client: Dict[str, int] = dict()
+        for day in self._sorted_days[low:high]:
+            for (task, client), duration in self._days[day].items():
+                if (tasks is None or task in tasks) and (clients is None or client in clients):
+                    total += duration
+                    by_task[task] = by_task.get(task, 0) + duration
+                    by_client[client] = by_client.get(client, 0) + duration
+        return PeriodTotals(total, by_task, by_client)
+
+
+def local_day(usec: int) -> int:
+    """The local day of a time in microseconds since the epoch, as proleptic Gregorian ordinal."""
+    return date.fromtimestamp(usec // 1_000_000).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def local_midnight(day: int) -> int:
+    """The start of a local day (given as proleptic Gregorian ordinal) in microseconds since the epoch."""
+    return int(datetime.combine(date.fromordinal(day), datetime.min.time()).timestamp()) * 1_000_000
+
+
+def split_by_local_day(start_time: int, end_time: int) -> Iterator[Tuple[int, int]]:
+    """Splits [start_time, end_time) at local midnights into (local day, duration) pairs."""
+    day = local_day(start_time)
+    while start_time < end_time:
+        day_end = min(end_time, local_midnight(day + 1))
+        yield day, day_end - start_time
+        start_time = day_end
+        day += 1
+
+
+def timezone_stamp() -> str:
+    """Identifies the local time zone, whose day boundaries the rollups depend on."""
+    try:
+        localtime = os.path.realpath("/etc/localtime")
+    except OSError:
+        localtime = ""
+    return f"{os.environ.get('TZ', '')}|{localtime}|{time.tzname}|{time.timezone}|{time.altzone}"
@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from wage_labor_record.persistence import atomic_write
+from wage_labor_record.rollups import RollupKey, timezone_stamp
+
+_MAGIC = b"WLRC"
+_VERSION = 2
+# magic, version, snapshot mtime in ns, snapshot size, snapshot digest, number of records,
+# digest of the time zone the rollups were computed in, number of rollup buckets
+_HEADER = struct.Struct("<4sIqq32sI16sI")
+# number of strings, length of the encoded strings in bytes
+_TABLE_HEADER = struct.Struct("<II")
+_SEPARATOR = "\0"
+
+
+class RollupColumns(NamedTuple):
+    """The daily rollup buckets of a snapshot in columnar form."""
+    days: array  # int32 local days as proleptic Gregorian ordinals
+    task_codes: array  # int32 indices into the tasks of the snapshot
+    client_codes: array  # int32 indices into the clients of the snapshot
+    durations: array  # int64 microseconds
+
+
+class SnapshotColumns(NamedTuple):
+    """The worked times of a snapshot in columnar form, with task and client names stored once in string tables."""
+    ids: List[str]
+    start_times: array  # int64 microseconds since the epoch
+    end_times: array  # int64 microseconds since the epoch
+    task_codes: array  # int32 indices into tasks
+    client_codes: array  # int32 indices into clients
+    tasks: List[str]
+    clients: List[str]
+    # None if the rollups were computed in a different time zone
+    rollups: Optional[RollupColumns] = None
+
+    @classmethod
+    def from_rows(
+            cls,
+            rows: Iterable[Tuple[str, str, str, int, int]],
+            rollup_buckets: Iterable[Tuple[RollupKey, int]] = ()) -> "SnapshotColumns":
+        """
+        :param rows: (id, task, client, start time, end time) tuples with times in microseconds since the epoch.
+        :param rollup_buckets: ((local day, task, client), duration) tuples of the daily rollups of the rows.
+        """
+        columns = cls([], array("q"), array("q"), array("i"), array("i"), [], [], RollupColumns(
+            array("i"), array("i"), array("i"), array("q")))
+        task_codes: Dict[str, int] = dict()
+        client_codes: Dict[str, int] = dict()
+        for record_id, task, client, start_time, end_time in rows:
+            columns.ids.append(record_id)
+            columns.start_times.append(start_time)
+            columns.end_times.append(end_time)
+            columns.task_codes.append(_intern(task, task_codes, columns.tasks))
+            columns.client_codes.append(_intern(client, client_codes, columns.clients))
+        for (day, task, client), duration in rollup_buckets:
+            columns.rollups.days.append(day)
+            columns.rollups.task_codes.append(_intern(task, task_codes, columns.tasks))
+            columns.rollups.client_codes.append(_intern(client, client_codes, columns.clients))
+            columns.rollups.durations.append(duration)
+        return columns
+
+    def rows(self) -> Iterable[Tuple[str, str, str, int, int]]:
+        tasks, clients = self.tasks, self.clients
+        return zip(
+            self.ids,
+            (tasks[code] for code in self.task_codes),
+            (clients[code] for code in self.client_codes),
+            self.start_times,
+            self.end_times,
+        )
+
+    def rollup_buckets(self) -> Iterable[Tuple[RollupKey, int]]:
+        rollups = self.rollups
+        tasks, clients = self.tasks, self.clients
+        return zip(
+            zip(rollups.days, (tasks[code] for code in rollups.task_codes), (clients[code] for code in rollups.client_codes)),
+            rollups.durations,
+        )
+
+
+def _intern(value: str, codes: Dict[str, int], table: List[str]) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = codes[value] = len(table)
+        table.append(value)
+    return code
+
+
+class SnapshotCache:
+    """
+    A binary sidecar of the worked times snapshot that loads with a single read instead of parsing JSON.
+
+    The JSON snapshot stays the source of truth.
+    The cache remembers the modification time, size and digest of the snapshot it was created from.
+    If the modification time or size changed, the digest decides whether the content actually changed
+    (in which case the cache is ignored) or the file was only touched.
+    The cache also holds the daily rollups of the snapshot, which are ignored if the local time zone changed.
+    """
+
+    def __init__(self, snapshot_path: os.PathLike):
+        self._snapshot_path = Path(snapshot_path)
+        self._cache_path = self._snapshot_path.with_suffix(".cache")
+
+    def load(self) -> Optional[SnapshotColumns]:
+        try:
+            data = self._cache_path.read_bytes()
+            snapshot_stat = os.stat(self._snapshot_path)
+        except FileNotFoundError:
+            return None
+
+        try:
+            magic, version, mtime_ns, size, digest, count, timezone_digest, rollup_count = _HEADER.unpack_from(data)
+        except struct.error:
+            logging.warning(f"Ignoring corrupt cache {self._cache_path}")
+            return None
+        if magic != _MAGIC or version != _VERSION:
+            return None
+
+        if (snapshot_stat.st_mtime_ns, snapshot_stat.st_size) != (mtime_ns, size):
+            if _digest(self._snapshot_path.read_bytes()) != digest:
+                logging.info(f"Cache {self._cache_path} is outdated")
+                return None
+            # Only the modification time changed. Remember it to skip hashing next time.
+            self._write_header(data[:_HEADER.size], snapshot_stat)
+
+        try:
+            columns = _decode(data, _HEADER.size, count, rollup_count)
+        except (ValueError, UnicodeDecodeError, struct.error):
+            logging.warning(f"Ignoring corrupt cache {self._cache_path}")
+            return None
+        if timezone_digest != _timezone_digest():
+            logging.info("The time zone changed since the rollups were cached")
+            return columns._replace(rollups=None)
+        return columns
+
+    def store(self, columns: SnapshotColumns):
+        """Caches `columns`, which must reflect the current snapshot file (possibly with the journal replayed on top)."""
+        try:
+            snapshot = self._snapshot_path.read_bytes()
+            snapshot_stat = os.stat(self._snapshot_path)
+        except FileNotFoundError:
+            return
+        if any(_SEPARATOR in s for table in (columns.ids, columns.tasks, columns.clients) for s in table):
+            logging.warning("Not caching worked times containing NUL characters")
+            return
+
+        header = _HEADER.pack(
+            _MAGIC, _VERSION, snapshot_stat.st_mtime_ns, snapshot_stat.st_size, _digest(snapshot), len(columns.ids),
+            _timezone_digest(), len(columns.rollups.days))
+        atomic_write(self._cache_path, header + _encode(columns))
+
+    def _write_header(self, header: bytes, snapshot_stat: os.stat_result):
+        """Updates the modification time and size of the snapshot in the cached `header`."""
+        magic, version, _, _, *rest = _HEADER.unpack(header)
+        with open(self._cache_path, "r+b") as f:
+            f.write(_HEADER.pack(magic, version, snapshot_stat.st_mtime_ns, snapshot_stat.st_size, *rest))
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def _timezone_digest() -> bytes:
+    return hashlib.blake2b(timezone_stamp().encode(), digest_size=16).digest()
+
+
+def _encode_array(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _decode_array(typecode: str, view: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(view[offset:end])
+    if len(column) != count:
+        raise ValueError("Cache is truncated")
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+
+def _encode(columns: SnapshotColumns) -> bytes:
+    parts = [
+        _encode_array(column)
+        for column in (columns.start_times, columns.end_times, columns.task_codes, columns.client_codes)
+    ]
+    for table in (columns.ids, columns.tasks, columns.clients):
+        blob = _SEPARATOR.join(table).encode()
+        parts.append(_TABLE_HEADER.pack(len(table), len(blob)))
+        parts.append(blob)
+    parts.extend(_encode_array(column) for column in columns.rollups)
+    return b"".join(parts)
+
+
+def _decode(data: bytes, offset: int, count: int, rollup_count: int) -> SnapshotColumns:
+    view = memoryview(data)
+    columns = []
+    for typecode in ("q", "q", "i", "i"):
+        column, offset = _decode_array(typecode, view, offset, count)
+        columns.append(column)
+
+    tables = []
+    for _ in range(3):
+        size, length = _TABLE_HEADER.unpack_from(data, offset)
+        offset += _TABLE_HEADER.size
+        blob = bytes(view[offset:offset + length]).decode()
+        offset += length
+        table = blob.split(_SEPARATOR) if size > 0 else []
+        if len(table) != size:
+            raise ValueError("Cache is inconsistent")
+        tables.append(table)
+
+    rollup_columns = []
+    for typecode in ("i", "i", "i", "q"):
+        column, offset = _decode_array(typecode, view, offset, rollup_count)
+        rollup_columns.append(column)
+
+    start_times, end_times, task_codes, client_codes = columns
+    ids, tasks, clients = tables
+    if len(ids) != count:
+        raise ValueError("Cache is inconsistent")
+    return SnapshotColumns(
+        ids, start_times, end_times, task_codes, client_codes, tasks, clients, RollupColumns(*rollup_columns))
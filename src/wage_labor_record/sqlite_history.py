@@ -0,0 +1,181 @@
+"""
+The worked time history in an SQLite database, as an alternative to the JSON files for very long histories.
+
+The database holds a single table of worked times with indexes on the start time, the task and the client,
+so the worked times of a period are read without going through the rest of the history.
+It runs in WAL mode: a write appends to the write-ahead log, and reading (e.g. `wlr report`)
+never waits for the app writing.
+"""
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from wage_labor_record.rollups import PeriodTotals
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS worked_times (
+    id TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    client TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS worked_times_start_time ON worked_times (start_time);
+CREATE INDEX IF NOT EXISTS worked_times_task ON worked_times (task);
+CREATE INDEX IF NOT EXISTS worked_times_client ON worked_times (client);
+"""
+
+_COLUMNS = "id, task, client, start_time, end_time"
+
+# The write-ahead log and the shared memory index next to the database, which belong to it
+_SIDECAR_SUFFIXES = ("-wal", "-shm")
+
+# Stands in for an open bound of a period
+_NO_START = -(2 ** 63)
+_NO_END = 2 ** 63 - 1
+
+
+def sqlite_path(history_path: os.PathLike) -> Path:
+    """The database next to the JSON history, e.g. `worked_times.sqlite` for `worked_times.json`."""
+    return Path(history_path).with_suffix(".sqlite")
+
+
+def sidecar_paths(path: os.PathLike) -> List[Path]:
+    """The write-ahead log and shared memory files of the database, which only exist while it is open."""
+    path = Path(path)
+    return [path.with_name(path.name + suffix) for suffix in _SIDECAR_SUFFIXES]
+
+
+def connect(path: os.PathLike, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Opens (or creates) the database.
+
+    :param check_same_thread: Whether only the thread that opened the connection may use it. Without the check,
+        the connection may be handed over to other threads, but must never be used by two threads at once.
+    """
+    connection = sqlite3.connect(path, check_same_thread=check_same_thread)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        connection.close()
+        raise ValueError(f"Unsupported database version {version} in {path}")
+    connection.execute("PRAGMA journal_mode = WAL")
+    # In WAL mode, a commit costs a single fsync of the log
+    connection.execute("PRAGMA synchronous = FULL")
+    if version == 0:
+        with connection:
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+def read_records(
+        connection: sqlite3.Connection,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None) -> List[WorkedTimeRecord]:
+    """The worked times starting within [start_time, end_time), sorted by start time."""
+    rows = connection.execute(
+        f"SELECT {_COLUMNS} FROM worked_times WHERE start_time >= ? AND start_time < ? ORDER BY start_time",
+        (_NO_START if start_time is None else start_time, _NO_END if end_time is None else end_time))
+    return [WorkedTimeRecord.fromrow(row) for row in rows]
+
+
+def read_overlapping_records(
+        connection: sqlite3.Connection,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None) -> Iterator[WorkedTimeRecord]:
+    """
+    The worked times with any time between `start_time` and `end_time`, sorted by start time.
+
+    They are read from the cursor as they are consumed, so consume them before closing the connection.
+    """
+    rows = connection.execute(
+        f"SELECT {_COLUMNS} FROM worked_times WHERE start_time <= ? AND end_time >= ? ORDER BY start_time",
+        (_NO_END if end_time is None else end_time, _NO_START if start_time is None else start_time))
+    return map(WorkedTimeRecord.fromrow, rows)
+
+
+def time_range(connection: sqlite3.Connection) -> Optional[Tuple[int, int]]:
+    """The earliest and the latest start time, or None if there are no worked times."""
+    first, last = connection.execute("SELECT MIN(start_time), MAX(start_time) FROM worked_times").fetchone()
+    return None if first is None else (first, last)
+
+
+def name_uses(connection: sqlite3.Connection) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """The number of worked times of every task and of every client."""
+    tasks = dict(connection.execute("SELECT task, COUNT(*) FROM worked_times GROUP BY task"))
+    clients = dict(connection.execute("SELECT client, COUNT(*) FROM worked_times GROUP BY client"))
+    return tasks, clients
+
+
+def period_totals(
+        connection: sqlite3.Connection,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        tasks: Optional[Set[str]] = None,
+        clients: Optional[Set[str]] = None,
+        excluded: Sequence[Tuple[int, int]] = ()) -> PeriodTotals:
+    """
+    Sums up the worked time between `start_time` and `end_time` in the database.
+
+    Worked times crossing a bound only count with the part within the period, like in the daily rollups.
+
+    :param excluded: [start, end) ranges of start times to leave out, e.g. those of the worked times held in memory.
+    """
+    start = _NO_START if start_time is None else start_time
+    end = _NO_END if end_time is None else end_time
+    conditions = ["start_time < ?", "end_time > ?"]
+    parameters: list = [end, start]
+    for low, high in excluded:
+        conditions.append("NOT (start_time >= ? AND start_time < ?)")
+        parameters.extend((low, high))
+    for column, names in (("task", tasks), ("client", clients)):
+        if names is not None:
+            conditions.append(f"{column} IN ({', '.join('?' * len(names))})")
+            parameters.extend(sorted(names))
+    rows = connection.execute(
+        f"SELECT task, client, SUM(MIN(end_time, ?) - MAX(start_time, ?)) FROM worked_times "
+        f"WHERE {' AND '.join(conditions)} GROUP BY task, client",
+        [end, start, *parameters])
+
+    total = 0
+    by_task: Dict[str, int] = dict()
+    by_client: Dict[str, int] = dict()
+    for task, client, duration in rows:
+        if duration == 0:
+            continue  # like in the daily rollups
+        total += duration
+        by_task[task] = by_task.get(task, 0) + duration
+        by_client[client] = by_client.get(client, 0) + duration
+    return PeriodTotals(total, by_task, by_client)
+
+
+def write_changes(connection: sqlite3.Connection, changes: Iterable[Tuple[str, Tuple[str, str, str, int, int]]]):
+    """
+    Applies changes in a single transaction.
+
+    :param changes: (operation, row) pairs with the operations "add", "update" and "remove" of the journal,
+        and rows as given by `WorkedTimeRecord.asrow`.
+    """
+    with connection:
+        for op, row in changes:
+            if op == "remove":
+                connection.execute("DELETE FROM worked_times WHERE id = ?", (row[0],))
+            else:
+                connection.execute(f"INSERT OR REPLACE INTO worked_times ({_COLUMNS}) VALUES (?, ?, ?, ?, ?)", row)
+
+
+def write_records(connection: sqlite3.Connection, records: Iterable[WorkedTimeRecord]):
+    """Adds the worked times in a single transaction."""
+    with connection:
+        connection.executemany(
+            f"INSERT OR REPLACE INTO worked_times ({_COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+            (record.asrow() for record in records))
+
+
+def checkpoint(connection: sqlite3.Connection):
+    """Folds the write-ahead log into the database file and truncates it."""
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
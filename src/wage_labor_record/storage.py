@@ -0,0 +1,429 @@
+"""
+The storage backends of `WorkedTimeStore`: JSON files, one per month, or an SQLite database.
+
+Both load the history a month at a time (the months are those of `partitions`), queue the changes the store
+reports, and write them in the background writer thread when asked to prepare a write.
+Changes are only ever reported for worked times in loaded months, so the months that are not loaded
+are unchanged on disk. If a write fails, `write_failed` queues what may have been lost again for the next write.
+"""
+import collections
+import functools
+import os
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+from wage_labor_record import sqlite_history
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.partitions import (
+    Manifest, PartitionSummary, partition_bounds, partition_directory, partition_key, partition_path)
+from wage_labor_record.rollups import DailyRollups, PeriodTotals
+from wage_labor_record.snapshot_cache import SnapshotCache, SnapshotColumns
+from wage_labor_record.worked_time_history import (
+    STORAGE_BACKENDS, history_backend, load_history, migrate_to_json, migrate_to_partitions, migrate_to_sqlite)
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+WriteOperation = Callable[[], None]
+Storage = Union["JsonStorage", "SQLiteStorage"]
+
+
+class LoadedMonth(NamedTuple):
+    records: List[WorkedTimeRecord]
+    rollups: DailyRollups
+    # How many more (or fewer) worked times each task and client has than `name_uses` claimed for the month
+    task_corrections: Dict[str, int]
+    client_corrections: Dict[str, int]
+
+
+def open_storage(history_path: os.PathLike, backend: Optional[str] = None) -> Storage:
+    """
+    Opens the history with the given backend, migrating it from the other backend if needed.
+
+    :param backend: One of STORAGE_BACKENDS, or None for the backend the history is stored with.
+    """
+    if backend is None:
+        backend = history_backend(history_path)
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if backend == "sqlite":
+        migrate_to_sqlite(history_path)
+        return SQLiteStorage(sqlite_history.sqlite_path(history_path))
+    migrate_to_json(history_path)
+    return JsonStorage(history_path)
+
+
+class _Partition:
+    """The worked times of one month, with the snapshot, journal and cache they are stored in."""
+
+    def __init__(self, key: str, path: Path):
+        self.key = key
+        self.journal = WorkedTimeJournal(path)
+        self.snapshot_cache = SnapshotCache(path)
+        self.records: Dict[str, WorkedTimeRecord] = dict()
+        # Changes waiting to be journaled: id -> (journal operation, record)
+        self.pending_journal: Dict[str, Tuple[str, WorkedTimeRecord]] = dict()
+        self.snapshot_cache_outdated = False
+        # Whether to write a fresh snapshot regardless of the journal, e.g. after a failed write
+        self.rewrite_requested = False
+
+    def sorted_records(self) -> List[WorkedTimeRecord]:
+        return sorted(self.records.values(), key=lambda record: record.start_time)
+
+
+class JsonStorage:
+    """
+    The history as one snapshot, journal and cache per month, plus the manifest with the summary of each month.
+
+    Changes are journaled in the partition of the month the worked time starts in.
+    A worked time that moves to another month is removed from one journal and added to the other.
+    """
+
+    def __init__(self, history_path: os.PathLike):
+        migrate_to_partitions(history_path)
+        self._directory = partition_directory(history_path)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        manifest = Manifest.load(self._directory)
+        self._manifest = manifest if manifest is not None else Manifest(self._directory)
+        self._manifest_outdated = manifest is None
+        # The loaded partitions by key, and the partition each loaded worked time is stored in
+        self._partitions: Dict[str, _Partition] = dict()
+        self._partition_of: Dict[str, _Partition] = dict()
+
+    def months(self) -> Iterable[str]:
+        """The months that may have worked times."""
+        return self._manifest.partitions
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._partitions
+
+    def name_uses(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """The number of worked times of every task and of every client, in the whole history."""
+        tasks: Dict[str, int] = dict()
+        clients: Dict[str, int] = dict()
+        for summary in self._manifest.partitions.values():
+            for uses, names in ((tasks, summary.tasks), (clients, summary.clients)):
+                for name, (count, _) in names.items():
+                    uses[name] = uses.get(name, 0) + count
+        return tasks, clients
+
+    @property
+    def needs_write(self) -> bool:
+        return self._manifest_outdated or any(
+            partition.snapshot_cache_outdated or partition.journal.needs_compaction
+            for partition in self._partitions.values())
+
+    def load(self, key: str) -> LoadedMonth:
+        """
+        Loads the worked times of a month.
+
+        The summary of the month in the manifest is corrected if it does not match the worked times.
+        """
+        partition = _Partition(key, partition_path(self._directory, key))
+        records, rollups, snapshot_cache_outdated = load_history(partition.journal, partition.snapshot_cache)
+        # There is nothing to cache for months without worked times
+        partition.snapshot_cache_outdated = snapshot_cache_outdated and bool(records)
+        partition.records = {record.id: record for record in records}
+        self._partitions[key] = partition
+        for record in records:
+            self._partition_of[record.id] = partition
+
+        old_summary = self._manifest.partitions.get(key, PartitionSummary())
+        summary = PartitionSummary.of_records(records)
+        if summary != self._manifest.partitions.get(key):
+            self._manifest.partitions[key] = summary
+            self._manifest_outdated = True
+        return LoadedMonth(
+            records,
+            rollups,
+            _corrections(old_summary.tasks, summary.tasks),
+            _corrections(old_summary.clients, summary.clients))
+
+    def add(self, record: WorkedTimeRecord):
+        partition = self._file(record)
+        self._count(partition.key, record.task, record.client, record.start_time, record.end_time)
+        self._queue("add", record, partition)
+
+    def remove(self, record: WorkedTimeRecord):
+        partition = self._unfile(record)
+        self._count(partition.key, record.task, record.client, record.start_time, record.end_time, sign=-1)
+        self._queue("remove", record, partition)
+
+    def update(self, record: WorkedTimeRecord, old: dict):
+        """
+        Queues an edit of `record`.
+
+        :param old: The task, client, start_time and end_time of the record before the edit.
+        """
+        old_partition = self._partition_of[record.id]
+        new_partition = old_partition
+        # Only a new start time moves a worked time to another month. After the time zone changed, a worked time
+        # near the end of a month may fall into another month, but it stays where it is as long as it does not move.
+        if record.start_time != old["start_time"]:
+            # The month must be loaded (the store loads it first). It is looked up before anything changes,
+            # so the storage stays as it was if it is not.
+            new_partition = self._partitions[partition_key(record.start_time)]
+        self._count(old_partition.key, sign=-1, **old)
+        if new_partition is not old_partition:
+            self._unfile(record)
+            self._queue("remove", record, old_partition)
+            self._file(record)
+            self._queue("add", record, new_partition)
+        else:
+            self._queue("update", record, old_partition)
+        self._count(new_partition.key, record.task, record.client, record.start_time, record.end_time)
+
+    def _file(self, record: WorkedTimeRecord) -> _Partition:
+        """Assigns `record` to the partition of the month it starts in, which must be loaded."""
+        partition = self._partitions[partition_key(record.start_time)]
+        partition.records[record.id] = record
+        self._partition_of[record.id] = partition
+        return partition
+
+    def _unfile(self, record: WorkedTimeRecord) -> _Partition:
+        partition = self._partition_of.pop(record.id)
+        del partition.records[record.id]
+        return partition
+
+    def _count(self, key: str, task: str, client: str, start_time: int, end_time: int, sign: int = 1):
+        self._manifest.summary(key).add(task, client, end_time - start_time, sign)
+        self._manifest_outdated = True
+
+    @staticmethod
+    def _queue(op: str, record: WorkedTimeRecord, partition: _Partition):
+        pending = partition.pending_journal.get(record.id)
+        if pending is not None and pending[0] == "add":
+            if op == "remove":
+                # The record never made it to the journal, so there is nothing to remove
+                del partition.pending_journal[record.id]
+                return
+            op = "add"
+        partition.pending_journal[record.id] = (op, record)
+
+    def prepare_write(self, compact: bool = False) -> List[WriteOperation]:
+        """
+        Captures the queued changes and returns the operations writing them.
+
+        :param compact: Whether to fold the journals of the changed partitions into fresh snapshots.
+        """
+        operations: List[WriteOperation] = []
+        for key in sorted(self._partitions):
+            operations.extend(self._prepare_partition_write(self._partitions[key], compact))
+        if self._manifest_outdated:
+            # The manifest is written last, so it never lists changes the partitions don't have yet
+            self._manifest_outdated = False
+            operations.append(functools.partial(self._manifest.store, self._manifest.serialize()))
+        return operations
+
+    @staticmethod
+    def _prepare_partition_write(partition: _Partition, compaction_requested: bool) -> List[WriteOperation]:
+        journal = partition.journal
+        snapshot_cache = partition.snapshot_cache
+        # Large batches of changes are cheaper to write as a fresh snapshot than to journal
+        large_batch = len(partition.pending_journal) >= journal.compaction_threshold
+        compact_on_request = compaction_requested and (journal.length > 0 or partition.pending_journal)
+        if partition.rewrite_requested or compact_on_request or journal.needs_compaction or large_batch:
+            partition.rewrite_requested = False
+            partition.snapshot_cache_outdated = False
+            partition.pending_journal.clear()
+            records = partition.sorted_records()
+            rows = [record.asrow() for record in records]
+            rollup_buckets = list(DailyRollups(records).buckets())
+
+            def compact():
+                journal.compact(WorkedTimeRecord.fromrow(row).asdict() for row in rows)
+                snapshot_cache.store(SnapshotColumns.from_rows(rows, rollup_buckets))
+            return [compact]
+
+        operations = []
+        for record_id, (op, record) in partition.pending_journal.items():
+            if op == "remove":
+                operations.append(functools.partial(journal.remove, record_id))
+            else:
+                operations.append(functools.partial(getattr(journal, op), record.asdict()))
+        partition.pending_journal.clear()
+        if partition.snapshot_cache_outdated:
+            # The journal is replayed on top of the cache, so once the journal is written,
+            # the current state is a valid cache of the snapshot
+            partition.snapshot_cache_outdated = False
+            records = partition.sorted_records()
+            columns = SnapshotColumns.from_rows([record.asrow() for record in records], DailyRollups(records).buckets())
+            operations.append(functools.partial(snapshot_cache.store, columns))
+        return operations
+
+    def write_failed(self):
+        """
+        Queues a fresh snapshot of every loaded month and the manifest after a failed write.
+
+        A failed write may have journaled some of its changes and not others, and may have left a torn line behind,
+        but the loaded months are all in memory, so writing them as a whole restores everything.
+        """
+        for partition in self._partitions.values():
+            partition.rewrite_requested = True
+        self._manifest_outdated = True
+
+    def sync(self):
+        """Syncs journal entries that the batched fsync has not covered yet."""
+        for partition in self._partitions.values():
+            partition.journal.sync()
+
+    def close(self):
+        """Syncs and closes the journals. Call it once all writes are done."""
+        for partition in self._partitions.values():
+            partition.journal.close()
+
+    def unloaded_period_totals(
+            self,
+            start_time: Optional[int],
+            end_time: Optional[int],
+            tasks: Optional[Set[str]],
+            clients: Optional[Set[str]]) -> Optional[PeriodTotals]:
+        """
+        The worked time between `start_time` and `end_time` of the worked times in the months that are not loaded,
+        or None if the months have to be loaded to know it.
+        """
+        return None
+
+
+def _corrections(claimed: Dict[str, List[int]], actual: Dict[str, List[int]]) -> Dict[str, int]:
+    corrections = dict()
+    for name in set(claimed).union(actual):
+        difference = actual.get(name, (0, 0))[0] - claimed.get(name, (0, 0))[0]
+        if difference != 0:
+            corrections[name] = difference
+    return corrections
+
+
+class SQLiteStorage:
+    """
+    The history in an SQLite database (see `sqlite_history`).
+
+    The store reads through a connection of the main thread, while the changes are written in a single transaction
+    per write through a connection of the writer thread. Names and period totals of the months that are not loaded
+    are answered by SQL queries.
+    """
+
+    def __init__(self, database_path: os.PathLike):
+        self._database_path = Path(database_path)
+        self._connection = sqlite_history.connect(self._database_path)
+        # Opened by the writer thread on its first write, and closed by `close` once the writes are done
+        self._write_connection: Optional[sqlite3.Connection] = None
+        self._loaded: Set[str] = set()
+        # The ids of the worked times in the loaded months
+        self._ids: Set[str] = set()
+        self._months: Set[str] = set()
+        time_range = sqlite_history.time_range(self._connection)
+        if time_range is not None:
+            key, last_key = partition_key(time_range[0]), partition_key(time_range[1])
+            while key <= last_key:
+                self._months.add(key)
+                key = partition_key(partition_bounds(key)[1])
+        # Changes waiting to be written: id -> (operation, record)
+        self._pending: Dict[str, Tuple[str, WorkedTimeRecord]] = dict()
+        # The changes of the writes that failed, appended to by the writer thread
+        self._failed: "collections.deque[List[Tuple[str, WorkedTimeRecord]]]" = collections.deque()
+
+    def months(self) -> Iterable[str]:
+        return self._months
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._loaded
+
+    def name_uses(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        return sqlite_history.name_uses(self._connection)
+
+    @property
+    def needs_write(self) -> bool:
+        return False
+
+    def load(self, key: str) -> LoadedMonth:
+        self._loaded.add(key)
+        self._months.add(key)
+        records = sqlite_history.read_records(self._connection, *partition_bounds(key))
+        self._ids.update(record.id for record in records)
+        return LoadedMonth(records, DailyRollups(records), dict(), dict())
+
+    def add(self, record: WorkedTimeRecord):
+        self._months.add(partition_key(record.start_time))
+        self._ids.add(record.id)
+        self._queue("add", record)
+
+    def remove(self, record: WorkedTimeRecord):
+        self._ids.discard(record.id)
+        self._queue("remove", record)
+
+    def update(self, record: WorkedTimeRecord, old: dict):
+        self._months.add(partition_key(record.start_time))
+        self._queue("update", record)
+
+    def _queue(self, op: str, record: WorkedTimeRecord):
+        pending = self._pending.get(record.id)
+        if pending is not None and pending[0] == "add":
+            if op == "remove":
+                del self._pending[record.id]
+                return
+            op = "add"
+        self._pending[record.id] = (op, record)
+
+    def prepare_write(self, compact: bool = False) -> List[WriteOperation]:
+        """
+        Captures the queued changes and returns the operation writing them.
+
+        :param compact: Whether to fold the write-ahead log into the database afterwards.
+        """
+        queued = list(self._pending.values())
+        changes = [(op, record.asrow()) for op, record in queued]
+        self._pending.clear()
+        if not changes and not compact:
+            return []
+
+        def write():
+            try:
+                if self._write_connection is None:
+                    self._write_connection = sqlite_history.connect(self._database_path, check_same_thread=False)
+                sqlite_history.write_changes(self._write_connection, changes)
+                if compact:
+                    sqlite_history.checkpoint(self._write_connection)
+            except Exception:
+                self._failed.append(queued)
+                raise
+        return [write]
+
+    def write_failed(self):
+        """
+        Queues the worked times the failed writes changed again, as they are now.
+
+        Writes that were prepared before the failure was reported may have written some of these worked times since,
+        so they are written as they are now rather than replaying the failed changes.
+        Worked times with a change queued already are written with that change.
+        """
+        while self._failed:
+            for _, record in self._failed.popleft():
+                if record.id not in self._pending:
+                    self._pending[record.id] = ("update" if record.id in self._ids else "remove", record)
+
+    def sync(self):
+        """Every write is a synced transaction, so there is nothing left to sync."""
+
+    def close(self):
+        """
+        Folds the write-ahead log into the database and closes the connections. Call it once all writes are done.
+
+        The write-ahead log and shared memory files are removed with the last connection, so only the database
+        file is left.
+        """
+        if self._write_connection is not None:
+            self._write_connection.close()
+            self._write_connection = None
+        sqlite_history.checkpoint(self._connection)
+        self._connection.close()
+
+    def unloaded_period_totals(
+            self,
+            start_time: Optional[int],
+            end_time: Optional[int],
+            tasks: Optional[Set[str]],
+            clients: Optional[Set[str]]) -> Optional[PeriodTotals]:
+        # The worked times of the loaded months are in memory, possibly with changes that are not written yet
+        excluded = [partition_bounds(key) for key in sorted(self._loaded)]
+        return sqlite_history.period_totals(self._connection, start_time, end_time, tasks, clients, excluded)
+
@@ -0,0 +1,94 @@
+from typing import Callable, Dict, Optional
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib, Gtk
+
+TickCallback = Callable[[GLib.DateTime], None]
+
+
+class Ticker:
+    """
+    A single source of once-per-second ticks, aligned to wall-clock second boundaries.
+
+    All elapsed-time displays subscribe to the same ticker, so they all update in the same main loop wakeup
+    and share one `GLib.DateTime.new_now_local()`. The ticker sleeps while nobody is subscribed.
+    """
+    _default: Optional["Ticker"] = None
+
+    def __init__(self):
+        self._subscribers: Dict[int, TickCallback] = dict()
+        self._next_subscription_id = 1
+        self._timeout_id: Optional[int] = None
+
+    @classmethod
+    def get_default(cls) -> "Ticker":
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def subscribe(self, callback: TickCallback) -> int:
+        """Calls `callback` with the current time on every tick until `unsubscribe` is called with the returned id."""
+        subscription_id = self._next_subscription_id
+        self._next_subscription_id += 1
+        self._subscribers[subscription_id] = callback
+        if self._timeout_id is None:
+            self._schedule()
+        return subscription_id
+
+    def unsubscribe(self, subscription_id: int):
+        self._subscribers.pop(subscription_id, None)
+        if not self._subscribers and self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+
+    def _schedule(self):
+        # Wake up just after the next full second
+        microseconds = GLib.DateTime.new_now_local().get_microsecond()
+        self._timeout_id = GLib.timeout_add((1_000_000 - microseconds) // 1000 + 1, self._on_tick)
+
+    def _on_tick(self):
+        self._timeout_id = None
+        now = GLib.DateTime.new_now_local()
+        for callback in list(self._subscribers.values()):
+            callback(now)
+        # Callbacks may have (un)subscribed and thereby already rescheduled
+        if self._subscribers and self._timeout_id is None:
+            self._schedule()
+        return False
+
+
+class TickSubscription:
+    """
+    Subscribes `callback` to the ticker only while `widget` is mapped and the subscription is active,
+    e.g. only while the widget is visible and time is being tracked.
+    """
+
+    def __init__(self, widget: Gtk.Widget, callback: TickCallback, ticker: Optional[Ticker] = None):
+        self._widget = widget
+        self._callback = callback
+        self._ticker = ticker if ticker is not None else Ticker.get_default()
+        self._active = False
+        self._subscription_id: Optional[int] = None
+        widget.connect("map", lambda *_args: self._update())
+        widget.connect("unmap", lambda *_args: self._update())
+        widget.connect("destroy", lambda *_args: self.set_active(False))
+
+    def set_active(self, active: bool):
+        self._active = active
+        self._update()
+
+    def _update(self):
+        subscribed = self._active and self._widget.get_mapped()
+        if subscribed and self._subscription_id is None:
+            self._subscription_id = self._ticker.subscribe(self._callback)
+        elif not subscribed and self._subscription_id is not None:
+            self._ticker.unsubscribe(self._subscription_id)
+            self._subscription_id = None
+
+
+def set_markup_if_changed(label: Gtk.Label, markup: str):
+    """Only sets the markup of `label` if it differs, so unchanged text causes no relayout or redraw."""
+    if label.get_label() != markup:
+        label.set_markup(markup)
@@ -12,6 +12,11 @@ gi.require_version("Gtk", "3.0")
 gi.require_version('XApp', '1.0')
 from gi.repository import GLib, Gtk, XApp
 
+# How many recently worked on tasks are offered in the menu
+RECENT_ITEMS = 5
+# How many of the most worked on tasks of the last 30 days are offered in addition, if they are not recent anyway
+MOST_WORKED_ITEMS = 3
+
 
 class TimeTrackerTrayIcon(XApp.StatusIcon):
     def __init__(self, tracking_state: TrackingState, worked_time_store: WorkedTimeStore, application: Gtk.Application):
@@ -67,73 +72,103 @@ class TimeTrackerTrayIcon(XApp.StatusIcon):
         start_tracking_action.connect("notify::enabled", _update_icon)
         stop_tracking_action.connect("notify::enabled", _update_icon)
 
-        # Add menu to the tray icon
-        def _update_menu(*_):
-            # NOTE: This is not the most efficient way to do this, but it works for now
-            menu = Gtk.Menu()
-
-            # CLIENT ----------------------------
-            client_item = Gtk.MenuItem(label="")
-
-            def _update_client_menu_item(*_):
-                client = tracking_state.client
-                client_item.set_label("Set Client" if client == "" else f"Client: {client}")
-
-            _update_client_menu_item()
-            tracking_state.connect("notify::client", _update_client_menu_item)
-            client_item.connect("activate", lambda _0: application.activate())
-            menu.append(client_item)
-
-            # TASK ----------------------------
-            task_item = Gtk.MenuItem(label="")
-
-            def _update_task_menu_item(*_):
-                task = tracking_state.task
-                task_item.set_label("Set Task" if task=="" else f"Task: {task}")
-
-            _update_task_menu_item()
-            tracking_state.connect("notify::task", _update_task_menu_item)
-            task_item.connect("activate", lambda _0: application.activate())
-            menu.append(task_item)
-
-            # SEPARATOR ----------------------------
-            menu.append(Gtk.SeparatorMenuItem())
-
-            # WORKED ITEMS -------------------------
-            for task, client in worked_time_store.most_recent_worked_tasks_and_clients(5):
+        # Add menu to the tray icon. It is built once and only its labels are updated.
+        menu = Gtk.Menu()
 
-                worked_time_item = Gtk.MenuItem(label=f"\u25B6 {client} - {task}")
-                worked_time_item.client = client
-                worked_time_item.task = task
+        # CLIENT ----------------------------
+        client_item = Gtk.MenuItem(label="")
 
-                link_gtk_menu_item_to_gio_action(worked_time_item, start_tracking_task_action, GLib.Variant("(ss)", (client, task)))
-                menu.append(worked_time_item)
-
-            # SEPARATOR ----------------------------
-            menu.append(Gtk.SeparatorMenuItem())
-
-            # HISTORY ----------------------------
-            history_item = Gtk.MenuItem(label="History")
-            history_item.connect("activate", lambda _0: HistoryBrowserWindow(tracking_state, worked_time_store).show_all())
-            menu.append(history_item)
-
-            # SEPARATOR ----------------------------
-            menu.append(Gtk.SeparatorMenuItem())
-
-
-            # ABORT ----------------------------
-            abort_item = Gtk.MenuItem(label="Abort")
-            link_gtk_menu_item_to_gio_action(abort_item, abort_tracking_action)
-            menu.append(abort_item)
-
-            # QUIT ----------------------------
-            quit_item = Gtk.MenuItem(label="Quit")
-            quit_item.connect("activate", lambda _0: application.quit())
-            menu.append(quit_item)
+        def _update_client_menu_item(*_):
+            client = tracking_state.client
+            client_item.set_label("Set Client" if client == "" else f"Client: {client}")
 
-            menu.show_all()
-            self.set_secondary_menu(menu)
+        _update_client_menu_item()
+        tracking_state.connect("notify::client", _update_client_menu_item)
+        client_item.connect("activate", lambda _0: application.activate())
+        menu.append(client_item)
 
-        _update_menu()
+        # TASK ----------------------------
+        task_item = Gtk.MenuItem(label="")
 
-        worked_time_store.connect("items-changed", _update_menu)
+        def _update_task_menu_item(*_):
+            task = tracking_state.task
+            task_item.set_label("Set Task" if task=="" else f"Task: {task}")
+
+        _update_task_menu_item()
+        tracking_state.connect("notify::task", _update_task_menu_item)
+        task_item.connect("activate", lambda _0: application.activate())
+        menu.append(task_item)
+
+        # SEPARATOR ----------------------------
+        menu.append(Gtk.SeparatorMenuItem())
+
+        # WORKED ITEMS -------------------------
+        # A fixed set of items that are relabeled, shown and hidden as the recent work items change
+        worked_time_items = []
+
+        def _start_tracking_worked_time_item(worked_time_item):
+            start_tracking_task_action.activate(GLib.Variant("(ss)", (worked_time_item.client, worked_time_item.task)))
+
+        for _ in range(RECENT_ITEMS + MOST_WORKED_ITEMS):
+            worked_time_item = Gtk.MenuItem(label="")
+            worked_time_item.client = ""
+            worked_time_item.task = ""
+            worked_time_item.connect("activate", _start_tracking_worked_time_item)
+            worked_time_items.append(worked_time_item)
+            menu.append(worked_time_item)
+
+        def _update_worked_time_items_sensitivity(*_):
+            for worked_time_item in worked_time_items:
+                worked_time_item.set_sensitive(start_tracking_task_action.get_enabled())
+
+        _update_worked_time_items_sensitivity()
+        start_tracking_task_action.connect("notify::enabled", _update_worked_time_items_sensitivity)
+
+        def _update_worked_time_items(*_):
+            recent = worked_time_store.most_recent_worked_tasks_and_clients(RECENT_ITEMS)
+            most_worked = [
+                work_item
+                for work_item in worked_time_store.most_worked_tasks_and_clients(RECENT_ITEMS + MOST_WORKED_ITEMS)
+                if work_item not in recent
+            ]
+            work_items = recent + most_worked[:MOST_WORKED_ITEMS]
+            for i, worked_time_item in enumerate(worked_time_items):
+                if i >= len(work_items):
+                    worked_time_item.hide()
+                    continue
+                task, client = work_items[i]
+                if (worked_time_item.task, worked_time_item.client) != (task, client):
+                    worked_time_item.task = task
+                    worked_time_item.client = client
+                    worked_time_item.set_label(f"\u25B6 {client} - {task}")
+                worked_time_item.show()
+
+        # SEPARATOR ----------------------------
+        menu.append(Gtk.SeparatorMenuItem())
+
+        # HISTORY ----------------------------
+        history_item = Gtk.MenuItem(label="History")
+        history_item.connect("activate", lambda _0: HistoryBrowserWindow(tracking_state, worked_time_store).show_all())
+        menu.append(history_item)
+
+        # SEPARATOR ----------------------------
+        menu.append(Gtk.SeparatorMenuItem())
+
+
+        # ABORT ----------------------------
+        abort_item = Gtk.MenuItem(label="Abort")
+        link_gtk_menu_item_to_gio_action(abort_item, abort_tracking_action)
+        menu.append(abort_item)
+
+        # QUIT ----------------------------
+        quit_item = Gtk.MenuItem(label="Quit")
+        quit_item.connect("activate", lambda _0: application.quit())
+        menu.append(quit_item)
+
+        menu.show_all()
+        _update_worked_time_items()
+        self.set_secondary_menu(menu)
+
+        worked_time_store.connect("recent-changed", _update_worked_time_items)
+        # The most worked on tasks change with the worked time, not only with the order of the recent ones
+        worked_time_store.connect("rollups-changed", _update_worked_time_items)
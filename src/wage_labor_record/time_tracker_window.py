@@ -1,6 +1,7 @@
 import datetime
 import gi
 
+from wage_labor_record.ticker import TickSubscription, set_markup_if_changed
 from wage_labor_record.tracking_state import TrackingState
 from wage_labor_record.utils import make_completer
 from wage_labor_record.worked_time_store import WorkedTimeStore
@@ -65,23 +66,21 @@ class TimeTrackerWindow(Gtk.Dialog):
         tracking_state.bind_property("task", self.task_entry, "text", GObject.BindingFlags.BIDIRECTIONAL | GObject.BindingFlags.SYNC_CREATE)
         tracking_state.bind_property("client", self.client_entry, "text", GObject.BindingFlags.BIDIRECTIONAL | GObject.BindingFlags.SYNC_CREATE)
 
-        # When the tracking is active, repeatedly update the elapsed time label
-        def _update_elapsed_time_label():
+        # When the tracking is active, update the elapsed time label every second
+        def _update_elapsed_time_label(now: GLib.DateTime):
             if tracking_state.is_tracking():
-                label_txt = str(datetime.timedelta(
-                    seconds=
-                        round(GLib.DateTime.new_now_local().difference(tracking_state.start_time)/1000000)
-                ))
-                self.elapsed_time_label.set_markup(f"<span font='monospace bold 24'>{label_txt}</span>")
-            return tracking_state.is_tracking()
+                seconds = round(now.difference(tracking_state.start_time) / 1000000)
+            else:
+                seconds = 0
+            label_txt = str(datetime.timedelta(seconds=seconds))
+            set_markup_if_changed(self.elapsed_time_label, f"<span font='monospace bold 24'>{label_txt}</span>")
+
+        elapsed_time_ticks = TickSubscription(self.elapsed_time_label, _update_elapsed_time_label)
 
         def _setup_elapsed_time_label_updates(*_):
-            if tracking_state.is_tracking():
-                _update_elapsed_time_label()
-                GLib.timeout_add(1000, _update_elapsed_time_label)
-            else:
-                label_txt = str(datetime.timedelta(seconds=0))
-                self.elapsed_time_label.set_markup(f"<span font='monospace bold 24'>{label_txt}</span>")
+            _update_elapsed_time_label(GLib.DateTime.new_now_local())
+            elapsed_time_ticks.set_active(tracking_state.is_tracking())
 
         _setup_elapsed_time_label_updates()
-        tracking_state.connect("notify::start-time", _setup_elapsed_time_label_updates)
+        handler_id = tracking_state.connect("notify::start-time", _setup_elapsed_time_label_updates)
+        self.connect("destroy", lambda *_args: tracking_state.disconnect(handler_id))
@@ -1,8 +1,13 @@
 import datetime
 import json
 import os
+from typing import Optional
 
 import gi
+
+from wage_labor_record.persistence import atomic_write
+from wage_labor_record.write_scheduler import WriteJob, WriteScheduler
+
 gi.require_version("Gtk", "3.0")
 from gi.repository import GObject, GLib
 
@@ -12,17 +17,19 @@ class TrackingState(GObject.GObject):
 
     Includes the start time, the task and the client.
     Whenever the state changes, the state is saved to a json file.
+    Changes in quick succession (e.g. typing a task name) are coalesced into a single background write.
     When the start time is None, the time is not being tracked.
     """
     start_time = GObject.Property(type=GLib.DateTime, default=None)
     task = GObject.Property(type=str, default="")
     client = GObject.Property(type=str, default="")
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, save_delay_ms: int = 1000):
         GObject.GObject.__init__(self)
         self._filename = path
         self._load()
-        self.connect("notify", self._save)
+        self._write_scheduler = WriteScheduler(self._prepare_write, delay_ms=save_delay_ms)
+        self.connect("notify", lambda *_args: self._write_scheduler.mark_dirty())
 
     def _load(self):
         if os.path.exists(self._filename):
@@ -32,13 +39,22 @@ class TrackingState(GObject.GObject):
                 self.task = d["task"]
                 self.client = d["client"]
 
-    def _save(self, *_args):
-        with open(self._filename, "w") as f:
-            json.dump({
+    def _prepare_write(self) -> Optional[WriteJob]:
+        state = {
             "start_time": self.start_time.format_iso8601() if self.start_time else None,
             "task": self.task,
             "client": self.client,
-        }, f, indent=2)
+        }
+        filename = self._filename
+        return lambda: atomic_write(filename, json.dumps(state, indent=2))
+
+    def flush(self):
+        """
+        Blocks until the current state is written to disk.
+
+        :raises Exception: If the state could not be written.
+        """
+        self._write_scheduler.flush()
 
     def is_tracking(self) -> bool:
         return self.start_time is not None
@@ -46,7 +62,9 @@ class TrackingState(GObject.GObject):
     def is_client_and_task_set(self) -> bool:
         return self.client != "" and self.task != ""
 
-    def elapsed_time(self) -> datetime.timedelta:
+    def elapsed_time(self, now: Optional[GLib.DateTime] = None) -> datetime.timedelta:
         if self.start_time is None:
             return datetime.timedelta()
-        return datetime.timedelta(microseconds=GLib.DateTime.new_now_local().difference(self.start_time))
+        if now is None:
+            now = GLib.DateTime.new_now_local()
+        return datetime.timedelta(microseconds=now.difference(self.start_time))
@@ -1,7 +1,3 @@
-import os
-import sys
-import warnings
-from pathlib import Path
 from typing import Optional, Set, Tuple
 
 import gi
@@ -9,45 +5,6 @@ gi.require_version("Gtk", "3.0")
 from gi.repository import GLib, Gio, Gtk
 
 
-def user_data_dir(app_name: str) -> Path:
-    r"""
-    Get OS specific data directory path for SwagLyrics.
-    Typical user data directories are:
-        macOS:    ~/Library/Application Support/<app_name>
-        Unix:     ~/.local/share/<app_name>   # or in $XDG_DATA_HOME, if defined
-        Win 10:   C:\Users\<username>\AppData\Local\<app_name>
-    For Unix, we follow the XDG spec and support $XDG_DATA_HOME if defined.
-    :return: full path to the user-specific data dir
-    """
-
-    # get os specific path
-    if sys.platform.startswith("win"):
-        os_path = os.getenv("LOCALAPPDATA")
-    elif sys.platform.startswith("darwin"):
-        os_path = "~/Library/Application Support"
-    else:
-        # linux
-        os_path = os.getenv("XDG_DATA_HOME", "~/.local/share")
-
-    # append app name
-    path = Path(os_path) / app_name
-    return path.expanduser()
-
-
-def get_idle_time():
-    # TODO: maybe this is a better way to do idle time detection:
-    #  https://stackoverflow.com/questions/217157/how-can-i-determine-the-display-idle-time-from-python-in-windows-linux-and-mac
-    if sys.platform=="win32":
-        import ctypes
-        return ctypes.windll.user32.GetLastInputInfo() / 1000
-    elif sys.platform=="linux":
-        import subprocess
-        return int(subprocess.check_output(["xprintidle"])) / 1000
-    else:
-        warnings.warn(f"No idle time detection for platform {sys.platform}")
-        return 0
-
-
 def link_gtk_menu_item_to_gio_action(menu_item: Gtk.MenuItem, action: Gio.SimpleAction, parameter: Optional[GLib.Variant] = None):
     """
     Links a Gtk.MenuItem to a Gio.SimpleAction.
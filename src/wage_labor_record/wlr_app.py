@@ -1,80 +1,113 @@
 import logging
 import sys
+from typing import List, Optional
 
 import gi
 
+from wage_labor_record.activity_recorder import ActivityRecorder
 from wage_labor_record.actions import AbortTrackingAction, SetCurrentTaskAction, StartTrackingAction, StopTrackingAction
 from wage_labor_record.time_tracker_tray_icon import TimeTrackerTrayIcon
 from wage_labor_record.time_tracker_window import TimeTrackerWindow
-from wage_labor_record.worked_time_store import WorkedTimeStore
+from wage_labor_record.worked_time_history import default_history_path
+from wage_labor_record.worked_time_store import WorkedTimeStore, unix_usec
 from wage_labor_record.tracking_state import TrackingState
-from wage_labor_record.utils import get_idle_time, user_data_dir
+from wage_labor_record.idle_monitor import IdleMonitor
+from wage_labor_record.idle_sources import create_idle_source
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib
 
 logging.basicConfig(level=logging.INFO)
 
+IDLE_THRESHOLD = 60 * 15  # seconds
+
 
 class TimerTrackerApplication(Gtk.Application):
 
-    def __init__(self):
+    def __init__(self, storage: Optional[str] = None):
+        """
+        :param storage: The storage backend of the worked times, "json" or "sqlite".
+            By default, the backend they are stored with.
+        """
         super().__init__(
             register_session=True,
             application_id="net.ernestum.wage_labor_record",
         )
 
-        data_dir = user_data_dir("Wage Labor Record")
+        data_dir = default_history_path().parent
         data_dir.mkdir(parents=True, exist_ok=True)
 
         self.tracking_state = tracking_state = TrackingState(data_dir / "state.json")
         self.start_tracking_action = start_tracking_action = StartTrackingAction(tracking_state)
         self.start_tracking_task_action = start_tracking_task_action = SetCurrentTaskAction(tracking_state)
-        self.stop_tracking_action = stop_tracking_action = StopTrackingAction(tracking_state)
+        # Idle periods that the user chose to discard are cut out when tracking stops
+        self.activity_recorder = activity_recorder = ActivityRecorder()
+        self.stop_tracking_action = stop_tracking_action = StopTrackingAction(tracking_state, activity_recorder)
         self.abort_tracking_action = abort_tracking_action = AbortTrackingAction(tracking_state)
         self.add_action(start_tracking_action)
         self.add_action(start_tracking_task_action)
         self.add_action(stop_tracking_action)
         self.add_action(abort_tracking_action)
 
-        self.worked_time_store = worked_time_store = WorkedTimeStore(data_dir / "worked_times.json")
+        self.worked_time_store = worked_time_store = WorkedTimeStore(data_dir / "worked_times.json", storage=storage)
 
-        stop_tracking_action.connect("worked-time", lambda _, worked_time: worked_time_store.append(worked_time))
+        stop_tracking_action.connect("worked-time", lambda _, worked_time: worked_time_store.insert_sorted(worked_time))
+        self._write_error_dialog: Optional[Gtk.MessageDialog] = None
+        worked_time_store.connect("write-failed", lambda _store, message: self._show_write_error(message))
         self.tray_icon = TimeTrackerTrayIcon(tracking_state, worked_time_store, self)
 
-        def _check_for_idle(*_):
-            if tracking_state.is_tracking():
-                idle_time = get_idle_time()
-                logging.debug(f"Idle time: {idle_time}")
-                if idle_time > 60 * 15:  # when idle for 15 minutes
-                    # show dialog to ask whether to continue tracking, stopping tracking and discarding the time or stopping tracking and saving the time
-                    dialog = Gtk.MessageDialog(
-                        transient_for=self.get_active_window(),
-                        modal=True,
-                        message_type=Gtk.MessageType.QUESTION,
-                        buttons=Gtk.ButtonsType.NONE,
-                        text="You have been idle for 15 minutes. Do you want to continue tracking?",
-                    )
-                    dialog.add_button("Continue", Gtk.ResponseType.YES)
-                    dialog.add_button("Continue but discard (not implemented)", Gtk.ResponseType.APPLY).set_sensitive(False)
-                    dialog.add_button("Stop and discard (not implemented)", Gtk.ResponseType.NO).set_sensitive(False)
-                    dialog.add_button("Stop and save", Gtk.ResponseType.CANCEL).set_action_name("app.abort-tracking")
-                    response = dialog.run()
-                    # TODO: what do we do if the task has not been set yet? then we could not stop tracking
-                    # TODO: add option to enter task in dialog
-                    if response == Gtk.ResponseType.YES:
-                        pass
-                    elif response == Gtk.ResponseType.APPLY:
-                        pass  # TODO: implement
-                    elif response == Gtk.ResponseType.NO:
-                        pass  # TODO: implement
-                    elif response == Gtk.ResponseType.CANCEL:
-                        stop_tracking_action.activate()
-
-                    dialog.destroy()
-            return True
-
-        GLib.timeout_add(1000, _check_for_idle)
+        self.idle_monitor = idle_monitor = IdleMonitor(create_idle_source(), activity_recorder)
+        self._idle_watch_id = None
+
+        def _on_idle(_watch_id):
+            # Ask once the user is back, so we know how long they were gone
+            idle_since = GLib.DateTime.new_now_local().add_seconds(-idle_monitor.get_idle_time())
+            idle_monitor.add_active_watch(lambda _watch_id: _on_back_from_idle(idle_since))
+
+        def _on_back_from_idle(idle_since: GLib.DateTime):
+            if not tracking_state.is_tracking():
+                return
+            idle_minutes = GLib.DateTime.new_now_local().difference(idle_since) // (60 * GLib.TIME_SPAN_SECOND)
+            # show dialog to ask whether to continue tracking, stopping tracking and discarding the time or stopping tracking and saving the time
+            dialog = Gtk.MessageDialog(
+                transient_for=self.get_active_window(),
+                modal=True,
+                message_type=Gtk.MessageType.QUESTION,
+                buttons=Gtk.ButtonsType.NONE,
+                text=f"You have been idle for {idle_minutes} minutes. Do you want to continue tracking?",
+            )
+            dialog.add_button("Continue", Gtk.ResponseType.YES)
+            dialog.add_button("Continue but discard", Gtk.ResponseType.APPLY)
+            dialog.add_button("Stop and discard", Gtk.ResponseType.NO).set_sensitive(stop_tracking_action.get_enabled())
+            dialog.add_button("Stop and save", Gtk.ResponseType.CANCEL).set_action_name("app.abort-tracking")
+            response = dialog.run()
+            # TODO: what do we do if the task has not been set yet? then we could not stop tracking
+            # TODO: add option to enter task in dialog
+            if response == Gtk.ResponseType.YES:
+                pass  # the idle time is kept
+            elif response == Gtk.ResponseType.APPLY:
+                # Cut out when tracking stops
+                activity_recorder.discard(unix_usec(idle_since))
+            elif response == Gtk.ResponseType.NO:
+                stop_tracking_action.stop(idle_since)
+            elif response == Gtk.ResponseType.CANCEL:
+                stop_tracking_action.activate()
+
+            dialog.destroy()
+
+        def _update_idle_watch(*_):
+            # Only watch for idle time while tracking
+            if tracking_state.is_tracking() and self._idle_watch_id is None:
+                self._idle_watch_id = idle_monitor.add_idle_watch(IDLE_THRESHOLD, _on_idle)
+            elif not tracking_state.is_tracking() and self._idle_watch_id is not None:
+                idle_monitor.remove_watch(self._idle_watch_id)
+                self._idle_watch_id = None
+
+        tracking_state.connect("notify::start-time", _update_idle_watch)
+        _update_idle_watch()
+
+        # Don't lose pending writes when the desktop session ends
+        self.connect("query-end", lambda *_args: self._flush_state())
 
     def do_activate(self):
         self.hold()  # Keep the application running until we explicitly quit
@@ -87,13 +120,57 @@ class TimerTrackerApplication(Gtk.Application):
                 worked_time_store=self.worked_time_store,
                 application=self, title="Working Labor Record").present()
 
+    def _show_write_error(self, message: str):
+        # One dialog at a time, however often the retries fail
+        if self._write_error_dialog is not None:
+            return
+        dialog = Gtk.MessageDialog(
+            transient_for=self.get_active_window(),
+            message_type=Gtk.MessageType.ERROR,
+            buttons=Gtk.ButtonsType.CLOSE,
+            text="The worked times could not be saved",
+            secondary_text=f"{message}\n\nYour changes are kept and saving them is retried.",
+        )
+
+        def on_response(*_args):
+            dialog.destroy()
+            self._write_error_dialog = None
+        dialog.connect("response", on_response)
+        self._write_error_dialog = dialog
+        dialog.show()
+
+    def _flush_state(self):
+        try:
+            self.tracking_state.flush()
+            self.worked_time_store.flush()
+        except Exception:
+            logging.exception("Could not save before the session ends")
+
+    def do_shutdown(self):
+        # The main loop has stopped, so a failed write can only be logged
+        try:
+            self.tracking_state.flush()
+        except Exception:
+            logging.exception("Could not save the tracking state")
+        try:
+            self.worked_time_store.close()
+        except Exception:
+            logging.exception("Could not save the worked times, the last changes are lost")
+        Gtk.Application.do_shutdown(self)
+
     def on_quit(self, action, param):
-        self.worked_time_store.save()
+        try:
+            self.tracking_state.flush()
+            self.worked_time_store.save()
+        except Exception as e:
+            # Keep running, so the changes are not lost and saving them is retried
+            self._show_write_error(str(e))
+            return
         self.quit()
 
-def main():
-    app = TimerTrackerApplication()
+def main(storage: Optional[str] = None, argv: Optional[List[str]] = None):
+    app = TimerTrackerApplication(storage)
     try:
-        app.run(sys.argv)
+        app.run(sys.argv if argv is None else argv)
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,401 @@
+"""
+Loading the worked time history from disk without GTK, for the app as well as for the command line and scripts.
+
+The history is stored either as JSON files, one per month (see `partitions`), or in an SQLite database
+(see `sqlite_history`). The readers here work with both.
+"""
+import contextlib
+import logging
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.partitions import (
+    Manifest, PartitionSummary, manifest_path, partition_directory, partition_key, partition_path, snapshot_paths)
+from wage_labor_record.reporting import ReportColumns
+from wage_labor_record.rollups import DailyRollups, RollupKey, local_midnight
+from wage_labor_record.snapshot_cache import SnapshotCache, SnapshotColumns
+from wage_labor_record import sqlite_history
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+APP_NAME = "Wage Labor Record"
+STORAGE_BACKENDS = ("json", "sqlite")
+
+
+def user_data_dir(app_name: str) -> Path:
+    r"""
+    Get OS specific data directory path for SwagLyrics.
+    Typical user data directories are:
+        macOS:    ~/Library/Application Support/<app_name>
+        Unix:     ~/.local/share/<app_name>   # or in $XDG_DATA_HOME, if defined
+        Win 10:   C:\Users\<username>\AppData\Local\<app_name>
+    For Unix, we follow the XDG spec and support $XDG_DATA_HOME if defined.
+    :return: full path to the user-specific data dir
+    """
+
+    # get os specific path
+    if sys.platform.startswith("win"):
+        os_path = os.getenv("LOCALAPPDATA")
+    elif sys.platform.startswith("darwin"):
+        os_path = "~/Library/Application Support"
+    else:
+        # linux
+        os_path = os.getenv("XDG_DATA_HOME", "~/.local/share")
+
+    # append app name
+    path = Path(os_path) / app_name
+    return path.expanduser()
+
+
+def default_history_path() -> Path:
+    """The snapshot file of the worked times recorded by the app."""
+    return user_data_dir(APP_NAME) / "worked_times.json"
+
+
+def history_backend(history_path: os.PathLike) -> str:
+    """The backend the history is stored with: "sqlite" if it was migrated to a database, otherwise "json"."""
+    return "sqlite" if sqlite_history.sqlite_path(history_path).exists() else "json"
+
+
+class LoadedHistory(NamedTuple):
+    records: List[WorkedTimeRecord]
+    rollups: DailyRollups
+    # Whether the snapshot cache should be rewritten, e.g. because it was missing or lacked the rollups
+    snapshot_cache_outdated: bool
+
+
+def load_history(journal: WorkedTimeJournal, snapshot_cache: SnapshotCache) -> LoadedHistory:
+    """Loads the snapshot (preferably from the cache), replays the journal and computes the daily rollups."""
+    columns = snapshot_cache.load()
+    snapshot = None if columns is None else {row[0]: WorkedTimeRecord.fromrow(row) for row in columns.rows()}
+    loaded = journal.load(snapshot)
+    records = [
+        record if isinstance(record, WorkedTimeRecord) else WorkedTimeRecord.fromdict(record)
+        for record in loaded
+    ]
+    rollups = _load_rollups(columns, snapshot, loaded, records)
+    return LoadedHistory(records, rollups, columns is None or columns.rollups is None)
+
+
+def _load_rollups(
+        columns: Optional[SnapshotColumns],
+        snapshot: Optional[Dict[str, WorkedTimeRecord]],
+        loaded: List[Any],
+        records: List[WorkedTimeRecord]) -> DailyRollups:
+    if columns is None or columns.rollups is None:
+        return DailyRollups(records)
+    # The cached rollups are those of the snapshot. Apply what the journal changed on top of it.
+    rollups = DailyRollups.from_buckets(columns.rollup_buckets())
+    kept = {id(entry) for entry in loaded if isinstance(entry, WorkedTimeRecord)}
+    for record in snapshot.values():
+        if id(record) not in kept:
+            rollups.remove_record(record)
+    for entry, record in zip(loaded, records):
+        if entry is not record:
+            rollups.add_record(record)
+    return rollups
+
+
+class _CachedHistory(NamedTuple):
+    columns: SnapshotColumns
+    # Positions of the cached worked times that are still there unchanged, and of those that were changed or removed
+    kept: List[int]
+    replaced: List[int]
+    # The worked times added or changed by the journal
+    changed: List[WorkedTimeRecord]
+
+
+def _read_cached_history(journal: WorkedTimeJournal, snapshot_cache: SnapshotCache) -> Optional[_CachedHistory]:
+    """Replays the journal on top of the positions of the cached worked times, so only the journal is parsed."""
+    columns = snapshot_cache.load()
+    if columns is None:
+        return None
+    loaded = journal.load(dict(zip(columns.ids, range(len(columns.ids)))))
+    kept = [entry for entry in loaded if entry.__class__ is int]
+    changed = [WorkedTimeRecord.fromdict(entry) for entry in loaded if entry.__class__ is not int]
+    replaced = [] if len(kept) == len(columns.ids) else sorted(set(range(len(columns.ids))).difference(kept))
+    return _CachedHistory(columns, kept, replaced, changed)
+
+
+def read_history_rollups(
+        history_path: os.PathLike,
+        start_day: Optional[int] = None,
+        end_day: Optional[int] = None) -> Optional[List[Tuple[RollupKey, int]]]:
+    """
+    Reads the daily rollups of the history straight from the snapshot caches, without going through the worked times.
+
+    Only the partitions overlapping the days are read. The changes in their journals are appended as additional
+    (possibly negative) buckets.
+
+    :param start_day: The first day to read as proleptic Gregorian ordinal, or None for no bound.
+    :param end_day: The day after the last day to read, or None for no bound.
+    :return: The rollup buckets, or None if they are not cached (e.g. because the time zone changed, or the history
+        is stored in a database).
+    """
+    if history_backend(history_path) == "sqlite":
+        return None
+    buckets: List[Tuple[RollupKey, int]] = []
+    for snapshot_path in _snapshot_paths_of_days(history_path, start_day, end_day):
+        partition_buckets = _read_rollups(snapshot_path, start_day, end_day)
+        if partition_buckets is None:
+            return None
+        buckets.extend(partition_buckets)
+    return buckets
+
+
+def _snapshot_paths_of_days(history_path: os.PathLike, start_day: Optional[int], end_day: Optional[int]) -> List[Path]:
+    return snapshot_paths(
+        history_path,
+        start_time=None if start_day is None else local_midnight(start_day),
+        end_time=None if end_day is None else local_midnight(end_day) - 1)
+
+
+def _read_rollups(
+        snapshot_path: os.PathLike,
+        start_day: Optional[int],
+        end_day: Optional[int]) -> Optional[List[Tuple[RollupKey, int]]]:
+    history = _read_cached_history(WorkedTimeJournal(snapshot_path), SnapshotCache(snapshot_path))
+    if history is None or history.columns.rollups is None:
+        return None
+    columns = history.columns
+    delta = DailyRollups()
+    for i in history.replaced:
+        delta.add(
+            columns.tasks[columns.task_codes[i]], columns.clients[columns.client_codes[i]],
+            columns.start_times[i], columns.end_times[i], sign=-1)
+    for record in history.changed:
+        delta.add_record(record)
+
+    # The cached buckets are sorted by day
+    days = columns.rollups.days
+    low = 0 if start_day is None else bisect_left(days, start_day)
+    high = len(days) if end_day is None else bisect_left(days, end_day)
+    tasks, clients = columns.tasks, columns.clients
+    buckets = [
+        ((days[i], tasks[columns.rollups.task_codes[i]], clients[columns.rollups.client_codes[i]]), columns.rollups.durations[i])
+        for i in range(low, high)
+    ]
+    buckets.extend(
+        bucket for bucket in delta.buckets()
+        if (start_day is None or bucket[0][0] >= start_day) and (end_day is None or bucket[0][0] < end_day))
+    return buckets
+
+
+def read_history_columns(
+        history_path: os.PathLike,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None) -> ReportColumns:
+    """
+    Reads the history in columnar form for reports, without creating a `WorkedTimeRecord` per cached worked time.
+
+    Only the partitions that may hold worked time between `start_time` and `end_time` are read,
+    so the columns can contain worked times outside of the period as well.
+    """
+    if history_backend(history_path) == "sqlite":
+        with contextlib.closing(sqlite_history.connect(sqlite_history.sqlite_path(history_path))) as connection:
+            return ReportColumns.from_records(
+                sqlite_history.read_overlapping_records(connection, start_time, end_time))
+    columns = [_read_columns(path) for path in snapshot_paths(history_path, start_time, end_time)]
+    return _concat(columns) if columns else ReportColumns.from_records([])
+
+
+def _read_columns(snapshot_path: os.PathLike) -> ReportColumns:
+    journal = WorkedTimeJournal(snapshot_path)
+    history = _read_cached_history(journal, SnapshotCache(snapshot_path))
+    if history is None:
+        return ReportColumns.from_records(WorkedTimeRecord.fromdict(d) for d in journal.load())
+
+    columns = ReportColumns.from_snapshot_columns(history.columns)
+    if history.replaced:
+        kept = history.kept
+        columns = columns._replace(**{
+            name: array(column.typecode, [column[i] for i in kept])
+            for name, column in columns._asdict().items() if isinstance(column, array)
+        })
+    if history.changed:
+        columns = _append(columns, history.changed)
+    return columns
+
+
+def _append(columns: ReportColumns, records: List[WorkedTimeRecord]) -> ReportColumns:
+    start_times, end_times = array("q", columns.start_times), array("q", columns.end_times)
+    task_codes, client_codes = array("i", columns.task_codes), array("i", columns.client_codes)
+    tasks, clients = list(columns.tasks), list(columns.clients)
+    task_index = {task: code for code, task in enumerate(tasks)}
+    client_index = {client: code for code, client in enumerate(clients)}
+    for record in records:
+        start_times.append(record.start_time)
+        end_times.append(record.end_time)
+        task_codes.append(task_index.setdefault(record.task, len(tasks)))
+        if task_codes[-1] == len(tasks):
+            tasks.append(record.task)
+        client_codes.append(client_index.setdefault(record.client, len(clients)))
+        if client_codes[-1] == len(clients):
+            clients.append(record.client)
+    return ReportColumns(start_times, end_times, task_codes, client_codes, tasks, clients)
+
+
+def _concat(columns: List[ReportColumns]) -> ReportColumns:
+    if len(columns) == 1:
+        return columns[0]
+    start_times, end_times, task_codes, client_codes = array("q"), array("q"), array("i"), array("i")
+    tasks: List[str] = []
+    clients: List[str] = []
+    task_index: Dict[str, int] = dict()
+    client_index: Dict[str, int] = dict()
+    for part in columns:
+        start_times.extend(part.start_times)
+        end_times.extend(part.end_times)
+        task_map = [task_index.setdefault(task, len(task_index)) for task in part.tasks]
+        client_map = [client_index.setdefault(client, len(client_index)) for client in part.clients]
+        task_codes.extend(task_map[code] for code in part.task_codes)
+        client_codes.extend(client_map[code] for code in part.client_codes)
+    tasks.extend(task_index)
+    clients.extend(client_index)
+    return ReportColumns(start_times, end_times, task_codes, client_codes, tasks, clients)
+
+
+def read_history_records(
+        history_path: os.PathLike,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None) -> Iterator[WorkedTimeRecord]:
+    """
+    Reads the worked times of the partitions that may hold worked time between `start_time` and `end_time`,
+    sorted by start time.
+
+    The worked times are streamed a partition at a time: each partition holds the worked times starting in its
+    month, so sorting within a partition and going through the partitions in month order sorts them all.
+    A database is read through a cursor ordered by start time.
+    """
+    if history_backend(history_path) == "sqlite":
+        with contextlib.closing(sqlite_history.connect(sqlite_history.sqlite_path(history_path))) as connection:
+            yield from sqlite_history.read_overlapping_records(connection, start_time, end_time)
+        return
+    for path in snapshot_paths(history_path, start_time, end_time):
+        records = load_history(WorkedTimeJournal(path), SnapshotCache(path)).records
+        records.sort(key=lambda record: record.start_time)
+        yield from records
+
+
+def migrate_to_partitions(history_path: os.PathLike) -> bool:
+    """
+    Splits the legacy single-file history into one partition per month, unless that happened already.
+
+    The partitions and their caches are written first and the manifest last, so an interrupted migration is
+    simply repeated. Afterwards, the legacy files are renamed to *.migrated.
+
+    :return: Whether the history was migrated.
+    """
+    history_path = Path(history_path)
+    directory = partition_directory(history_path)
+    journal_path = history_path.with_suffix(".journal")
+    if manifest_path(directory).exists() or not (history_path.exists() or journal_path.exists()):
+        return False
+
+    logging.info(f"Splitting {history_path} into monthly partitions in {directory}")
+    _write_partitions(directory, load_history(WorkedTimeJournal(history_path), SnapshotCache(history_path)).records)
+    for path in (history_path, journal_path, history_path.with_suffix(".cache")):
+        if path.exists():
+            _set_aside(path)
+    return True
+
+
+def migrate_to_sqlite(history_path: os.PathLike) -> bool:
+    """
+    Moves the JSON history into an SQLite database, unless it is in one already.
+
+    The database is written next to the partitions and only renamed into place once it is complete.
+    Afterwards, the partitions are renamed to *.migrated.
+
+    :return: Whether the history was migrated.
+    """
+    history_path = Path(history_path)
+    database_path = sqlite_history.sqlite_path(history_path)
+    if database_path.exists():
+        return False
+    migrate_to_partitions(history_path)
+    directory = partition_directory(history_path)
+    records = read_history_records(history_path)
+
+    logging.info(f"Moving the worked times in {directory} into {database_path}")
+    tmp_path = database_path.with_name(f".{database_path.name}.tmp")
+    # Leftovers of an interrupted migration
+    for path in (tmp_path, *sqlite_history.sidecar_paths(tmp_path)):
+        path.unlink(missing_ok=True)
+    with contextlib.closing(sqlite_history.connect(tmp_path)) as connection:
+        sqlite_history.write_records(connection, records)
+        sqlite_history.checkpoint(connection)
+    os.replace(tmp_path, database_path)
+    if directory.exists():
+        _set_aside(directory)
+    return True
+
+
+def migrate_to_json(history_path: os.PathLike) -> bool:
+    """
+    Moves the history out of the SQLite database into JSON files, one per month, unless it is not in a database.
+
+    Afterwards, the database is renamed to *.migrated, together with its write-ahead log and shared memory files
+    if it was not closed cleanly.
+
+    :return: Whether the history was migrated.
+    """
+    history_path = Path(history_path)
+    database_path = sqlite_history.sqlite_path(history_path)
+    if not database_path.exists():
+        return False
+    directory = partition_directory(history_path)
+
+    logging.info(f"Moving the worked times in {database_path} into {directory}")
+    with contextlib.closing(sqlite_history.connect(database_path)) as connection:
+        records = sqlite_history.read_records(connection)
+        # Nothing may be left in the write-ahead log once the database is set aside
+        sqlite_history.checkpoint(connection)
+    if directory.exists():
+        _set_aside(directory)
+    _write_partitions(directory, records)
+    target = _set_aside(database_path)
+    sidecars = zip(sqlite_history.sidecar_paths(database_path), sqlite_history.sidecar_paths(target))
+    for sidecar, target_sidecar in sidecars:
+        if sidecar.exists():
+            sidecar.rename(target_sidecar)
+    return True
+
+
+def _write_partitions(directory: Path, records: Iterable[WorkedTimeRecord]):
+    """Writes the worked times as partitions with their caches, and the manifest last."""
+    by_partition: Dict[str, List[WorkedTimeRecord]] = dict()
+    for record in records:
+        by_partition.setdefault(partition_key(record.start_time), []).append(record)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(directory)
+    for key, partition_records in sorted(by_partition.items()):
+        partition_records.sort(key=lambda record: record.start_time)
+        path = partition_path(directory, key)
+        # Leftovers of an interrupted migration
+        path.with_suffix(".journal").unlink(missing_ok=True)
+        WorkedTimeJournal(path).compact(record.asdict() for record in partition_records)
+        SnapshotCache(path).store(SnapshotColumns.from_rows(
+            (record.asrow() for record in partition_records), DailyRollups(partition_records).buckets()))
+        manifest.partitions[key] = PartitionSummary.of_records(partition_records)
+    manifest.store()
+
+
+def _set_aside(path: Path) -> Path:
+    """
+    Renames a migrated file or directory to *.migrated, without replacing one migrated earlier.
+
+    :return: The new path.
+    """
+    target = path.with_name(path.name + ".migrated")
+    number = 2
+    while target.exists():
+        target = path.with_name(f"{path.name}.migrated.{number}")
+        number += 1
+    path.rename(target)
+    return target
@@ -0,0 +1,192 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+
+class SortedRecords:
+    """Records sorted by start time, kept as parallel lists of epoch keys and records for bisection."""
+
+    def __init__(self, records: Iterable[WorkedTimeRecord] = ()):
+        self._records: List[WorkedTimeRecord] = sorted(records, key=lambda record: record.start_time)
+        self._start_times: List[int] = [record.start_time for record in self._records]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, position):
+        return self._records[position]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __reversed__(self):
+        return reversed(self._records)
+
+    def insert(self, record: WorkedTimeRecord) -> int:
+        """Inserts `record` after all records with the same start time and returns its position."""
+        position = bisect_right(self._start_times, record.start_time)
+        self._start_times.insert(position, record.start_time)
+        self._records.insert(position, record)
+        return position
+
+    def remove(self, record: WorkedTimeRecord, start_time: Optional[int] = None) -> int:
+        """
+        Removes `record` and returns the position it had.
+
+        :param start_time: The start time `record` was sorted by, if it was changed since.
+        """
+        position = self.find(record, start_time)
+        if position is None:
+            raise ValueError(f"Record not found: {record}")
+        del self._start_times[position]
+        del self._records[position]
+        return position
+
+    def find(self, record: WorkedTimeRecord, start_time: Optional[int] = None) -> Optional[int]:
+        if start_time is None:
+            start_time = record.start_time
+        position = bisect_left(self._start_times, start_time)
+        while position < len(self._records) and self._start_times[position] == start_time:
+            if self._records[position] is record:
+                return position
+            position += 1
+        return None
+
+    def range(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> Tuple[int, int]:
+        """The positions [low, high) of the records starting within [start_time, end_time]."""
+        low = 0 if start_time is None else bisect_left(self._start_times, start_time)
+        high = len(self._records) if end_time is None else bisect_right(self._start_times, end_time)
+        return low, max(low, high)
+
+
+class WorkedTimeIndex:
+    """
+    Answers range, task and client queries over worked time records without scanning the whole history.
+
+    Records are kept sorted by start time for bisection,
+    and per-task and per-client posting lists are kept for the name filters.
+    The index must be told about every added and removed record and about every edit of a record.
+    """
+
+    def __init__(self, records: Iterable[WorkedTimeRecord] = ()):
+        self._records = SortedRecords(records)
+        self._by_task: Dict[str, Set[WorkedTimeRecord]] = dict()
+        self._by_client: Dict[str, Set[WorkedTimeRecord]] = dict()
+        for record in self._records:
+            self._by_task.setdefault(record.task, set()).add(record)
+            self._by_client.setdefault(record.client, set()).add(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def records(self) -> SortedRecords:
+        return self._records
+
+    def add(self, record: WorkedTimeRecord) -> int:
+        """Adds `record` and returns its position in start time order."""
+        self._by_task.setdefault(record.task, set()).add(record)
+        self._by_client.setdefault(record.client, set()).add(record)
+        return self._records.insert(record)
+
+    def remove(self, record: WorkedTimeRecord) -> int:
+        """Removes `record` and returns the position it had in start time order."""
+        _discard(self._by_task, record.task, record)
+        _discard(self._by_client, record.client, record)
+        return self._records.remove(record)
+
+    def update(self, record: WorkedTimeRecord, field: str, old_value) -> Optional[Tuple[int, int]]:
+        """
+        Re-indexes `record` after its `field` was changed from `old_value`.
+
+        :return: The old and the new position of `record` in start time order, if the start time was changed.
+        """
+        if field == "start_time":
+            old_position = self._records.remove(record, old_value)
+            return old_position, self._records.insert(record)
+        elif field == "task":
+            _discard(self._by_task, old_value, record)
+            self._by_task.setdefault(record.task, set()).add(record)
+        elif field == "client":
+            _discard(self._by_client, old_value, record)
+            self._by_client.setdefault(record.client, set()).add(record)
+        return None
+
+    def query(
+            self,
+            start_time: Optional[int] = None,
+            end_time: Optional[int] = None,
+            tasks: Optional[Set[str]] = None,
+            clients: Optional[Set[str]] = None) -> List[WorkedTimeRecord]:
+        """
+        Finds the records starting within [start_time, end_time] with one of the given tasks and clients.
+
+        :param start_time: Lower bound of the start time in microseconds since the epoch, or None for no bound.
+        :param end_time: Upper bound (inclusive) of the start time in microseconds since the epoch, or None.
+        :param tasks: The tasks to include, or None for all tasks.
+        :param clients: The clients to include, or None for all clients.
+        :return: The matching records sorted by start time.
+        """
+        low, high = self._records.range(start_time, end_time)
+        if low == high:
+            return []
+
+        postings = [
+            (posting_lists, names)
+            for posting_lists, names in ((self._by_task, tasks), (self._by_client, clients))
+            if names is not None
+        ]
+        if not postings:
+            return self._records[low:high]
+
+        # Walk whichever is shorter: the time range or the smallest posting list
+        posting_lists, names = min(postings, key=lambda p: _posting_size(*p))
+        if _posting_size(posting_lists, names) < high - low:
+            candidates = set().union(*(posting_lists.get(name, ()) for name in names))
+            low_key = self._records[low].start_time
+            high_key = self._records[high - 1].start_time
+            result = [
+                record for record in candidates
+                if low_key <= record.start_time <= high_key and _matches(record, tasks, clients)
+            ]
+            result.sort(key=lambda record: record.start_time)
+            return result
+        return [record for record in self._records[low:high] if _matches(record, tasks, clients)]
+
+
+def changed_range(
+        old: Sequence[WorkedTimeRecord],
+        new: Sequence[WorkedTimeRecord]) -> Optional[Tuple[int, int, int]]:
+    """
+    The part of `old` that was replaced to get `new`, as (position, number removed, number added) like items-changed,
+    or None if they hold the same records in the same order.
+
+    Records are compared by identity, so edited records count as unchanged as long as they stay in place.
+    """
+    n = min(len(old), len(new))
+    start = 0
+    while start < n and old[start] is new[start]:
+        start += 1
+    if start == len(old) == len(new):
+        return None
+    end = 0
+    while end < n - start and old[len(old) - 1 - end] is new[len(new) - 1 - end]:
+        end += 1
+    return start, len(old) - start - end, len(new) - start - end
+
+
+def _matches(record: WorkedTimeRecord, tasks: Optional[Set[str]], clients: Optional[Set[str]]) -> bool:
+    return (tasks is None or record.task in tasks) and (clients is None or record.client in clients)
+
+
+def _posting_size(posting_lists: Dict[str, Set[WorkedTimeRecord]], names: Set[str]) -> int:
+    return sum(len(posting_lists.get(name, ())) for name in names)
+
+
+def _discard(posting_lists: Dict[str, Set[WorkedTimeRecord]], name: str, record: WorkedTimeRecord):
+    posting_list = posting_lists.get(name)
+    if posting_list is not None:
+        posting_list.discard(record)
+        if not posting_list:
+            del posting_lists[name]
@@ -0,0 +1,107 @@
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from wage_labor_record.journal import new_id
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_ISO8601 = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d+))?"
+    r"(?:(Z)|([+-])(\d{2})(?::?(\d{2}))?)?"
+)
+
+
+class WorkedTimeRecord:
+    """
+    The compact, GTK-free representation of a worked time.
+
+    Times are stored as microseconds since the epoch, and task and client names are interned,
+    so a decade of history stays within a few MB.
+    """
+    __slots__ = ("id", "task", "client", "start_time", "end_time")
+
+    def __init__(self, task: str, client: str, start_time: int, end_time: int, id: Optional[str] = None):
+        # Stable identity of the worked time in the journal
+        self.id = id if id is not None else new_id()
+        self.task = sys.intern(task)
+        self.client = sys.intern(client)
+        self.start_time = start_time
+        self.end_time = end_time
+
+    @property
+    def duration(self) -> timedelta:
+        return timedelta(microseconds=self.end_time - self.start_time)
+
+    def asdict(self) -> dict:
+        return dict(
+            id=self.id,
+            start_time=format_iso8601(self.start_time),
+            end_time=format_iso8601(self.end_time),
+            task=self.task,
+            client=self.client,
+        )
+
+    @classmethod
+    def fromdict(cls, d: dict) -> "WorkedTimeRecord":
+        return cls(
+            start_time=parse_iso8601(d["start_time"]),
+            end_time=parse_iso8601(d["end_time"]),
+            task=d["task"],
+            client=d["client"],
+            id=d.get("id"),
+        )
+
+    def asrow(self) -> Tuple[str, str, str, int, int]:
+        return self.id, self.task, self.client, self.start_time, self.end_time
+
+    @classmethod
+    def fromrow(cls, row: Tuple[str, str, str, int, int]) -> "WorkedTimeRecord":
+        record_id, task, client, start_time, end_time = row
+        return cls(task, client, start_time, end_time, id=record_id)
+
+    def __repr__(self):
+        return f"WorkedTimeRecord({self.task!r}, {self.client!r}, {self.start_time}, {self.end_time}, id={self.id!r})"
+
+
+def parse_iso8601(text: str) -> int:
+    """
+    Parses an ISO 8601 timestamp as written by `GLib.DateTime.format_iso8601`.
+
+    Timestamps without a UTC offset are interpreted in local time.
+
+    :return: Microseconds since the epoch.
+    """
+    match = _ISO8601.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid ISO 8601 timestamp: {text}")
+    year, month, day, hour, minute, second, fraction, utc, sign, offset_hours, offset_minutes = match.groups()
+    microseconds = int((fraction or "0")[:6].ljust(6, "0"))
+
+    if utc is None and sign is None:
+        local = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+        return int(local.timestamp()) * 1_000_000 + microseconds
+
+    offset = 0
+    if sign is not None:
+        offset = int(offset_hours) * 3600 + int(offset_minutes or 0) * 60
+        if sign == "-":
+            offset = -offset
+    days = date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL
+    seconds = days * 86400 + int(hour) * 3600 + int(minute) * 60 + int(second) - offset
+    return seconds * 1_000_000 + microseconds
+
+
+def format_iso8601(usec: int) -> str:
+    """Formats microseconds since the epoch in local time like `GLib.DateTime.format_iso8601` does."""
+    local = datetime.fromtimestamp(usec // 1_000_000, timezone.utc).astimezone()
+    text = local.strftime("%Y-%m-%dT%H:%M:%S")
+    if usec % 1_000_000:
+        text += f".{usec % 1_000_000:06}"
+
+    offset = int(local.utcoffset().total_seconds())
+    if offset == 0:
+        return text + "Z"
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return text + (f"{sign}{hours:02}:{minutes:02}" if minutes else f"{sign}{hours:02}")
@@ -1,163 +1,543 @@
-import json
-import logging
+import contextlib
 import os
+import sys
+import weakref
 from datetime import timedelta
-from typing import Callable, Generator, Optional, Set, Tuple
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
 
 import gi
 
+from wage_labor_record.name_catalog import NameCatalog
+from wage_labor_record.partitions import keys_overlapping, partition_key, previous_key
+from wage_labor_record.recent_work import RecentWorkItems, WorkItem, top_work_items_by_time
+from wage_labor_record.rollups import DailyRollups, PeriodTotals, RollupChange, local_day, local_midnight
+from wage_labor_record.storage import open_storage
+from wage_labor_record.worked_time_index import SortedRecords, WorkedTimeIndex, changed_range
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+from wage_labor_record.write_scheduler import WriteJob, WriteScheduler
+
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Gio, GLib, GObject
+from gi.repository import Gio, GLib, GObject
 
 
 class WorkedTime(GObject.GObject):
-    task = GObject.Property(type=str, default="")
-    client = GObject.Property(type=str, default="")
-    start_time = GObject.Property(type=GLib.DateTime, default=None)
-    end_time = GObject.Property(type=GLib.DateTime, default=None)
+    """
+    A GObject view of a `WorkedTimeRecord`, materialized on demand for the GTK views.
+
+    Edits made through the properties are written to the record and reported to the store it belongs to.
+    """
 
-    def __init__(self,  task: str, client: str, start_time: GLib.DateTime, end_time: GLib.DateTime):
+    def __init__(
+            self,
+            task: str,
+            client: str,
+            start_time: GLib.DateTime,
+            end_time: GLib.DateTime,
+            id: Optional[str] = None):
         GObject.GObject.__init__(self)
-        self.task = task
-        self.client = client
-        self.start_time = start_time
-        self.end_time = end_time
+        self._record = WorkedTimeRecord(task, client, unix_usec(start_time), unix_usec(end_time), id=id)
+        # The store to notify about edits, set once the worked time was added to a store
+        self._store: Optional["WorkedTimeStore"] = None
+
+    @classmethod
+    def of_record(cls, record: WorkedTimeRecord) -> "WorkedTime":
+        """A view of `record` itself rather than of a copy, as the store materializes them."""
+        item = cls.__new__(cls)
+        GObject.GObject.__init__(item)
+        item._record = record
+        item._store = None
+        return item
+
+    @property
+    def record(self) -> WorkedTimeRecord:
+        return self._record
+
+    @property
+    def id(self) -> str:
+        return self._record.id
+
+    @GObject.Property(type=str, default="")
+    def task(self) -> str:
+        return self._record.task
+
+    @task.setter
+    def task(self, value: str):
+        self._update("task", sys.intern(value))
+
+    @GObject.Property(type=str, default="")
+    def client(self) -> str:
+        return self._record.client
+
+    @client.setter
+    def client(self, value: str):
+        self._update("client", sys.intern(value))
+
+    @GObject.Property(type=GLib.DateTime, default=None)
+    def start_time(self) -> GLib.DateTime:
+        return datetime_from_unix_usec(self._record.start_time)
+
+    @start_time.setter
+    def start_time(self, value: GLib.DateTime):
+        self._update("start_time", unix_usec(value))
+        self.notify("duration")
 
-        # notify of derived duration property change
-        self.connect("notify::start-time", self._notify_duration)
-        self.connect("notify::end-time", self._notify_duration)
+    @GObject.Property(type=GLib.DateTime, default=None)
+    def end_time(self) -> GLib.DateTime:
+        return datetime_from_unix_usec(self._record.end_time)
 
-    def _notify_duration(self, *args):
+    @end_time.setter
+    def end_time(self, value: GLib.DateTime):
+        self._update("end_time", unix_usec(value))
         self.notify("duration")
 
     @GObject.Property(type=object)
     def duration(self) -> timedelta:
-        return timedelta(microseconds=self.end_time.difference(self.start_time))
+        return self._record.duration
 
-    def asdict(self) -> dict:
-        return dict(
-            start_time=self.start_time.format_iso8601(),
-            end_time=self.end_time.format_iso8601(),
-            task=self.task,
-            client=self.client,
-        )
+    def _update(self, field: str, value):
+        old_value = getattr(self._record, field)
+        if value == old_value:
+            return
+        setattr(self._record, field, value)
+        if self._store is not None:
+            self._store._record_changed(self._record, field, old_value)
 
-    @classmethod
-    def fromdict(cls, d: dict) -> "WorkedTime":
-        tz = GLib.TimeZone.new_local()
-        return cls(
-            start_time=GLib.DateTime.new_from_iso8601(d["start_time"], tz),
-            end_time=GLib.DateTime.new_from_iso8601(d["end_time"], tz),
-            task=d["task"],
-            client=d["client"],
-        )
+    def asdict(self) -> dict:
+        return self._record.asdict()
 
     def is_done(self) -> bool:
-        return self.end_time is not None
+        return self._record.end_time is not None
 
     def is_started(self) -> bool:
-        return self.start_time is not None
+        return self._record.start_time is not None
 
     def __str__(self):
         return f"WorkedTime({self.task}, {self.client}, {self.start_time}, {self.end_time})"
 
 
-class WorkedTimeStore(Gio.ListStore):
+def unix_usec(dt: GLib.DateTime) -> int:
+    return dt.to_unix() * 1_000_000 + dt.get_microsecond()
+
+
+def is_local_midnight(dt: GLib.DateTime) -> bool:
+    usec = unix_usec(dt)
+    return local_midnight(local_day(usec)) == usec
+
+
+def _local_day_starting_at(dt: GLib.DateTime) -> int:
+    if not is_local_midnight(dt):
+        raise ValueError(f"Not a local midnight: {dt.format_iso8601()}")
+    return local_day(unix_usec(dt))
+
+
+def datetime_from_unix_usec(usec: int) -> GLib.DateTime:
+    seconds, microseconds = divmod(usec, 1_000_000)
+    dt = GLib.DateTime.new_from_unix_local(seconds)
+    return dt.add(microseconds) if microseconds else dt
+
+
+class WorkedTimeStore(GObject.Object, Gio.ListModel):
+    """
+    The history of worked times.
+
+    The history is held as compact `WorkedTimeRecord`s, always sorted by start time.
+    `WorkedTime` GObjects are only materialized when a view asks for an item,
+    and the store keeps at most one of them alive per record.
+
+    The history is loaded a month at a time from its storage backend (see `storage`). Only the current and the
+    previous month (and the newest month with worked times) are loaded at startup. Older months are loaded on demand
+    by `ensure_loaded`, which subsets, period totals and `records()` call for the time they cover.
+    The list model and the recent work items only cover the loaded months,
+    while the task and client catalogs cover the whole history.
+    """
     clients_changed = GObject.Signal("clients-changed")
     tasks_changed = GObject.Signal("tasks-changed")
     item_added = GObject.Signal("item-added", arg_types=(WorkedTime,))
     item_removed = GObject.Signal("item-removed", arg_types=(WorkedTime,))
+    # The order of the most recently worked on task-client pairs changed
+    recent_changed = GObject.Signal("recent-changed")
+    # The worked time per day changed, with the list of `RollupChange`s, where an edit removes the old worked time
+    # and adds the new one. A batch emits its changes at once.
+    rollups_changed = GObject.Signal("rollups-changed", arg_types=(GObject.TYPE_PYOBJECT,))
+    # Writing the history failed with the given message. The changes are kept and the write is retried.
+    write_failed = GObject.Signal("write-failed", arg_types=(str,))
+
+    def __init__(self, filename: os.PathLike, save_delay_ms: int = 1000, storage: Optional[str] = None):
+        """
+        :param filename: The JSON history, next to which the monthly partitions or the database are stored.
+        :param storage: The storage backend, "json" or "sqlite", to which the history is migrated if needed.
+            By default, the backend the history is stored with.
+        """
+        GObject.Object.__init__(self)
+        self._materialized: "weakref.WeakValueDictionary[str, WorkedTime]" = weakref.WeakValueDictionary()
+        # The open subsets, which are updated on every mutation
+        self._views: "weakref.WeakSet[WorkedTimeSubset]" = weakref.WeakSet()
+        # Nesting depth of batch(), and what to emit once the outermost batch ends: the order of the records before
+        # the first mutation (None while nothing was added, removed or moved) and the edited records
+        self._batch_depth = 0
+        self._batch_old_records: Optional[List[WorkedTimeRecord]] = None
+        self._batch_edited: Set[WorkedTimeRecord] = set()
+        self._batch_changed_catalogs: Set[str] = set()
+        self._batch_rollup_changes: List[RollupChange] = []
+        self._compaction_requested = False
+        self._write_scheduler = WriteScheduler(
+            self._prepare_write, delay_ms=save_delay_ms, write_failed=self._write_failed)
+
+        self._storage = open_storage(filename, storage)
+        current_key = partition_key(unix_usec(GLib.DateTime.new_now_local()))
+        eager_keys = {current_key, previous_key(current_key)}
+        months = list(self._storage.months())
+        if months:
+            eager_keys.add(max(months))
+        records = []
+        # Seeded from the rollups the storage has cached for each month, so they are not computed again
+        self._rollups = DailyRollups()
+        for key in sorted(eager_keys):
+            loaded = self._storage.load(key)
+            records.extend(loaded.records)
+            self._rollups.merge(loaded.rollups)
+        self._index = WorkedTimeIndex(records)
+        # The storage knows the tasks and clients of the months that are not loaded yet
+        task_uses, client_uses = self._storage.name_uses()
+        self._task_catalog = NameCatalog()
+        self._client_catalog = NameCatalog()
+        for name, uses in task_uses.items():
+            self._task_catalog.add(name, uses)
+        for name, uses in client_uses.items():
+            self._client_catalog.add(name, uses)
+        self.tasks = self._task_catalog.model
+        self.clients = self._client_catalog.model
+        self._recent = RecentWorkItems(self._records)
+        if self._storage.needs_write:
+            self._write_scheduler.mark_dirty()
+
+    def do_get_item_type(self):
+        return WorkedTime.__gtype__
+
+    def do_get_n_items(self) -> int:
+        return len(self._records)
+
+    def do_get_item(self, position: int) -> Optional[WorkedTime]:
+        if 0 <= position < len(self._records):
+            return self._materialize(self._records[position])
+        return None
+
+    def __len__(self):
+        return len(self._records)
+
+    def _materialize(self, record: WorkedTimeRecord) -> WorkedTime:
+        item = self._materialized.get(record.id)
+        if item is None:
+            item = WorkedTime.of_record(record)
+            item._store = self
+            self._materialized[record.id] = item
+        return item
+
+    @property
+    def _records(self) -> SortedRecords:
+        return self._index.records
+
+    def records(self) -> SortedRecords:
+        """The records of all worked times, sorted by start time. Don't modify them directly."""
+        self.ensure_loaded()
+        return self._records
+
+    def ensure_loaded(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> bool:
+        """
+        Loads the months that may hold worked time between `start_time` and `end_time` if they are not loaded yet.
 
-    def __init__(self, filename: str):
-        GObject.GObject.__init__(self)
-        Gio.ListStore.__init__(self, item_type=WorkedTime)
-        self._filename = filename
-        self._clients = set()
-        self._tasks = set()
-        self.clients = Gtk.ListStore(str)
-        self.tasks = Gtk.ListStore(str)
-
-        # Load from file
-        if os.path.exists(self._filename):
-            with open(self._filename, "r") as f:
-                for d in json.load(f):
-                    self.append(WorkedTime.fromdict(d), suppress_signals=True)
-        self._sort_by_start_time()  # just to be sure
-        self._refresh_tasks()
-        self._refresh_clients()
-
-        # Only start saving when new items are added after the initial load
-        self.connect("item-added", self.save)
-
-    def _sort_by_start_time(self):
-        def compare_start_times(a: WorkedTime, b: WorkedTime):
-            # Note: GLib.DateTime.compare() is not available in Python apparently
-            return a.start_time.to_unix() - b.start_time.to_unix()
-
-        self.sort(compare_start_times)
+        The newly loaded worked times are added to the store as a batch, so views are reset once.
+
+        :param start_time: In microseconds since the epoch, or None for no bound.
+        :param end_time: In microseconds since the epoch, or None for no bound.
+        :return: Whether any month was loaded.
+        """
+        keys = [
+            key for key in keys_overlapping(self._storage.months(), start_time, end_time)
+            if not self._storage.is_loaded(key)
+        ]
+        if not keys:
+            return False
+        with self.batch():
+            self._load_months(keys)
+        return True
+
+    def _ensure_month_loaded(self, key: str):
+        if not self._storage.is_loaded(key):
+            with self.batch():
+                self._load_months([key])
+
+    def _load_months(self, keys: Iterable[str]):
+        """Loads months into the running store, within a batch."""
+        loaded_records: List[WorkedTimeRecord] = []
+        for key in keys:
+            loaded = self._storage.load(key)
+            # The catalogs were built from what the storage knew about the month before it was loaded
+            for catalog, signal_name, corrections in (
+                    (self._task_catalog, "tasks-changed", loaded.task_corrections),
+                    (self._client_catalog, "clients-changed", loaded.client_corrections)):
+                for name, difference in corrections.items():
+                    if difference > 0 and catalog.add(name, difference):
+                        self._emit_catalog_changed(signal_name)
+                    elif difference < 0 and catalog.remove(name, -difference):
+                        self._emit_catalog_changed(signal_name)
+            loaded_records.extend(loaded.records)
+            self._rollups.merge(loaded.rollups)
+        if self._storage.needs_write:
+            self._write_scheduler.mark_dirty()
+        if not loaded_records:
+            return
+        self._before_batch_mutation()
+        # The index is rebuilt once for all the months; sorting a few runs of sorted records is close to linear
+        self._index = WorkedTimeIndex(list(self._records) + loaded_records)
+        # Period totals load the months they cover or have the storage count them, so loading changes no totals
+        for record in loaded_records:
+            if self._recent.add((record.task, record.client), record.start_time):
+                self._emit_catalog_changed("recent-changed")
 
     def get_subset(
             self,
             tasks: Optional[Set[str]] = None,
             clients: Optional[Set[str]] = None,
             start_time: Optional[GLib.DateTime] = None,
-            end_time: Optional[GLib.DateTime] = None) -> Gio.ListStore:
+            end_time: Optional[GLib.DateTime] = None) -> "WorkedTimeSubset":
+        """
+        Returns a live view of the worked times starting within [start_time, end_time] with the given tasks and clients.
 
-        list_store = Gio.ListStore(item_type=WorkedTime)
+        Call `dispose` on the subset once it is no longer needed, so the store stops updating it.
+        """
+        self.ensure_loaded(
+            start_time=None if start_time is None else unix_usec(start_time),
+            end_time=None if end_time is None else unix_usec(end_time))
+        subset = WorkedTimeSubset(
+            self,
+            tasks=tasks,
+            clients=clients,
+            start_time=None if start_time is None else unix_usec(start_time),
+            end_time=None if end_time is None else unix_usec(end_time),
+        )
+        self._views.add(subset)
+        return subset
 
-        def is_in_subset(wt: WorkedTime):
-            if start_time is not None and wt.start_time.to_unix() < start_time.to_unix():
-                return False
-            if end_time is not None and wt.start_time.to_unix() > end_time.to_unix():
-                return False
-            if tasks is not None and wt.task not in tasks:
-                return False
-            if clients is not None and wt.client not in clients:
-                return False
-            return True
+    def save(self, *_args):
+        """
+        Writes all pending changes and blocks until they are on disk.
 
-        for wt in self:
-            if is_in_subset(wt):
-                list_store.append(wt)
+        With JSON files, the journals of the loaded months with changes are folded into fresh snapshots.
+        With a database, the write-ahead log is folded into the database file.
 
-        def _on_item_added(_wt_store, added_item):
-            if is_in_subset(added_item):
-                list_store.append(added_item)
+        :raises Exception: If the changes could not be written. They are kept and writing them is retried.
+        """
+        self._compaction_requested = True
+        self._write_scheduler.flush()
+
+    def flush(self):
+        """
+        Blocks until all pending changes are journaled and synced to disk.
+
+        :raises Exception: If the changes could not be written. They are kept and writing them is retried.
+        """
+        self._write_scheduler.flush()
+        self._storage.sync()
 
-        def _on_item_removed(_wt_store, removed_item):
-            if is_in_subset(removed_item):
-                found, position = list_store.find(removed_item)
-                if found:
-                    list_store.remove(position)
-                else:
-                    logging.error(f"Could not find item {removed_item} in subset")
+    def close(self):
+        """
+        Writes all pending changes and closes the storage. The store must not be changed afterwards.
 
-        # TODO: if an item in the subset is changed, it should be removed if it no longer matches the subset
-        # TODO: if an item outside the subset is changed, it should be added if it now matches the subset
+        :raises Exception: If the changes could not be written, in which case they are lost.
+        """
+        try:
+            self._write_scheduler.flush()
+        finally:
+            self._storage.close()
+
+    def _prepare_write(self) -> Optional[WriteJob]:
+        operations = self._storage.prepare_write(compact=self._compaction_requested)
+        self._compaction_requested = False
+        if not operations:
+            return None
+
+        def write():
+            for operation in operations:
+                operation()
+        return write
+
+    def _write_failed(self, error: Exception):
+        self._storage.write_failed()
+        self.emit("write-failed", str(error))
+
+    def _record_changed(self, record: WorkedTimeRecord, field: str, old_value):
+        """Called by a materialized `WorkedTime` after one of the fields of its record was edited."""
+        old = dict(task=record.task, client=record.client, start_time=record.start_time, end_time=record.end_time)
+        old[field] = old_value
+        if self._batch_depth > 0:
+            if field == "start_time":
+                self._before_batch_mutation()
+            self._batch_edited.add(record)
+        positions = self._index.update(record, field, old_value)
+        if self._batch_depth == 0:
+            if positions is not None and positions[0] != positions[1]:
+                self.items_changed(positions[0], 1, 0)
+                self.items_changed(positions[1], 0, 1)
+            for view in list(self._views):
+                view._record_changed(record, field, old_value)
+        if field == "task" and self._task_catalog.replace(old_value, record.task):
+            self._emit_catalog_changed("tasks-changed")
+        elif field == "client" and self._client_catalog.replace(old_value, record.client):
+            self._emit_catalog_changed("clients-changed")
+        if self._recent.update(record, field, old_value):
+            self._emit_catalog_changed("recent-changed")
+        if field in ("task", "client", "start_time", "end_time"):
+            self._rollups.add(sign=-1, **old)
+            self._rollups.add_record(record)
+            self._rollups_changed([
+                (old["task"], old["client"], old["start_time"], old["end_time"], -1),
+                (record.task, record.client, record.start_time, record.end_time, 1),
+            ])
+
+        if field == "start_time":
+            # The month a worked time moves to is loaded first, so the storage never holds it twice
+            self._ensure_month_loaded(partition_key(record.start_time))
+        self._storage.update(record, old)
+        self._write_scheduler.mark_dirty()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups many inserts, removes and edits into one transaction.
 
-        self.connect("item-added", _on_item_added)
-        self.connect("item-removed", _on_item_removed)
+        Within the batch, views and subsets are not notified about the individual mutations.
+        When the outermost batch ends, the store emits a single items-changed for the range of positions that changed,
+        the open subsets are re-evaluated once, the catalog signals are emitted at most once each,
+        and the changes are saved together. A batch that changed nothing notifies nobody.
+        """
+        if self._batch_depth == 0:
+            self._batch_old_records = None
+            self._batch_edited = set()
+            self._batch_changed_catalogs = set()
+            self._batch_rollup_changes = []
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                old_records, self._batch_old_records = self._batch_old_records, None
+                edited, self._batch_edited = self._batch_edited, set()
+                changed = None if old_records is None else changed_range(old_records, self._records)
+                if changed is not None:
+                    self.items_changed(*changed)
+                if changed is not None or edited:
+                    for view in list(self._views):
+                        view._reset(edited)
+                for signal_name in sorted(self._batch_changed_catalogs):
+                    self.emit(signal_name)
+                if self._batch_rollup_changes:
+                    self.emit("rollups-changed", self._batch_rollup_changes)
+
+    def _before_batch_mutation(self):
+        """Remembers the order of the records before the first mutation in a batch, to tell what changed in the end."""
+        if self._batch_depth > 0 and self._batch_old_records is None:
+            self._batch_old_records = list(self._records)
+
+    def _emit_catalog_changed(self, signal_name: str):
+        if self._batch_depth > 0:
+            self._batch_changed_catalogs.add(signal_name)
+        else:
+            self.emit(signal_name)
 
-        return list_store
+    def _rollups_changed(self, changes: List[RollupChange]):
+        if self._batch_depth > 0:
+            self._batch_rollup_changes.extend(changes)
+        else:
+            self.emit("rollups-changed", changes)
+
+    def _adopt(self, item: WorkedTime) -> WorkedTimeRecord:
+        item._store = self
+        self._materialized[item.id] = item
+        return item.record
+
+    def _register(self, record: WorkedTimeRecord):
+        self._storage.add(record)
+        self._write_scheduler.mark_dirty()
+        if self._task_catalog.add(record.task):
+            self._emit_catalog_changed("tasks-changed")
+        if self._client_catalog.add(record.client):
+            self._emit_catalog_changed("clients-changed")
+        if self._recent.add((record.task, record.client), record.start_time):
+            self._emit_catalog_changed("recent-changed")
+        self._rollups.add_record(record)
+        self._rollups_changed([(record.task, record.client, record.start_time, record.end_time, 1)])
+
+    def _unregister(self, record: WorkedTimeRecord):
+        item = self._materialized.get(record.id)
+        if item is not None:
+            item._store = None
+        self._storage.remove(record)
+        self._write_scheduler.mark_dirty()
+        if self._task_catalog.remove(record.task):
+            self._emit_catalog_changed("tasks-changed")
+        if self._client_catalog.remove(record.client):
+            self._emit_catalog_changed("clients-changed")
+        if self._recent.remove((record.task, record.client), record.start_time):
+            self._emit_catalog_changed("recent-changed")
+        self._rollups.remove_record(record)
+        self._rollups_changed([(record.task, record.client, record.start_time, record.end_time, -1)])
+
+    def insert_sorted(self, item: WorkedTime) -> int:
+        """
+        Inserts `item` at the position given by its start time, after worked times with the same start time.
 
-    def save(self, *_args):
-        logging.info(f"Saving worked time store to {self._filename}")
-        with open(self._filename, "w") as f:
-            json.dump([wt.asdict() for wt in self], f, indent=2)
-
-    def insert(self, position: int, item: WorkedTime):
-        super().insert(position, item)
-        self._connect_item_to_signals(item)
-        self.emit("item-added", item)
-
-    def append(self, item: WorkedTime, suppress_signals: bool = False):
-        super().append(item)
-        self._connect_item_to_signals(item)
-        if not suppress_signals:
+        :return: The position of the inserted item.
+        """
+        record = self._adopt(item)
+        self._ensure_month_loaded(partition_key(record.start_time))
+        self._before_batch_mutation()
+        position = self._index.add(record)
+        self._register(record)
+        if self._batch_depth == 0:
+            self.items_changed(position, 0, 1)
+            for view in list(self._views):
+                view._record_added(record)
             self.emit("item-added", item)
+        return position
 
-    def insert_sorted(self, item: WorkedTime, compare_func: Callable[[WorkedTime, WorkedTime], int], *user_data):
-        raise NotImplementedError("Not implemented yet")
+    def append(self, item: WorkedTime) -> int:
+        """Adds `item` to the store. The store is sorted by start time, so this is the same as `insert_sorted`."""
+        return self.insert_sorted(item)
+
+    def splice(self, position: int, n_removals: int, additions: Sequence[WorkedTime]):
+        """
+        Removes `n_removals` worked times at `position` and adds `additions` (at their sorted positions),
+        as a single batch.
+        """
+        with self.batch():
+            self._before_batch_mutation()
+            records = self._records
+            removed = records[position:position + n_removals]
+            added = [self._adopt(item) for item in additions]
+            for key in sorted({partition_key(record.start_time) for record in added}):
+                self._ensure_month_loaded(key)
+            records = self._records
+            # Rebuilding the index is cheaper than updating it one record at a time for large splices
+            if len(removed) + len(added) > len(records) // 8:
+                # Loading a partition may have shifted the positions
+                removed_records = set(removed)
+                remaining = [record for record in records if record not in removed_records]
+                self._index = WorkedTimeIndex(remaining + added)
+            else:
+                for record in removed:
+                    self._index.remove(record)
+                for record in added:
+                    self._index.add(record)
+            for record in removed:
+                self._unregister(record)
+            for record in added:
+                self._register(record)
+
+    def find(self, item: WorkedTime) -> Tuple[bool, int]:
+        position = self._records.find(item.record)
+        return (False, 0) if position is None else (True, position)
 
     def remove_item(self, item: WorkedTime):
         found, position = self.find(item)
@@ -167,63 +547,187 @@ class WorkedTimeStore(Gio.ListStore):
             raise ValueError(f"Item not found: {item}")
 
     def remove(self, position: int):
-        item = self[position]
-        super().remove(position)
-        self.emit("item-removed", item)
+        record = self._records[position]
+        self._before_batch_mutation()
+        self._index.remove(record)
+        self._unregister(record)
+        if self._batch_depth == 0:
+            self.items_changed(position, 1, 0)
+            for view in list(self._views):
+                view._record_removed(record)
+            self.emit("item-removed", self._materialize(record))
 
     def remove_all(self):
-        for i in range(len(self)):
-            self.remove(0)
-
-    def _connect_item_to_signals(self, item: WorkedTime):
-        item.connect("notify::client", self._refresh_clients)
-        item.connect("notify::task", self._refresh_tasks)
-        # Save to disk when item was changed
-        item.connect("notify", self.save)
-
-    def _refresh_clients(self, *_args):
-        new_clients = {wt.client for wt in self}
-        if new_clients != self._clients:
-            added_clients = new_clients - self._clients
-            removed_clients = self._clients - new_clients
-            for client in added_clients:
-                self.clients.append([client])
-            for client in removed_clients:
-                for row in self.clients:
-                    if row[0] == client:
-                        self.clients.remove(row.iter)
-
-            self._clients = new_clients
-            self.emit("clients-changed")
-
-    def _refresh_tasks(self, *_args):
-        new_tasks = {wt.task for wt in self}
-        if new_tasks != self._tasks:
-            added_tasks = new_tasks - self._tasks
-            removed_tasks = self._tasks - new_tasks
-            for task in added_tasks:
-                self.tasks.append([task])
-            for task in removed_tasks:
-                for row in self.tasks:
-                    if row[0] == task:
-                        self.tasks.remove(row.iter)
-
-            self._tasks = new_tasks
-            self.emit("tasks-changed")
-
-    def most_recent_worked_tasks_and_clients(self, n: int) -> Generator[Tuple[str, str], None, None]:
-        """
-        Yields the most recent n task-client-tuples.
-        If a task-client-tuple is worked on multiple times, it is only yielded once.
-
-        :param n: The number of task-client-tuples to yield (at most)
-        :return: A generator yielding the most recent n task-client-tuples.
-        """
-        work_items = set()
-        for worked_time in reversed(self):
-            work_item = (worked_time.task, worked_time.client)
-            if work_item not in work_items:
-                work_items.add(work_item)
-                yield work_item
-            if len(work_items) >= n:
-                break
\ No newline at end of file
+        self.ensure_loaded()
+        self.splice(0, len(self._records), [])
+
+    def most_recent_worked_tasks_and_clients(self, n: int) -> List[WorkItem]:
+        """
+        Returns the most recent n task-client-tuples, most recent first.
+        If a task-client-tuple is worked on multiple times, it is only returned once.
+
+        :param n: The number of task-client-tuples to return (at most)
+        """
+        return self._recent.most_recent(n)
+
+    def period_totals(
+            self,
+            start_time: Optional[GLib.DateTime] = None,
+            end_time: Optional[GLib.DateTime] = None,
+            tasks: Optional[Set[str]] = None,
+            clients: Optional[Set[str]] = None) -> PeriodTotals:
+        """
+        Sums up the worked time between two local midnights from the daily rollups, without looking at the worked times.
+
+        Worked times crossing midnight only count with the part within the period, like in `wlr report`.
+
+        :param start_time: A local midnight, or None for no bound.
+        :param end_time: A local midnight (exclusive), or None for no bound.
+        """
+        start_day = None if start_time is None else _local_day_starting_at(start_time)
+        end_day = None if end_time is None else _local_day_starting_at(end_time)
+        start_usec = None if start_day is None else local_midnight(start_day)
+        end_usec = None if end_day is None else local_midnight(end_day)
+        unloaded = self._storage.unloaded_period_totals(start_usec, end_usec, tasks, clients)
+        if unloaded is None:
+            self.ensure_loaded(start_usec, None if end_usec is None else end_usec - 1)
+        totals = self._rollups.totals(start_day=start_day, end_day=end_day, tasks=tasks, clients=clients)
+        if unloaded is None:
+            return totals
+        for sums, unloaded_sums in ((totals.by_task, unloaded.by_task), (totals.by_client, unloaded.by_client)):
+            for name, duration in unloaded_sums.items():
+                sums[name] = sums.get(name, 0) + duration
+        return totals._replace(total=totals.total + unloaded.total)
+
+    def most_worked_tasks_and_clients(self, n: int, days: int = 30) -> List[WorkItem]:
+        """
+        Returns the n task-client-tuples with the most worked time in the last `days` days, most worked on first.
+        """
+        since = unix_usec(GLib.DateTime.new_now_local().add_days(-days))
+        self.ensure_loaded(start_time=since)
+        return [work_item for work_item, _ in top_work_items_by_time(self._index.query(start_time=since), n)]
+
+
+class WorkedTimeSubset(GObject.Object, Gio.ListModel):
+    """
+    A live view of the worked times in a store that match a filter, sorted by start time.
+
+    The subset follows additions, removals and edits in the store until `dispose` is called:
+    edited worked times enter or leave the subset when they start or stop matching the filter.
+    The subset and the store only hold weak references to each other.
+
+    Besides items-changed, the subset emits record-added, record-removed and record-changed with the affected record,
+    and reset when it was re-evaluated as a whole, so aggregates over it can be kept up to date incrementally.
+    """
+    record_added = GObject.Signal("record-added", arg_types=(GObject.TYPE_PYOBJECT,))
+    record_removed = GObject.Signal("record-removed", arg_types=(GObject.TYPE_PYOBJECT,))
+    record_changed = GObject.Signal("record-changed", arg_types=(GObject.TYPE_PYOBJECT,))
+    reset = GObject.Signal("reset")
+
+    def __init__(
+            self,
+            store: WorkedTimeStore,
+            tasks: Optional[Set[str]],
+            clients: Optional[Set[str]],
+            start_time: Optional[int],
+            end_time: Optional[int]):
+        GObject.Object.__init__(self)
+        self._store_ref = weakref.ref(store)
+        self._tasks = tasks
+        self._clients = clients
+        self._start_time = start_time
+        self._end_time = end_time
+        self._records = SortedRecords(store._index.query(start_time, end_time, tasks, clients))
+        self._members: Set[WorkedTimeRecord] = set(self._records)
+
+    def matches(self, record: WorkedTimeRecord) -> bool:
+        return (
+            (self._start_time is None or record.start_time >= self._start_time)
+            and (self._end_time is None or record.start_time <= self._end_time)
+            and (self._tasks is None or record.task in self._tasks)
+            and (self._clients is None or record.client in self._clients)
+        )
+
+    def do_get_item_type(self):
+        return WorkedTime.__gtype__
+
+    def do_get_n_items(self) -> int:
+        return len(self._records)
+
+    def do_get_item(self, position: int) -> Optional[WorkedTime]:
+        store = self._store_ref()
+        if store is None or not 0 <= position < len(self._records):
+            return None
+        return store._materialize(self._records[position])
+
+    def __len__(self):
+        return len(self._records)
+
+    def records(self) -> SortedRecords:
+        """The records in the subset, sorted by start time. Don't modify them directly."""
+        return self._records
+
+    def dispose(self):
+        """Detaches the subset from its store and empties it."""
+        store = self._store_ref()
+        if store is not None:
+            store._views.discard(self)
+        n_items = len(self._records)
+        self._records = SortedRecords()
+        self._members.clear()
+        if n_items > 0:
+            self.items_changed(0, n_items, 0)
+            self.emit("reset")
+
+    def _reset(self, edited: Set[WorkedTimeRecord]):
+        """
+        Re-evaluates the subset after a batch of changes in the store.
+
+        Only the range of positions that changed is reported with items-changed. Reset is emitted if anything in
+        the subset changed, including edits of worked times that stayed in place.
+
+        :param edited: The worked times edited in the batch.
+        """
+        store = self._store_ref()
+        if store is None:
+            return
+        records = SortedRecords(store._index.query(self._start_time, self._end_time, self._tasks, self._clients))
+        changed = changed_range(self._records, records)
+        self._records = records
+        if changed is None and self._members.isdisjoint(edited):
+            return
+        self._members = set(records)
+        if changed is not None:
+            self.items_changed(*changed)
+        self.emit("reset")
+
+    def _record_added(self, record: WorkedTimeRecord):
+        if self.matches(record):
+            self._members.add(record)
+            self.items_changed(self._records.insert(record), 0, 1)
+            self.emit("record-added", record)
+
+    def _record_removed(self, record: WorkedTimeRecord, start_time: Optional[int] = None):
+        if record in self._members:
+            self._members.discard(record)
+            self.items_changed(self._records.remove(record, start_time), 1, 0)
+            self.emit("record-removed", record)
+
+    def _record_changed(self, record: WorkedTimeRecord, field: str, old_value):
+        old_start_time = old_value if field == "start_time" else None
+        was_member = record in self._members
+        is_member = self.matches(record)
+        if was_member and not is_member:
+            self._record_removed(record, old_start_time)
+        elif is_member and not was_member:
+            self._record_added(record)
+        elif is_member and field == "start_time":
+            # Only move the item if its neighbours change, so the row being edited stays in place otherwise
+            old_position = self._records.remove(record, old_start_time)
+            new_position = self._records.insert(record)
+            if new_position != old_position:
+                self.items_changed(old_position, 1, 0)
+                self.items_changed(new_position, 0, 1)
+            self.emit("record-changed", record)
+        elif is_member:
+            self.emit("record-changed", record)
@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+from typing import Callable, Optional
+
+from gi.repository import GLib
+
+# A write job is prepared on the main loop and then executed in the background writer thread
+WriteJob = Callable[[], None]
+
+# The wait before retrying a failed write, which doubles with every failure in a row up to the maximum
+MIN_RETRY_DELAY_MS = 1000
+MAX_RETRY_DELAY_MS = 60_000
+
+
+class WriteScheduler:
+    """
+    Coalesces dirty marks and performs the resulting writes off the GTK main loop.
+
+    Call `mark_dirty` whenever the state changed.
+    The first mark opens a window of `delay_ms` milliseconds, and all marks within that window result in a single write.
+    When the window closes, `prepare_write` is called on the main loop to capture the state (GObjects must not be
+    touched from other threads) and returns a job that serializes and writes it in the background writer thread.
+    `prepare_write` may return None if there turns out to be nothing to write.
+
+    If a write fails, `write_failed` is called on the main loop with the error, so the owner can queue what was lost
+    again and tell the user. The write is then retried, waiting twice as long after every failure in a row
+    (up to MAX_RETRY_DELAY_MS).
+    """
+
+    def __init__(
+            self,
+            prepare_write: Callable[[], Optional[WriteJob]],
+            delay_ms: int = 1000,
+            write_failed: Optional[Callable[[Exception], None]] = None):
+        self._prepare_write = prepare_write
+        self._delay_ms = delay_ms
+        self._write_failed = write_failed
+        self._timeout_id: Optional[int] = None
+        # The wait before the next retry, 0 while the writes succeed
+        self._retry_delay_ms = 0
+        # The error of the last write, set by the writer thread, so `flush` can raise it
+        self._last_error: Optional[Exception] = None
+
+    def mark_dirty(self):
+        if self._timeout_id is None:
+            self._timeout_id = GLib.timeout_add(max(self._delay_ms, self._retry_delay_ms), self._on_timeout)
+
+    def _on_timeout(self) -> bool:
+        self._timeout_id = None
+        self._submit()
+        return False
+
+    def _submit(self) -> Optional[threading.Event]:
+        job = self._prepare_write()
+        if job is not None:
+            return _writer.submit(job, self._on_job_done)
+        return None
+
+    def _on_job_done(self, error: Optional[Exception]):
+        # Called in the writer thread
+        self._last_error = error
+        GLib.idle_add(self._on_write_done, error)
+
+    def _on_write_done(self, error: Optional[Exception]) -> bool:
+        if error is None:
+            self._retry_delay_ms = 0
+            return False
+        self._retry_delay_ms = min(max(2 * self._retry_delay_ms, MIN_RETRY_DELAY_MS), MAX_RETRY_DELAY_MS)
+        if self._write_failed is not None:
+            self._write_failed(error)
+        # The retry waits at least as long as the backoff, even if a write was scheduled already
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+        self.mark_dirty()
+        return False
+
+    def flush(self):
+        """
+        Writes any pending changes and blocks until all previously submitted writes are done.
+
+        The main loop may not run anymore to report a failure (e.g. during shutdown), so the caller gets the error too.
+
+        :raises Exception: The error of the last write, if it failed.
+        """
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+        done = self._submit()
+        if done is None:
+            done = _writer.submit(lambda: None)
+        done.wait()
+        if self._last_error is not None:
+            raise self._last_error
+
+
+class _BackgroundWriter:
+    """A single daemon thread executing write jobs in the order they were submitted."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, job: WriteJob, on_done: Optional[Callable[[Optional[Exception]], None]] = None) -> threading.Event:
+        """
+        Queues a job.
+
+        :param on_done: Called in the writer thread once the job is done, with the error if it failed, otherwise None.
+        :return: An event that is set once the job is done.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="wlr-writer", daemon=True)
+                self._thread.start()
+        done = threading.Event()
+        self._jobs.put((job, on_done, done))
+        return done
+
+    def _run(self):
+        while True:
+            job, on_done, done = self._jobs.get()
+            error = None
+            try:
+                job()
+            except Exception as e:
+                logging.exception("Background write failed")
+                error = e
+            finally:
+                if on_done is not None:
+                    on_done(error)
+                done.set()
+
+
+_writer = _BackgroundWriter()
@@ -0,0 +1,25 @@
+import os
+import time
+
+import pytest
+
+from wage_labor_record.rollups import local_midnight
+
+
+def _set_timezone(tz):
+    if tz is None:
+        os.environ.pop("TZ", None)
+    else:
+        os.environ["TZ"] = tz
+    time.tzset()
+    # The midnights depend on the time zone
+    local_midnight.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def berlin_time():
+    """Runs every test in a time zone with daylight saving time, where the days of the switches have 23 and 25 hours."""
+    old_tz = os.environ.get("TZ")
+    _set_timezone("Europe/Berlin")
+    yield
+    _set_timezone(old_tz)
@@ -0,0 +1,43 @@
+import random
+from datetime import datetime
+from typing import List
+
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+HOUR = 3600 * 1_000_000
+
+
+def usec(*args) -> int:
+    """The local time given like to `datetime` in microseconds since the epoch."""
+    return int(datetime(*args).timestamp()) * 1_000_000
+
+
+def random_records(
+        n: int,
+        start_time: int,
+        span: int,
+        seed: int = 0,
+        max_duration: int = 10 * HOUR) -> List[WorkedTimeRecord]:
+    """`n` worked times starting within `span` microseconds after `start_time`, on a few tasks and clients."""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        start = start_time + rng.randrange(span)
+        records.append(WorkedTimeRecord(
+            rng.choice(("Coding", "Meetings", "Review")),
+            rng.choice(("ACME", "Initech", "")),
+            start,
+            start + rng.randrange(max_duration)))
+    return records
+
+
+def legacy_history(directory, records: List[WorkedTimeRecord]):
+    """A history as written before it was partitioned: one snapshot and its journal, with the last five records."""
+    history_path = directory / "worked_times.json"
+    journal = WorkedTimeJournal(history_path)
+    journal.compact(record.asdict() for record in records[:-5])
+    for record in records[-5:]:
+        journal.add(record.asdict())
+    journal.close()
+    return history_path
@@ -0,0 +1,49 @@
+from wage_labor_record.activity_recorder import ActivityRecorder, subtract_periods
+
+SECOND = 1_000_000
+MINUTE = 60 * SECOND
+
+
+def _idle(recorder, since, until, poll_interval=MINUTE):
+    """Records the polls of a user that is idle from `since` until `until`."""
+    for timestamp in range(since + poll_interval, until + 1, poll_interval):
+        recorder.record(timestamp, timestamp - since)
+
+
+def test_polls_of_one_idle_period_are_collapsed():
+    recorder = ActivityRecorder(capacity=8)
+    _idle(recorder, 0, 30 * MINUTE)
+    _idle(recorder, 40 * MINUTE, 50 * MINUTE)
+    assert list(recorder.samples()) == [(30 * MINUTE, 30 * MINUTE), (50 * MINUTE, 10 * MINUTE)]
+
+
+def test_only_discarded_idle_periods_are_cut_out():
+    recorder = ActivityRecorder()
+    _idle(recorder, 10 * MINUTE, 30 * MINUTE)
+    _idle(recorder, 40 * MINUTE, 60 * MINUTE)
+    # The user is back and short idle times are polled while the dialog is open
+    recorder.record(60 * MINUTE + 5 * SECOND, 2 * SECOND)
+    assert recorder.idle_periods(0, 90 * MINUTE, discarded_only=True) == []
+
+    recorder.discard(40 * MINUTE + SECOND // 2)
+    assert recorder.idle_periods(0, 90 * MINUTE) == [
+        (10 * MINUTE, 30 * MINUTE), (40 * MINUTE, 60 * MINUTE), (60 * MINUTE + 3 * SECOND, 60 * MINUTE + 5 * SECOND)]
+    discarded = recorder.idle_periods(0, 90 * MINUTE, discarded_only=True)
+    assert discarded == [(40 * MINUTE, 60 * MINUTE)]
+    assert subtract_periods(0, 90 * MINUTE, discarded) == [(0, 40 * MINUTE), (60 * MINUTE, 90 * MINUTE)]
+
+
+def test_overwritten_samples_are_no_longer_discarded():
+    recorder = ActivityRecorder(capacity=2)
+    _idle(recorder, 0, 20 * MINUTE)
+    recorder.discard(0)
+    _idle(recorder, 30 * MINUTE, 40 * MINUTE)
+    _idle(recorder, 50 * MINUTE, 60 * MINUTE)
+    assert recorder.idle_periods(discarded_only=True) == []
+
+
+def test_subtract_periods():
+    assert subtract_periods(0, 10, []) == [(0, 10)]
+    assert subtract_periods(0, 10, [(-5, 2), (4, 6), (8, 20)]) == [(2, 4), (6, 8)]
+    assert subtract_periods(0, 10, [(-5, 20)]) == []
+    assert subtract_periods(10, 10, []) == []
@@ -0,0 +1,60 @@
+import itertools
+from datetime import date
+
+import pytest
+
+from wage_labor_record.export import csv_lines, group, round_durations, select
+from wage_labor_record.worked_time_history import migrate_to_partitions, migrate_to_sqlite, read_history_records
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+from tests.helpers import HOUR, legacy_history, random_records, usec
+
+MINUTE = 60 * 1_000_000
+
+
+def _endless_records(start_time: int):
+    """An hour of coding every day from `start_time` on, without end."""
+    for day in itertools.count():
+        start = start_time + day * 24 * HOUR
+        yield WorkedTimeRecord("Coding", "ACME", start, start + HOUR)
+
+
+def test_selection_stops_reading_after_its_end():
+    selected = select(_endless_records(usec(2024, 1, 1, 9)), usec(2024, 1, 3), usec(2024, 1, 5))
+    assert [record.start_time for record in selected] == [usec(2024, 1, day, 9) for day in (3, 4)]
+
+
+def test_stages_pass_on_one_worked_time_at_a_time():
+    lines = csv_lines(round_durations(select(_endless_records(usec(2024, 1, 1, 9))), 15 * MINUTE))
+    assert next(lines).startswith("client,task,start_time,end_time")
+    assert len(list(itertools.islice(lines, 1000))) == 1000
+
+
+@pytest.mark.parametrize("mode, minutes", [("up", 30), ("nearest", 15), ("down", 15)])
+def test_rounding_moves_the_end_time(mode, minutes):
+    start_time = usec(2024, 1, 1, 9)
+    record = WorkedTimeRecord("Coding", "ACME", start_time, start_time + 22 * MINUTE)
+    (rounded,) = round_durations([record], 15 * MINUTE, mode)
+    assert (rounded.id, rounded.start_time, rounded.end_time) == (record.id, start_time, start_time + minutes * MINUTE)
+    assert record.end_time == start_time + 22 * MINUTE
+
+
+def test_group_sums_by_the_period_worked_times_start_in():
+    records = [
+        WorkedTimeRecord("Coding", "ACME", usec(2024, 1, 31, 23), usec(2024, 2, 1, 1)),
+        WorkedTimeRecord("Review", "ACME", usec(2024, 2, 1, 9), usec(2024, 2, 1, 10)),
+        WorkedTimeRecord("Coding", "ACME", usec(2024, 2, 2, 9), usec(2024, 2, 2, 11)),
+    ]
+    assert [(total.period, total.duration) for total in group(records, "month", ("client",))] == [
+        (date(2024, 1, 1), 2 * HOUR), (date(2024, 2, 1), 3 * HOUR)]
+    with pytest.raises(ValueError):
+        list(group(reversed(records), "day"))
+
+
+def test_history_is_streamed_in_start_time_order(tmp_path):
+    records = random_records(300, usec(2023, 11, 1), 120 * 24 * HOUR)
+    history_path = legacy_history(tmp_path, records)
+    for migrate in (migrate_to_partitions, migrate_to_sqlite):
+        migrate(history_path)
+        start_times = [record.start_time for record in read_history_records(history_path)]
+        assert start_times == sorted(record.start_time for record in records)
@@ -0,0 +1,171 @@
+import pytest
+
+from wage_labor_record.activity_recorder import ActivityRecorder
+from wage_labor_record.idle_monitor import ACTIVE_POLL_INTERVAL, REARM_POLL_INTERVAL, IdleMonitor
+from wage_labor_record.idle_sources import FakeIdleSource
+
+
+class CountingIdleSource(FakeIdleSource):
+    def __init__(self):
+        super().__init__()
+        self.polls = 0
+
+    def get_idle_time(self) -> float:
+        self.polls += 1
+        return super().get_idle_time()
+
+
+class FakeMainLoop:
+    """A clock and a timer that only move on when told to. The idle time of the source grows with the clock."""
+
+    def __init__(self, idle_source: FakeIdleSource):
+        self.idle_source = idle_source
+        self.now = 1000.0
+        self._timeouts = dict()
+        self._next_timeout_id = 1
+
+    def clock(self) -> float:
+        return self.now
+
+    def add(self, delay, callback) -> int:
+        timeout_id = self._next_timeout_id
+        self._next_timeout_id += 1
+        self._timeouts[timeout_id] = (self.now + delay, callback)
+        return timeout_id
+
+    def remove(self, timeout_id: int):
+        del self._timeouts[timeout_id]
+
+    @property
+    def next_delay(self):
+        """Seconds until the next timeout, or None if nothing is scheduled."""
+        if not self._timeouts:
+            return None
+        return min(due for due, _ in self._timeouts.values()) - self.now
+
+    def run(self, seconds: float):
+        """Lets `seconds` pass, running the timeouts that are due on the way."""
+        end = self.now + seconds
+        while self._timeouts:
+            timeout_id, (due, callback) = min(self._timeouts.items(), key=lambda item: item[1][0])
+            if due > end:
+                break
+            self._tick(due)
+            del self._timeouts[timeout_id]
+            callback()
+        self._tick(end)
+
+    def _tick(self, now: float):
+        self.idle_source.idle_time += now - self.now
+        self.now = now
+
+
+@pytest.fixture
+def source():
+    return CountingIdleSource()
+
+
+@pytest.fixture
+def loop(source):
+    return FakeMainLoop(source)
+
+
+@pytest.fixture
+def monitor(source, loop):
+    return IdleMonitor(source, clock=loop.clock, timer=loop)
+
+
+def test_nothing_is_polled_without_watches(source, loop, monitor):
+    monitor.poll()
+    loop.run(3600)
+    assert source.polls == 0
+    assert loop.next_delay is None
+
+
+def test_sleeps_until_the_threshold_can_be_reached(source, loop, monitor):
+    fired = []
+    source.idle_time = 100
+    watch_id = monitor.add_idle_watch(300, fired.append)
+    assert loop.next_delay == 200
+
+    loop.run(199)
+    assert fired == []
+    assert source.polls == 1
+    loop.run(1)
+    assert fired == [watch_id]
+    assert source.polls == 2
+    # The watch fired, so only a slow poll for the user coming back is left
+    assert loop.next_delay == REARM_POLL_INTERVAL
+
+
+def test_activity_postpones_the_next_poll(source, loop, monitor):
+    fired = []
+    monitor.add_idle_watch(300, fired.append)
+    loop.run(150)
+    source.idle_time = 0
+    loop.run(150)
+    assert fired == []
+    assert source.polls == 2
+    # Idle for 150 seconds at the last poll, so the threshold can't be reached any earlier
+    assert loop.next_delay == 150
+    loop.run(150)
+    assert len(fired) == 1
+
+
+def test_fired_watch_is_rearmed_once_the_user_is_back(source, loop, monitor):
+    fired = []
+    monitor.add_idle_watch(300, fired.append)
+    loop.run(300 + 10 * REARM_POLL_INTERVAL)
+    assert len(fired) == 1
+
+    source.idle_time = 0
+    loop.run(REARM_POLL_INTERVAL)
+    assert len(fired) == 1
+    loop.run(300)
+    assert len(fired) == 2
+
+
+def test_active_watch_fires_once_when_the_user_is_back(source, loop, monitor):
+    source.idle_time = 600
+    back = []
+    watch_id = monitor.add_active_watch(back.append)
+    loop.run(5 * ACTIVE_POLL_INTERVAL)
+    assert back == []
+    assert source.polls == 6
+
+    source.idle_time = 0
+    loop.run(ACTIVE_POLL_INTERVAL)
+    assert back == [watch_id]
+    assert loop.next_delay is None
+
+
+def test_removing_the_last_watch_stops_polling(source, loop, monitor):
+    watch_id = monitor.add_idle_watch(300, lambda _watch_id: None)
+    monitor.remove_watch(watch_id)
+    assert loop.next_delay is None
+    loop.run(3600)
+    assert source.polls == 1
+
+
+def test_callbacks_may_remove_their_watch(source, loop, monitor):
+    fired = []
+
+    def on_idle(watch_id):
+        fired.append(watch_id)
+        monitor.remove_watch(watch_id)
+    monitor.add_idle_watch(300, on_idle)
+    other_id = monitor.add_idle_watch(300, fired.append)
+    loop.run(300)
+    assert len(fired) == 2
+    source.idle_time = 0
+    loop.run(REARM_POLL_INTERVAL + 300)
+    assert fired[2:] == [other_id]
+
+
+def test_polled_idle_times_are_recorded(source, loop):
+    recorder = ActivityRecorder(capacity=8)
+    monitor = IdleMonitor(source, recorder, clock=loop.clock, timer=loop)
+    source.idle_time = 100
+    monitor.add_idle_watch(300, lambda _watch_id: None)
+    loop.run(200)
+    assert [idle_time for _, idle_time in recorder.samples()][-1] == 300 * 1_000_000
@@ -0,0 +1,49 @@
+import pytest
+
+from wage_labor_record import idle_sources
+from wage_labor_record.idle_sources import FakeIdleSource, IdleSource, create_idle_source
+
+
+def _source_type(name, available, created):
+    class Source(IdleSource):
+        @classmethod
+        def create(cls):
+            created.append(name)
+            return cls() if available else None
+    Source.name = name
+    return Source
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """Replaces the idle sources of the system by three fakes, of which the first is not available."""
+    created = []
+    monkeypatch.delenv("WLR_IDLE_SOURCE", raising=False)
+    monkeypatch.setattr(idle_sources, "IDLE_SOURCES", [
+        _source_type("a", False, created), _source_type("b", True, created), _source_type("c", True, created)])
+    return created
+
+
+def test_first_available_source_is_used(created):
+    assert create_idle_source().name == "b"
+    assert created == ["a", "b"]
+
+
+def test_source_can_be_chosen_by_name(created):
+    assert create_idle_source("c").name == "c"
+    assert created == ["c"]
+
+
+def test_without_an_available_source_the_user_is_never_idle(created):
+    source = create_idle_source("a")
+    assert type(source) is IdleSource
+    assert source.get_idle_time() == 0
+
+
+def test_fake_source_is_chosen_by_the_environment(created, monkeypatch):
+    monkeypatch.setenv("WLR_IDLE_SOURCE", "fake")
+    source = create_idle_source()
+    assert isinstance(source, FakeIdleSource)
+    assert created == []
+    source.idle_time = 42.5
+    assert source.get_idle_time() == 42.5
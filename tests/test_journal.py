@@ -0,0 +1,101 @@
+import json
+import time
+
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+from tests.helpers import HOUR, usec
+
+
+def _record(task: str, hour: int) -> WorkedTimeRecord:
+    start_time = usec(2024, 5, 6, hour)
+    return WorkedTimeRecord(task, "ACME", start_time, start_time + HOUR)
+
+
+def test_replay_applies_adds_updates_and_removes(tmp_path):
+    path = tmp_path / "worked_times.json"
+    a, b, c = _record("a", 8), _record("b", 10), _record("c", 12)
+    journal = WorkedTimeJournal(path)
+    journal.load()
+    for record in (a, b, c):
+        journal.add(record.asdict())
+    b.task = "b2"
+    journal.update(b.asdict())
+    journal.remove(a.id)
+    journal.close()
+
+    reloaded = WorkedTimeJournal(path)
+    records = [WorkedTimeRecord.fromdict(d) for d in reloaded.load()]
+    assert [(r.id, r.task) for r in records] == [(b.id, "b2"), (c.id, "c")]
+    assert reloaded.length == 5
+    assert not reloaded.needs_compaction
+
+
+def test_replay_skips_a_torn_last_line(tmp_path):
+    path = tmp_path / "worked_times.json"
+    a = _record("a", 8)
+    journal = WorkedTimeJournal(path)
+    journal.load()
+    journal.add(a.asdict())
+    journal.close()
+    with open(path.with_suffix(".journal"), "a") as f:
+        f.write('{"op": "add", "id": "torn')
+
+    reloaded = WorkedTimeJournal(path)
+    assert [d["id"] for d in reloaded.load()] == [a.id]
+    # Nothing may be appended after the torn line before the journal is compacted
+    assert reloaded.needs_compaction
+
+
+def test_compaction_writes_the_snapshot_and_truncates_the_journal(tmp_path):
+    path = tmp_path / "worked_times.json"
+    records = [_record(str(hour), hour) for hour in range(8, 12)]
+    journal = WorkedTimeJournal(path, compaction_threshold=3)
+    journal.load()
+    for record in records:
+        journal.add(record.asdict())
+    assert journal.needs_compaction
+
+    journal.compact(record.asdict() for record in records)
+    assert journal.length == 0
+    assert not journal.needs_compaction
+    assert path.with_suffix(".journal").read_text() == ""
+    assert [d["id"] for d in json.loads(path.read_text())] == [record.id for record in records]
+
+    # Entries journaled after the compaction are replayed on top of the new snapshot
+    journal.remove(records[0].id)
+    journal.close()
+    assert [d["id"] for d in WorkedTimeJournal(path).load()] == [record.id for record in records[1:]]
+
+
+def test_snapshot_without_ids_gets_ids_and_needs_compaction(tmp_path):
+    path = tmp_path / "worked_times.json"
+    legacy = _record("a", 8).asdict()
+    del legacy["id"]
+    path.write_text(json.dumps([legacy]))
+
+    journal = WorkedTimeJournal(path)
+    loaded = journal.load()
+    assert loaded[0]["id"]
+    assert journal.needs_compaction
+
+
+def test_batched_fsync_has_a_deadline(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("os.fsync", lambda fd: synced.append(time.monotonic()))
+    journal = WorkedTimeJournal(tmp_path / "worked_times.json", fsync_interval=0.2)
+    journal.load()
+    journal.add(_record("a", 8).asdict())
+    assert len(synced) == 1
+    written = time.monotonic()
+    journal.add(_record("b", 10).asdict())
+    journal.add(_record("c", 12).asdict())
+    assert len(synced) == 1
+    # Nothing else is written, but the two batched appends are synced anyway
+    deadline = time.monotonic() + 5
+    while len(synced) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(synced) == 2
+    assert synced[1] - written < 1
+    journal.close()
+    assert len(synced) == 2
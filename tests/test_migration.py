@@ -0,0 +1,64 @@
+from wage_labor_record import sqlite_history
+from wage_labor_record.partitions import Manifest, partition_directory, partition_key
+from wage_labor_record.worked_time_history import (
+    history_backend, migrate_to_json, migrate_to_partitions, migrate_to_sqlite, read_history_records)
+
+from tests.helpers import HOUR, legacy_history, random_records, usec
+
+
+def _rows(records):
+    return sorted(record.asrow() for record in records)
+
+
+def test_legacy_history_is_split_by_month(tmp_path):
+    records = random_records(300, usec(2023, 11, 1), 120 * 24 * HOUR)
+    history_path = legacy_history(tmp_path, records)
+
+    assert migrate_to_partitions(history_path)
+    assert not migrate_to_partitions(history_path)
+    assert not history_path.exists()
+    assert history_path.with_name("worked_times.json.migrated").exists()
+    manifest = Manifest.load(partition_directory(history_path))
+    assert sorted(manifest.partitions) == sorted({partition_key(record.start_time) for record in records})
+    assert sum(summary.count for summary in manifest.partitions.values()) == len(records)
+    assert _rows(read_history_records(history_path)) == _rows(records)
+
+
+def test_json_sqlite_round_trip(tmp_path):
+    records = random_records(300, usec(2023, 11, 1), 120 * 24 * HOUR)
+    history_path = legacy_history(tmp_path, records)
+
+    assert migrate_to_sqlite(history_path)
+    assert history_backend(history_path) == "sqlite"
+    assert not partition_directory(history_path).exists()
+    assert _rows(read_history_records(history_path)) == _rows(records)
+
+    assert migrate_to_json(history_path)
+    assert history_backend(history_path) == "json"
+    database_path = sqlite_history.sqlite_path(history_path)
+    assert not database_path.exists()
+    assert not any(path.exists() for path in sqlite_history.sidecar_paths(database_path))
+    assert _rows(read_history_records(history_path)) == _rows(records)
+
+    # Going back does not replace what the first migration set aside
+    assert migrate_to_sqlite(history_path)
+    assert partition_directory(history_path).with_name("worked_times.migrated.2").exists()
+    assert _rows(read_history_records(history_path)) == _rows(records)
+
+
+def test_write_ahead_log_is_set_aside_with_the_database(tmp_path):
+    records = random_records(50, usec(2024, 1, 1), 30 * 24 * HOUR)
+    history_path = legacy_history(tmp_path, records)
+    migrate_to_sqlite(history_path)
+    database_path = sqlite_history.sqlite_path(history_path)
+    # A connection that is still open keeps the write-ahead log around
+    connection = sqlite_history.connect(database_path)
+    try:
+        sqlite_history.write_changes(connection, [("remove", records[0].asrow())])
+        assert all(path.exists() for path in sqlite_history.sidecar_paths(database_path))
+
+        assert migrate_to_json(history_path)
+    finally:
+        connection.close()
+    assert not any(path.exists() for path in sqlite_history.sidecar_paths(database_path))
+    assert _rows(read_history_records(history_path)) == _rows(records[1:])
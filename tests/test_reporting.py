@@ -0,0 +1,94 @@
+from datetime import date
+
+import pytest
+
+from wage_labor_record.reporting import (
+    ReportColumns, duration_histogram, duration_percentiles, grouped_sums, grouped_sums_from_rollups, has_numpy)
+from wage_labor_record.rollups import DailyRollups, local_day, local_midnight
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+from tests.helpers import HOUR, random_records, usec
+
+SPRING_FORWARD = date(2024, 3, 31)
+FALL_BACK = date(2024, 10, 27)
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(not has_numpy(), reason="NumPy is not installed"))]
+
+
+def _brute_force(records, keys, start_time=None, end_time=None):
+    """Walks through the worked times piece by piece, ending the pieces at every full hour since local midnight."""
+    sums = dict()
+    for record in records:
+        start = record.start_time if start_time is None else max(record.start_time, start_time)
+        end = record.end_time if end_time is None else min(record.end_time, end_time)
+        while start < end:
+            day = local_day(start)
+            midnight = local_midnight(day)
+            hour = (start - midnight) // HOUR
+            piece_end = min(end, midnight + (hour + 1) * HOUR, local_midnight(day + 1))
+            d = date.fromordinal(day)
+            values = dict(
+                task=record.task, client=record.client, day=d, week=date.fromordinal(day - d.weekday()),
+                month=d.replace(day=1), weekday=d.weekday(), hour=hour)
+            key = tuple(values[name] for name in keys)
+            sums[key] = sums.get(key, 0) + piece_end - start
+            start = piece_end
+    return dict(sorted(sums.items()))
+
+
+def _dst_records():
+    records = []
+    for day in (SPRING_FORWARD, FALL_BACK):
+        first_midnight = local_midnight(day.toordinal() - 1)
+        records.extend(random_records(300, first_midnight, 3 * 24 * HOUR, seed=day.month, max_duration=30 * HOUR))
+    return records
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+@pytest.mark.parametrize("keys", [
+    ("day",), ("hour",), ("day", "hour"), ("weekday", "hour", "task"), ("client", "week"), ("month", "task"), ()])
+def test_grouped_sums_match_brute_force_around_dst(use_numpy, keys):
+    records = _dst_records()
+    assert grouped_sums(ReportColumns.from_records(records), keys, use_numpy=use_numpy) == _brute_force(records, keys)
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_dst_days_have_23_and_25_hours(use_numpy):
+    # A worked time over the whole of each of the two days
+    records = [
+        WorkedTimeRecord("Coding", "ACME", local_midnight(day.toordinal()), local_midnight(day.toordinal() + 1))
+        for day in (SPRING_FORWARD, FALL_BACK)
+    ]
+    sums = grouped_sums(ReportColumns.from_records(records), ("day", "hour"), use_numpy=use_numpy)
+    assert [hour for day, hour in sums if day == SPRING_FORWARD] == list(range(23))
+    assert [hour for day, hour in sums if day == FALL_BACK] == list(range(25))
+    assert set(sums.values()) == {HOUR}
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_period_and_filters_clip_the_worked_times(use_numpy):
+    records = _dst_records()
+    start_time, end_time = usec(2024, 3, 30, 18, 30), usec(2024, 3, 31, 5, 15)
+    columns = ReportColumns.from_records(records)
+    sums = grouped_sums(columns, ("hour", "task"), start_time, end_time, tasks={"Coding"}, use_numpy=use_numpy)
+    coding = [record for record in records if record.task == "Coding"]
+    expected = _brute_force(coding, ("hour", "task"), start_time, end_time)
+    assert sums == expected
+
+
+def test_backends_agree_on_durations():
+    if not has_numpy():
+        pytest.skip("NumPy is not installed")
+    columns = ReportColumns.from_records(_dst_records())
+    edges = [0, HOUR, 4 * HOUR, 8 * HOUR, 30 * HOUR]
+    assert duration_histogram(columns, edges, use_numpy=False) == duration_histogram(columns, edges, use_numpy=True)
+    assert duration_percentiles(columns, (0, 50, 99.5, 100), use_numpy=False) == pytest.approx(
+        duration_percentiles(columns, (0, 50, 99.5, 100), use_numpy=True))
+
+
+def test_rollups_give_the_same_daily_sums():
+    records = _dst_records()
+    buckets = list(DailyRollups(records).buckets())
+    for keys in (("day", "task"), ("week",), ("month", "client"), ("weekday",)):
+        assert grouped_sums_from_rollups(buckets, keys) == grouped_sums(
+            ReportColumns.from_records(records), keys, use_numpy=False)
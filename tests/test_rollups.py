@@ -0,0 +1,110 @@
+import random
+from datetime import date
+
+import pytest
+
+from wage_labor_record import sqlite_history
+from wage_labor_record.partitions import partition_key
+from wage_labor_record.rollups import DailyRollups, local_day, local_midnight, split_by_local_day
+from wage_labor_record.storage import open_storage
+
+from tests.helpers import HOUR, random_records, usec
+
+# Around the switch to summer time (March 31st) and back (October 27th)
+SPRING_FORWARD = date(2024, 3, 31).toordinal()
+FALL_BACK = date(2024, 10, 27).toordinal()
+
+
+def _brute_force(records, start_day, end_day):
+    """Sums up the worked time per task by walking through it an hour (or the rest of a day) at a time."""
+    by_task = dict()
+    for record in records:
+        start_time = record.start_time
+        while start_time < record.end_time:
+            day = local_day(start_time)
+            end_time = min(record.end_time, start_time + HOUR, local_midnight(day + 1))
+            if start_day <= day < end_day:
+                by_task[record.task] = by_task.get(record.task, 0) + end_time - start_time
+            start_time = end_time
+    return by_task
+
+
+def test_days_around_daylight_saving_time_switches_have_23_and_25_hours():
+    assert local_midnight(SPRING_FORWARD + 1) - local_midnight(SPRING_FORWARD) == 23 * HOUR
+    assert local_midnight(FALL_BACK + 1) - local_midnight(FALL_BACK) == 25 * HOUR
+    assert list(split_by_local_day(usec(2024, 3, 30, 22), usec(2024, 4, 1, 2))) == [
+        (SPRING_FORWARD - 1, 2 * HOUR), (SPRING_FORWARD, 23 * HOUR), (SPRING_FORWARD + 1, 2 * HOUR)]
+
+
+@pytest.mark.parametrize("first_day", [SPRING_FORWARD - 3, FALL_BACK - 3])
+def test_totals_match_brute_force(first_day):
+    records = random_records(500, local_midnight(first_day), 6 * 24 * HOUR, max_duration=30 * HOUR)
+    rollups = DailyRollups(records)
+    rng = random.Random(4)
+    for _ in range(50):
+        start_day = first_day + rng.randrange(8)
+        end_day = start_day + rng.randrange(1, 5)
+        totals = rollups.totals(start_day, end_day)
+        expected = _brute_force(records, start_day, end_day)
+        assert totals.by_task == {task: duration for task, duration in expected.items() if duration}
+        assert totals.total == sum(expected.values())
+
+
+def test_totals_filter_by_task_and_client():
+    records = random_records(300, local_midnight(FALL_BACK - 3), 6 * 24 * HOUR)
+    rollups = DailyRollups(records)
+    totals = rollups.totals(tasks={"Coding"}, clients={"ACME"})
+    assert totals.total == sum(
+        record.end_time - record.start_time
+        for record in records if record.task == "Coding" and record.client == "ACME")
+    assert set(totals.by_task) <= {"Coding"}
+    assert set(totals.by_client) <= {"ACME"}
+
+
+def test_removing_every_record_leaves_no_buckets():
+    records = random_records(200, local_midnight(SPRING_FORWARD - 1), 3 * 24 * HOUR, max_duration=30 * HOUR)
+    rollups = DailyRollups(records)
+    merged = DailyRollups()
+    merged.merge(rollups)
+    assert list(merged.buckets()) == list(rollups.buckets())
+    for record in records:
+        rollups.remove_record(record)
+    assert len(rollups) == 0
+    assert rollups.totals().total == 0
+
+
+def test_database_period_totals_match_rollups(tmp_path):
+    records = random_records(500, local_midnight(SPRING_FORWARD - 10), 20 * 24 * HOUR, max_duration=30 * HOUR)
+    rollups = DailyRollups(records)
+    connection = sqlite_history.connect(tmp_path / "worked_times.sqlite")
+    try:
+        sqlite_history.write_records(connection, records)
+        for start_day, end_day in ((SPRING_FORWARD - 7, SPRING_FORWARD + 1), (SPRING_FORWARD, SPRING_FORWARD + 7)):
+            in_database = sqlite_history.period_totals(
+                connection, local_midnight(start_day), local_midnight(end_day), clients={"ACME", ""})
+            assert in_database == rollups.totals(start_day, end_day, clients={"ACME", ""})
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_loaded_months_come_with_their_rollups(tmp_path, backend):
+    history_path = tmp_path / "worked_times.json"
+    records = random_records(300, local_midnight(SPRING_FORWARD - 20), 30 * 24 * HOUR, max_duration=30 * HOUR)
+    storage = open_storage(history_path, backend)
+    keys = sorted({partition_key(record.start_time) for record in records})
+    for key in keys:
+        storage.load(key)
+    for record in records:
+        storage.add(record)
+    # Compacting caches the snapshots with their rollups
+    for operation in storage.prepare_write(compact=True):
+        operation()
+    storage.close()
+
+    storage = open_storage(history_path)
+    rollups = DailyRollups()
+    for key in keys:
+        rollups.merge(storage.load(key).rollups)
+    storage.close()
+    assert dict(rollups.buckets()) == dict(DailyRollups(records).buckets())
@@ -0,0 +1,73 @@
+import os
+import time
+
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.rollups import DailyRollups
+from wage_labor_record.snapshot_cache import SnapshotCache, SnapshotColumns
+from wage_labor_record.worked_time_history import load_history
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+from tests.helpers import HOUR, random_records, usec
+
+
+def _snapshot(tmp_path, records):
+    """Writes `records` as snapshot and caches it, with their daily rollups."""
+    path = tmp_path / "2024-03.json"
+    journal = WorkedTimeJournal(path)
+    journal.compact(record.asdict() for record in records)
+    journal.close()
+    SnapshotCache(path).store(
+        SnapshotColumns.from_rows([record.asrow() for record in records], DailyRollups(records).buckets()))
+    return path
+
+
+def test_cache_holds_the_snapshot_and_its_rollups(tmp_path):
+    records = random_records(200, usec(2024, 3, 1), 30 * 24 * HOUR)
+    columns = SnapshotCache(_snapshot(tmp_path, records)).load()
+    assert list(columns.rows()) == [record.asrow() for record in records]
+    assert list(columns.rollup_buckets()) == list(DailyRollups(records).buckets())
+
+
+def test_touching_the_snapshot_keeps_the_cache(tmp_path):
+    path = _snapshot(tmp_path, random_records(20, usec(2024, 3, 1), 30 * 24 * HOUR))
+    os.utime(path, ns=(0, 0))
+    assert SnapshotCache(path).load() is not None
+    # The new modification time was remembered
+    assert SnapshotCache(path).load() is not None
+
+
+def test_changed_snapshot_invalidates_the_cache(tmp_path):
+    records = random_records(20, usec(2024, 3, 1), 30 * 24 * HOUR)
+    path = _snapshot(tmp_path, records)
+    journal = WorkedTimeJournal(path)
+    journal.compact(record.asdict() for record in records[1:])
+    journal.close()
+    assert SnapshotCache(path).load() is None
+
+
+def test_rollups_of_another_time_zone_are_ignored(tmp_path, monkeypatch):
+    records = random_records(20, usec(2024, 3, 1), 30 * 24 * HOUR)
+    path = _snapshot(tmp_path, records)
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    columns = SnapshotCache(path).load()
+    assert columns.rollups is None
+    assert list(columns.rows()) == [record.asrow() for record in records]
+
+
+def test_cached_rollups_are_updated_with_the_journal(tmp_path):
+    records = random_records(50, usec(2024, 3, 1), 30 * 24 * HOUR, max_duration=30 * HOUR)
+    path = _snapshot(tmp_path, records)
+    journal = WorkedTimeJournal(path)
+    journal.load()
+    added = WorkedTimeRecord("Support", "Umbrella", usec(2024, 3, 30, 23), usec(2024, 3, 31, 4))
+    journal.add(added.asdict())
+    records[0].end_time += HOUR
+    journal.update(records[0].asdict())
+    journal.remove(records[1].id)
+    journal.close()
+
+    loaded = load_history(WorkedTimeJournal(path), SnapshotCache(path))
+    expected = [records[0], *records[2:], added]
+    assert sorted(record.asrow() for record in loaded.records) == sorted(record.asrow() for record in expected)
+    assert dict(loaded.rollups.buckets()) == dict(DailyRollups(expected).buckets())
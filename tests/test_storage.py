@@ -0,0 +1,147 @@
+import time
+
+import pytest
+
+from wage_labor_record import sqlite_history
+from wage_labor_record.journal import WorkedTimeJournal
+from wage_labor_record.partitions import Manifest, partition_directory, partition_key, partition_path
+from wage_labor_record.storage import open_storage
+from wage_labor_record.worked_time_history import read_history_records
+from wage_labor_record.worked_time_record import WorkedTimeRecord
+
+from tests.helpers import HOUR, usec
+
+
+def _write(storage, compact: bool = False):
+    for operation in storage.prepare_write(compact):
+        operation()
+    storage.sync()
+
+
+def _move(storage, record: WorkedTimeRecord, start_time: int):
+    old = dict(task=record.task, client=record.client, start_time=record.start_time, end_time=record.end_time)
+    record.end_time += start_time - record.start_time
+    record.start_time = start_time
+    storage.update(record, old)
+
+
+def _hour_of_coding(start_time: int) -> WorkedTimeRecord:
+    return WorkedTimeRecord("Coding", "ACME", start_time, start_time + HOUR)
+
+
+def _stored(history_path):
+    return sorted((record.id, record.start_time) for record in read_history_records(history_path))
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request):
+    return request.param
+
+
+def test_worked_time_moves_to_the_partition_of_its_new_month(tmp_path, backend):
+    history_path = tmp_path / "worked_times.json"
+    storage = open_storage(history_path, backend)
+    may, june = usec(2024, 5, 31, 22), usec(2024, 6, 1, 9)
+    for key in ("2024-05", "2024-06"):
+        storage.load(key)
+    moved = WorkedTimeRecord("Coding", "ACME", may, may + HOUR)
+    staying = WorkedTimeRecord("Review", "ACME", may - HOUR, may)
+    storage.add(moved)
+    storage.add(staying)
+    _write(storage)
+
+    _move(storage, moved, june)
+    _write(storage)
+    storage.close()
+    assert _stored(history_path) == sorted([(moved.id, june), (staying.id, staying.start_time)])
+
+    reopened = open_storage(history_path)
+    assert [record.id for record in reopened.load("2024-05").records] == [staying.id]
+    assert [record.id for record in reopened.load("2024-06").records] == [moved.id]
+    reopened.close()
+    if backend == "json":
+        directory = partition_directory(history_path)
+        # The journal of May removes the worked time, which the journal of June adds
+        may_ids = [d["id"] for d in WorkedTimeJournal(partition_path(directory, "2024-05")).load()]
+        assert may_ids == [staying.id]
+        manifest = Manifest.load(directory)
+        assert manifest.partitions["2024-05"].count == 1
+        assert manifest.partitions["2024-06"].count == 1
+        assert manifest.partitions["2024-06"].tasks == {"Coding": [1, HOUR]}
+
+
+def test_moves_survive_compaction(tmp_path, backend):
+    history_path = tmp_path / "worked_times.json"
+    storage = open_storage(history_path, backend)
+    start_time = usec(2024, 1, 15, 9)
+    storage.load(partition_key(start_time))
+    records = [_hour_of_coding(start_time + i * HOUR) for i in range(5)]
+    for record in records:
+        storage.add(record)
+    _write(storage)
+
+    # Back to December, which was never loaded and has no worked times yet
+    storage.load("2023-12")
+    _move(storage, records[0], usec(2023, 12, 31, 23))
+    storage.remove(records[1])
+    _write(storage, compact=True)
+    storage.close()
+    assert _stored(history_path) == sorted(
+        [(records[0].id, usec(2023, 12, 31, 23))] + [(record.id, record.start_time) for record in records[2:]])
+
+
+def test_failed_write_is_repeated(tmp_path, backend, monkeypatch):
+    history_path = tmp_path / "worked_times.json"
+    storage = open_storage(history_path, backend)
+    start_time = usec(2024, 3, 4, 9)
+    storage.load(partition_key(start_time))
+    records = [_hour_of_coding(start_time + i * HOUR) for i in range(4)]
+    for record in records:
+        storage.add(record)
+    operations = storage.prepare_write()
+
+    def fail(*_args):
+        raise OSError("No space left on device")
+    if backend == "json":
+        monkeypatch.setattr(WorkedTimeJournal, "_append", fail)
+    else:
+        monkeypatch.setattr(sqlite_history, "write_changes", fail)
+    with pytest.raises(OSError):
+        for operation in operations:
+            operation()
+    monkeypatch.undo()
+
+    # Changed again before the failure was reported
+    storage.remove(records[0])
+    storage.write_failed()
+    _write(storage)
+    storage.close()
+    assert _stored(history_path) == sorted((record.id, record.start_time) for record in records[1:])
+
+
+def test_edits_keep_worked_times_in_their_month_after_a_time_zone_change(tmp_path, monkeypatch):
+    history_path = tmp_path / "worked_times.json"
+    storage = open_storage(history_path, "json")
+    storage.load("2024-06")
+    # Half past midnight on June 1st in Berlin, but still May in UTC
+    record = _hour_of_coding(usec(2024, 6, 1, 0, 30))
+    storage.add(record)
+    _write(storage)
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+
+    old = dict(task=record.task, client=record.client, start_time=record.start_time, end_time=record.end_time)
+    record.task = "Review"
+    storage.update(record, old)
+    _write(storage)
+    # Moving it to a month that is not loaded fails without changing anything
+    with pytest.raises(KeyError):
+        _move(storage, record, usec(2024, 8, 1, 9))
+    record.start_time, record.end_time = old["start_time"], old["end_time"]
+    _write(storage)
+    storage.close()
+
+    reopened = open_storage(history_path)
+    assert [(r.id, r.task) for r in reopened.load("2024-06").records] == [(record.id, "Review")]
+    assert Manifest.load(partition_directory(history_path)).partitions["2024-06"].tasks == {"Review": [1, HOUR]}
+    reopened.close()
@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from wage_labor_record.worked_time_index import WorkedTimeIndex, changed_range
+
+from tests.helpers import HOUR, random_records, usec
+
+START = usec(2024, 1, 1)
+SPAN = 60 * 24 * HOUR
+
+
+def _brute_force(records, start_time, end_time, tasks, clients):
+    return sorted(
+        (
+            record for record in records
+            if (start_time is None or record.start_time >= start_time)
+            and (end_time is None or record.start_time <= end_time)
+            and (tasks is None or record.task in tasks)
+            and (clients is None or record.client in clients)
+        ),
+        key=lambda record: (record.start_time, id(record)))
+
+
+def _queries(rng):
+    for _ in range(200):
+        start_time = rng.choice((None, START + rng.randrange(SPAN)))
+        end_time = rng.choice((None, START + rng.randrange(SPAN)))
+        tasks = rng.choice((None, {"Coding"}, {"Coding", "Review"}, {"Unknown"}))
+        clients = rng.choice((None, {"ACME"}, {"", "Initech"}))
+        yield start_time, end_time, tasks, clients
+
+
+def _check(index, records, rng):
+    assert [record.start_time for record in index.records] == sorted(record.start_time for record in records)
+    for start_time, end_time, tasks, clients in _queries(rng):
+        result = index.query(start_time, end_time, tasks, clients)
+        expected = _brute_force(records, start_time, end_time, tasks, clients)
+        assert sorted(result, key=lambda record: (record.start_time, id(record))) == expected
+        assert [record.start_time for record in result] == sorted(record.start_time for record in result)
+
+
+def test_queries_match_brute_force():
+    records = random_records(1000, START, SPAN)
+    _check(WorkedTimeIndex(records), records, random.Random(1))
+
+
+def test_queries_match_brute_force_after_changes():
+    rng = random.Random(2)
+    records = random_records(500, START, SPAN)
+    index = WorkedTimeIndex(records)
+    for record in random_records(100, START, SPAN, seed=3):
+        index.add(record)
+        records.append(record)
+    for record in rng.sample(records, 100):
+        index.remove(record)
+        records.remove(record)
+    for record in rng.sample(records, 100):
+        field = rng.choice(("task", "client", "start_time"))
+        old_value = getattr(record, field)
+        if field == "task":
+            record.task = rng.choice(("Coding", "Meetings", "Review", "Support"))
+        elif field == "client":
+            record.client = rng.choice(("ACME", "Initech", "", "Umbrella"))
+        else:
+            record.start_time = START + rng.randrange(SPAN)
+        index.update(record, field, old_value)
+    _check(index, records, rng)
+
+
+def test_equal_start_times_keep_insertion_order():
+    records = random_records(3, START, 1, max_duration=HOUR)
+    index = WorkedTimeIndex()
+    positions = [index.add(record) for record in records]
+    assert positions == [0, 1, 2]
+    assert list(index.records) == records
+    with pytest.raises(ValueError):
+        index.remove(random_records(1, START, 1, seed=9)[0])
+
+
+def test_changed_range_is_the_smallest_replaced_range():
+    records = random_records(10, START, SPAN)
+    assert changed_range(records, list(records)) is None
+    assert changed_range(records, records[:4] + records[5:]) == (4, 1, 0)
+    assert changed_range(records, records[:4] + random_records(2, START, SPAN, seed=5) + records[4:]) == (4, 0, 2)
+    assert changed_range(records, records[:2] + [records[7]] + records[2:7] + records[8:]) == (2, 6, 6)
+    assert changed_range([], records) == (0, 0, 10)
+    assert changed_range(records, []) == (0, 10, 0)
+
+
+def test_changed_range_turns_the_old_records_into_the_new_ones():
+    rng = random.Random(6)
+    for _ in range(200):
+        old = random_records(rng.randrange(8), START, SPAN, seed=rng.randrange(1000))
+        new = [record for record in old if rng.random() < 0.8]
+        for _ in range(rng.randrange(3)):
+            new.insert(rng.randrange(len(new) + 1), random_records(1, START, SPAN, seed=rng.randrange(1000))[0])
+        changed = changed_range(old, new)
+        if changed is None:
+            assert new == old
+            continue
+        position, n_removed, n_added = changed
+        assert old[:position] + new[position:position + n_added] + old[position + n_removed:] == new
+        assert n_removed > 0 or n_added > 0